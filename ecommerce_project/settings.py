@@ -154,6 +154,28 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Para desarro
 DEFAULT_FROM_EMAIL = 'noreply@ecommerceia.com'
 SITE_URL = 'http://127.0.0.1:8000'  # URL del sitio para enlaces en emails
 
+# Recomendador
+RECOMENDADOR_MODO = os.environ.get('RECOMENDADOR_MODO', 'item')  # item | usuario | factorizacion
+RECOMENDADOR_INTERVALO_REFRESCO = int(os.environ.get('RECOMENDADOR_INTERVALO_REFRESCO', '3600'))  # segundos
+RECOMENDADOR_ARTEFACTOS_DIR = os.environ.get('RECOMENDADOR_ARTEFACTOS_DIR', str(BASE_DIR / 'artefactos' / 'recomendador'))
+RECOMENDADOR_INTERVALO_DELTAS = 5  # segundos entre lecturas de compras nuevas (DeltaInteraccion)
+RECOMENDADOR_INTERVALO_FUSION = 300  # segundos entre mini-fusiones de deltas en la similitud
+RECOMENDADOR_CACHE_TTL = 300  # segundos que se reutilizan las recomendaciones de un usuario
+RECOMENDADOR_CACHE_MAX_USUARIOS = 10000  # usuarios en cache por proceso (LRU)
+# Días en que una compra pierde la mitad de su peso en el recomendador (0 = sin decaimiento)
+RECOMENDADOR_VIDA_MEDIA_DIAS = 180
+# Índice de popularidad (`update_popularity_index`): días en que una venta pierde la mitad de su peso
+POPULARIDAD_VIDA_MEDIA_DIAS = 14
+# Modelo de contenido (TF-IDF) de `update_content_similarity`
+RECOMENDADOR_CONTENIDO_DIR = os.environ.get('RECOMENDADOR_CONTENIDO_DIR', str(BASE_DIR / 'artefactos' / 'contenido'))
+# Refrescar el modelo en cuanto cambie este archivo (lo reescribe `train_recommender`)
+RECOMENDADOR_ARCHIVO_VERSION = os.environ.get(
+    'RECOMENDADOR_ARCHIVO_VERSION', os.path.join(RECOMENDADOR_ARTEFACTOS_DIR, 'ACTUAL')
+)
+
+# Búsqueda de productos: auto | mysql (FULLTEXT) | sqlite (FTS5) | memoria (índice invertido por proceso)
+BUSQUEDA_BACKEND = os.environ.get('BUSQUEDA_BACKEND', 'auto')
+
 # Site configuration
 SITE_ID = 1
 
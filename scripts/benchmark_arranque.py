@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Mide el tiempo de arranque y la memoria de los management commands de la tienda.
+
+Cada medición corre en un proceso nuevo, como un ``manage.py <comando>`` real:
+``django.setup()``, carga de la clase del comando y la importación de las URLs
+(que hacen los system checks y que arrastra las vistas y los servicios). No
+ejecuta el comando. Reporta la mediana de cada etapa, el RSS máximo y qué
+librerías numéricas pesadas quedaron cargadas (deberían cargarse recién al
+entrenar o puntuar, no al arrancar).
+
+El reporte JSON se puede guardar por commit y comparar con diff.
+Ejecútalo desde la raíz del proyecto:
+    python scripts/benchmark_arranque.py --repeticiones 5 --salida arranque.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_COMANDOS = os.path.join(RAIZ, 'tienda', 'management', 'commands')
+MODULOS_PESADOS = ('numpy', 'scipy', 'sklearn', 'pandas')
+
+# Se ejecuta en el proceso hijo; argv[1] es el nombre del comando
+MEDICION = r'''
+import json, resource, sys, time
+inicio = time.perf_counter()
+import django
+from django.conf import settings
+django.setup()
+setup = time.perf_counter()
+from django.core.management import get_commands, load_command_class
+load_command_class(get_commands()[sys.argv[1]], sys.argv[1])
+comando = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (setup - inicio) * 1000,
+    'comando_ms': (comando - setup) * 1000,
+    'urls_ms': (urls - comando) * 1000,
+    'total_ms': (urls - inicio) * 1000,
+    'rss_max_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modulos_pesados': [m for m in %r if m in sys.modules],
+}))
+''' % (MODULOS_PESADOS,)
+
+
+def comandos_de_la_tienda():
+    return sorted(
+        nombre[:-3] for nombre in os.listdir(DIRECTORIO_COMANDOS)
+        if nombre.endswith('.py') and not nombre.startswith('_')
+    )
+
+
+def medir(comando, repeticiones):
+    """Mediana de ``repeticiones`` arranques en procesos nuevos"""
+    entorno = dict(os.environ)
+    entorno.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_project.settings')
+    entorno['PYTHONPATH'] = os.pathsep.join(filter(None, [RAIZ, entorno.get('PYTHONPATH')]))
+
+    mediciones = []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, '-c', MEDICION, comando], capture_output=True, text=True, cwd=RAIZ, env=entorno,
+        )
+        if salida.returncode != 0:
+            return {'error': salida.stderr.strip().splitlines()[-1] if salida.stderr.strip() else 'sin salida'}
+        mediciones.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    resultado = {
+        clave: round(statistics.median(m[clave] for m in mediciones), 1)
+        for clave in ('setup_ms', 'comando_ms', 'urls_ms', 'total_ms', 'rss_max_mb')
+    }
+    resultado['modulos_pesados'] = mediciones[-1]['modulos_pesados']
+    return resultado
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=RAIZ,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--comandos', nargs='+', help='Comandos a medir (default: todos los de la tienda y check)')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--salida', type=str, help='Archivo JSON del reporte (default: stdout)')
+    args = parser.parse_args()
+
+    comandos = args.comandos or comandos_de_la_tienda() + ['check']
+    reporte = {
+        'commit': commit_actual(),
+        'python': sys.version.split()[0],
+        'repeticiones': args.repeticiones,
+        'comandos': {},
+    }
+    for comando in comandos:
+        print(f'Midiendo {comando}...', file=sys.stderr)
+        reporte['comandos'][comando] = medir(comando, args.repeticiones)
+
+    salida = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(salida + '\n')
+        print(f'Reporte guardado en {args.salida}', file=sys.stderr)
+    else:
+        print(salida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Evalúa calidad y velocidad de cada modo del recomendador sobre datos sintéticos.
+
+Genera historiales de compra con gustos por categoría y popularidad de cola
+larga, separa train/test por tiempo (las compras más recientes son el test) y
+para cada modo reporta precision@k, recall@k, cobertura del catálogo, tiempo de
+entrenamiento, memoria pico y latencia p50/p99 de puntuar un usuario (sin la
+consulta a la base que hidrata los productos).
+
+El reporte JSON se puede guardar por commit y comparar con diff.
+Ejecútalo desde la raíz del proyecto:
+    python scripts/benchmark_recomendador.py --usuarios 100000 --salida reporte.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_project.settings')
+import django
+django.setup()
+
+import numpy as np
+from django.utils import timezone
+from tienda.recomendador import InteraccionesUsuarioProducto, RecomendadorIA, peso_interaccion
+
+
+def generar_compras(usuarios, productos, compras_por_usuario, categorias, semilla):
+    """Compras sintéticas (usuario, producto, cantidad, instante en [0, 1))"""
+    rng = np.random.default_rng(semilla)
+    categoria_producto = rng.integers(0, categorias, productos)
+    orden = np.argsort(categoria_producto, kind='stable')
+    tamanos = np.bincount(categoria_producto, minlength=categorias)
+    inicios = np.concatenate([[0], np.cumsum(tamanos)[:-1]])
+
+    # Cada usuario prefiere dos categorías; dentro de ellas la popularidad es Zipf
+    favoritas = rng.integers(0, categorias, (usuarios, 2))
+    n_compras = rng.poisson(compras_por_usuario - 1, usuarios) + 1
+    filas = np.repeat(np.arange(usuarios), n_compras)
+    categoria = favoritas[filas, rng.integers(0, 2, filas.size)]
+    vacia = tamanos[categoria] == 0
+    categoria[vacia] = categoria_producto[0]
+    rango = (rng.zipf(1.6, filas.size) - 1) % np.maximum(tamanos[categoria], 1)
+    compras = orden[inicios[categoria] + rango]
+
+    # Un 20% de compras fuera de los gustos del usuario
+    al_azar = rng.random(filas.size) < 0.2
+    compras[al_azar] = rng.integers(0, productos, al_azar.sum())
+
+    cantidades = rng.integers(1, 4, filas.size)
+    instantes = rng.random(filas.size)
+    return filas, compras, cantidades, instantes
+
+
+def percentil_ms(tiempos, p):
+    return round(float(np.percentile(tiempos, p)) * 1000, 3) if len(tiempos) else None
+
+
+def evaluar_modo(modo, interacciones, muestra, prueba, usuarios_eval, k, args):
+    """Entrena un modo y mide calidad, memoria y latencia"""
+    # Calentamiento con pocos datos: que los imports perezosos no cuenten como entrenamiento
+    RecomendadorIA(modo=modo, vecinos_por_producto=args.vecinos, factores=args.factores).entrenar(muestra)
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    recomendador = RecomendadorIA(modo=modo, vecinos_por_producto=args.vecinos, factores=args.factores)
+    recomendador.entrenar(interacciones)
+    tiempo_entrenamiento = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    aciertos, precisiones, recalls, latencias = 0, [], [], []
+    recomendados = set()
+    for usuario_id in usuarios_eval:
+        inicio = time.perf_counter()
+        pares = recomendador.puntuar_usuario(usuario_id, k)
+        latencias.append(time.perf_counter() - inicio)
+
+        productos = [int(interacciones.producto_ids[c]) for c, _ in pares]
+        recomendados.update(productos)
+        relevantes = prueba[usuario_id]
+        aciertos_usuario = len(relevantes.intersection(productos))
+        aciertos += aciertos_usuario
+        precisiones.append(aciertos_usuario / k)
+        recalls.append(aciertos_usuario / len(relevantes))
+
+    return {
+        f'precision@{k}': round(float(np.mean(precisiones)), 5) if precisiones else None,
+        f'recall@{k}': round(float(np.mean(recalls)), 5) if recalls else None,
+        'aciertos': aciertos,
+        'cobertura': round(len(recomendados) / interacciones.producto_ids.size, 5),
+        'entrenamiento_segundos': round(tiempo_entrenamiento, 3),
+        'memoria_pico_mb': round(pico / 1024 / 1024, 1),
+        'latencia_p50_ms': percentil_ms(latencias, 50),
+        'latencia_p99_ms': percentil_ms(latencias, 99),
+    }
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--usuarios', type=int, default=10_000)
+    parser.add_argument('--productos', type=int, default=5_000)
+    parser.add_argument('--compras-por-usuario', type=float, default=8)
+    parser.add_argument('--categorias', type=int, default=25)
+    parser.add_argument('--prueba', type=float, default=0.2, help='Fracción más reciente del tiempo usada como test')
+    parser.add_argument('--dias', type=float, default=365, help='Días que abarca el historial sintético')
+    parser.add_argument('--vida-media-dias', type=float, default=180,
+                        help='Vida media del peso de una compra (0 = sin decaimiento)')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--usuarios-eval', type=int, default=2_000, help='Usuarios de test a evaluar (muestra)')
+    parser.add_argument('--modos', nargs='+', default=list(RecomendadorIA.MODOS), choices=RecomendadorIA.MODOS)
+    parser.add_argument('--vecinos', type=int, default=20)
+    parser.add_argument('--factores', type=int, default=32)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', type=str, help='Archivo JSON del reporte (default: stdout)')
+    args = parser.parse_args()
+
+    print(f'Generando compras: {args.usuarios} usuarios, {args.productos} productos...', file=sys.stderr)
+    filas, productos, cantidades, instantes = generar_compras(
+        args.usuarios, args.productos, args.compras_por_usuario, args.categorias, args.semilla
+    )
+
+    # Split temporal: se entrena con el pasado y se evalúa con las compras posteriores
+    corte = 1 - args.prueba
+    en_train = instantes < corte
+    # Mismos pesos que en producción: cantidad logarítmica y decaimiento desde el corte
+    pesos = peso_interaccion(cantidades, (corte - instantes) * args.dias, vida_media_dias=args.vida_media_dias)
+    interacciones = InteraccionesUsuarioProducto.desde_tripletas(
+        filas[en_train], productos[en_train], pesos[en_train]
+    )
+    pocos = en_train & (filas < 1000)
+    muestra = InteraccionesUsuarioProducto.desde_tripletas(filas[pocos], productos[pocos], pesos[pocos])
+
+    # Relevantes: productos comprados después del corte que el usuario no había comprado antes
+    comprados_antes = set(zip(filas[en_train].tolist(), productos[en_train].tolist()))
+    prueba = {}
+    for usuario_id, producto_id in zip(filas[~en_train].tolist(), productos[~en_train].tolist()):
+        if (usuario_id, producto_id) not in comprados_antes:
+            prueba.setdefault(usuario_id, set()).add(producto_id)
+    candidatos = [u for u in prueba if interacciones.fila_de_usuario(u) is not None]
+    rng = np.random.default_rng(args.semilla)
+    usuarios_eval = rng.permutation(candidatos)[:args.usuarios_eval].tolist()
+
+    reporte = {
+        'fecha': timezone.now().isoformat(),
+        'commit': commit_actual(),
+        'parametros': vars(args),
+        'datos': {
+            'usuarios_train': int(interacciones.usuario_ids.size),
+            'productos_train': int(interacciones.producto_ids.size),
+            'interacciones_train': int(interacciones.matriz.nnz),
+            'compras_test': int((~en_train).sum()),
+            'usuarios_evaluados': len(usuarios_eval),
+        },
+        'modos': {},
+    }
+    for modo in args.modos:
+        print(f'Evaluando modo {modo}...', file=sys.stderr)
+        reporte['modos'][modo] = evaluar_modo(modo, interacciones, muestra, prueba, usuarios_eval, args.k, args)
+
+    salida = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(salida + '\n')
+        print(f'Reporte guardado en {args.salida}', file=sys.stderr)
+    else:
+        print(salida)
+
+
+if __name__ == '__main__':
+    main()
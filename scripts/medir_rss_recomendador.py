@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+Mide la memoria por worker al cargar el artefacto del recomendador con y sin memmap.
+
+Genera un artefacto sintético, levanta N procesos (como N workers WSGI) que lo
+cargan y recorren todos sus arrays, y reporta RSS y PSS de cada uno. PSS reparte
+las páginas compartidas entre los procesos que las usan, así que muestra cuánta
+memoria física cuesta realmente cada worker.
+
+Solo Linux (lee /proc/self/status y /proc/self/smaps_rollup).
+Ejecútalo desde la raíz del proyecto: python scripts/medir_rss_recomendador.py --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_project.settings')
+import django
+django.setup()
+
+import numpy as np
+from tienda.recomendador import InteraccionesUsuarioProducto, RecomendadorIA, publicar_artefacto
+
+
+def leer_memoria_kb():
+    """RSS y PSS del proceso actual en KB"""
+    memoria = {'rss': 0, 'pss': 0}
+    with open('/proc/self/status') as f:
+        for linea in f:
+            if linea.startswith('VmRSS:'):
+                memoria['rss'] = int(linea.split()[1])
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for linea in f:
+                if linea.startswith('Pss:'):
+                    memoria['pss'] = int(linea.split()[1])
+    except OSError:
+        pass
+    return memoria
+
+
+def worker(directorio, mmap, cola, listo, salir):
+    antes = leer_memoria_kb()
+    inicio = time.monotonic()
+    recomendador = RecomendadorIA.desde_artefacto(directorio, mmap=mmap)
+    tiempo_carga = time.monotonic() - inicio
+
+    # Recorrer todas las páginas, como pasaría tras muchas peticiones
+    interacciones = recomendador.interacciones
+    for array in (interacciones.matriz.data, interacciones.matriz.indices, interacciones.matriz.indptr,
+                  interacciones.usuario_ids, interacciones.producto_ids,
+                  recomendador.modelo_item.vecinos, recomendador.modelo_item.puntajes):
+        float(np.asarray(array).sum())
+
+    listo.wait()  # medir cuando todos los workers tienen el artefacto cargado
+    despues = leer_memoria_kb()
+    cola.put({'pid': os.getpid(), 'antes': antes, 'despues': despues, 'carga': tiempo_carga})
+    salir.wait()
+
+
+def medir(directorio, mmap, workers):
+    contexto = multiprocessing.get_context('spawn')
+    cola, listo, salir = contexto.Queue(), contexto.Barrier(workers + 1), contexto.Event()
+    procesos = [
+        contexto.Process(target=worker, args=(directorio, mmap, cola, listo, salir))
+        for _ in range(workers)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    listo.wait()
+    resultados = [cola.get() for _ in procesos]
+    salir.set()
+    for proceso in procesos:
+        proceso.join()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--usuarios', type=int, default=200_000)
+    parser.add_argument('--productos', type=int, default=20_000)
+    parser.add_argument('--interacciones', type=int, default=3_000_000)
+    parser.add_argument('--vecinos', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f'Generando artefacto: {args.usuarios} usuarios, {args.productos} productos, '
+          f'{args.interacciones} interacciones...')
+    # Popularidad con cola larga (Zipf) para que la matriz se parezca a una tienda real
+    productos = (rng.zipf(1.3, args.interacciones) - 1) % args.productos
+    interacciones = InteraccionesUsuarioProducto.desde_tripletas(
+        rng.integers(0, args.usuarios, args.interacciones), productos,
+        rng.integers(1, 4, args.interacciones),
+    )
+    recomendador = RecomendadorIA(vecinos_por_producto=args.vecinos)
+    recomendador.entrenar(interacciones)
+
+    with tempfile.TemporaryDirectory() as base:
+        manifest = publicar_artefacto(recomendador, base)
+        directorio = os.path.join(base, manifest['version'])
+        tamano = sum(os.path.getsize(os.path.join(directorio, f)) for f in os.listdir(directorio))
+        print(f'Tamaño del artefacto: {tamano / 1024 / 1024:.1f} MB\n')
+
+        print(f'{"modo":<8} {"worker":>7} {"carga (s)":>10} {"RSS antes":>11} {"RSS después":>12} {"PSS":>10}')
+        for nombre, mmap in (('copia', False), ('memmap', True)):
+            resultados = medir(directorio, mmap, args.workers)
+            for i, r in enumerate(resultados):
+                print(f'{nombre:<8} {i:>7} {r["carga"]:>10.3f} {r["antes"]["rss"] / 1024:>9.1f}MB '
+                      f'{r["despues"]["rss"] / 1024:>10.1f}MB {r["despues"]["pss"] / 1024:>8.1f}MB')
+            pss_total = sum(r['despues']['pss'] for r in resultados) / 1024
+            print(f'{nombre:<8} {"total":>7} {"":>10} {"":>11} {"":>12} {pss_total:>8.1f}MB\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,14 +4,16 @@ from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.http import JsonResponse, Http404
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Count
 from django.contrib.auth.models import User
 from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
-from .models import Producto, MovimientoInventario, Pedido, PedidoProducto, Resena, Cupon, DireccionEnvio, MetodoPago, Wishlist, ContribucionWishlist, ReferidoWishlist, HistorialCompartir
+from .models import Categoria, Producto, MovimientoInventario, Pedido, PedidoProducto, Resena, Cupon, DireccionEnvio, MetodoPago, Wishlist, ContribucionWishlist, ReferidoWishlist, HistorialCompartir
 from .forms import ProductoAdminForm
+from .services.categorias_service import CategoriasService
+from .services.popularidad_service import PopularidadService
 
 
 # Crear instancia personalizada del sitio admin
@@ -497,7 +499,7 @@ class InventarioAdminSite(admin.AdminSite):
 
         # Aplicar filtros
         if categoria_filter:
-            productos = productos.filter(categoria=categoria_filter)
+            productos = productos.filter(categoria_ref__in=CategoriasService.ids_subarbol(categoria_filter))
         if stock_filter == "bajo":
             productos = productos.filter(stock__lte=models.F("stock_minimo"), stock__gt=0)
         elif stock_filter == "agotado":
@@ -517,7 +519,7 @@ class InventarioAdminSite(admin.AdminSite):
             "total_unidades": Producto.objects.aggregate(total=models.Sum("stock"))["total"] or 0,
         }
 
-        categorias = Producto.objects.values_list("categoria", flat=True).distinct()
+        categorias = CategoriasService.nombres()
 
         context = {
             "productos": productos,
@@ -607,8 +609,8 @@ class InventarioAdminSite(admin.AdminSite):
         # Pedidos recientes
         pedidos_recientes = Pedido.objects.select_related("usuario").order_by("-fecha_creacion")[:10]
 
-        # Productos más vendidos (simulado)
-        productos_populares = Producto.objects.filter(estado="activo").order_by("-stock")[:5]
+        # Productos más vendidos (índice de popularidad por ventas)
+        productos_populares = PopularidadService.mas_vendidos(5, solo_disponibles=False)
 
         context = {
             "stats": stats,
@@ -1100,7 +1102,7 @@ admin.site = admin_site
 class ProductoAdmin(admin.ModelAdmin):
     form = ProductoAdminForm
     list_display = ["imagen_preview", "nombre", "sku", "precio", "stock", "stock_minimo", "estado", "categoria", "stock_status"]
-    list_filter = ["estado", "categoria"]
+    list_filter = ["estado", "categoria_ref"]
     search_fields = ["nombre", "sku", "descripcion"]
     readonly_fields = ["fecha_creacion", "fecha_actualizacion"]
     list_editable = ["stock", "estado"]
@@ -1378,6 +1380,28 @@ class ProductoAdmin(admin.ModelAdmin):
             return JsonResponse({"success": False, "error": f"Error al obtener imágenes: {str(e)}"})
 
 
+@admin.register(Categoria, site=admin_site)
+class CategoriaAdmin(admin.ModelAdmin):
+    list_display = ["nombre", "slug", "padre", "orden", "total_productos"]
+    list_filter = ["padre"]
+    list_editable = ["orden"]
+    search_fields = ["nombre", "slug"]
+    prepopulated_fields = {"slug": ("nombre",)}
+    readonly_fields = ["total_productos"]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(CategoriasService.invalidar)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(CategoriasService.invalidar)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(CategoriasService.invalidar)
+
+
 @admin.register(MovimientoInventario, site=admin_site)
 class MovimientoInventarioAdmin(admin.ModelAdmin):
     list_display = ["producto", "tipo", "cantidad", "descripcion", "usuario", "fecha"]
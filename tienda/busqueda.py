@@ -0,0 +1,348 @@
+"""
+Búsqueda de texto del catálogo: normalización, raíces en español e índice invertido
+
+No depende de Django: ``tienda.services.busqueda_service`` lo conecta con los
+productos y elige el backend (MySQL FULLTEXT, SQLite FTS5 o este índice en
+memoria). Todos los backends normalizan igual: minúsculas, sin acentos y
+con una raíz liviana que une singular/plural y masculino/femenino
+("Camisas Rojas" y "camisa roja" dan los mismos términos).
+"""
+import bisect
+import functools
+import gc
+import heapq
+import math
+import re
+import sys
+import unicodedata
+from array import array
+
+PALABRAS_VACIAS = frozenset("""
+a al algo ante con contra de del desde el en entre es esta este esto hasta la las lo los mas muy no o para
+pero por que se sin sobre su sus un una unas uno unos y
+""".split())
+
+_PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+_VOCALES = 'aeiou'
+
+
+def plegar(texto):
+    """Minúsculas y sin acentos ('Canción Ñandú' → 'cancion nandu')"""
+    texto = (texto or '').lower()
+    if texto.isascii():
+        return texto
+    texto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+@functools.lru_cache(maxsize=200000)
+def raiz(token):
+    """
+    Raíz liviana en español: quita el plural y la vocal final
+
+    Alcanza para que las variantes de una palabra coincidan (camisa, camisas
+    → camis; luz, luces → luz; camión, camiones → camion). Tokens cortos o
+    con dígitos (talles, SKU) quedan intactos.
+    """
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith('ces') and len(token) > 4:
+        token = token[:-3] + 'z'
+    elif token.endswith('es') and len(token) > 4 and token[-3] not in _VOCALES:
+        token = token[:-2]
+    elif token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 3 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def tokenizar(texto):
+    """Términos normalizados de un texto, en orden y con repeticiones"""
+    return [raiz(token) for token in _PATRON_TOKEN.findall(plegar(texto)) if token not in PALABRAS_VACIAS]
+
+
+class IndiceInvertido:
+    """Índice invertido con ranking BM25F (BM25 con peso por campo).
+
+    Cada término apunta a los documentos que lo contienen con su frecuencia
+    en cada campo. El puntaje de un documento suma, por término de la
+    consulta, ``idf * tf / (k1 + tf)`` donde ``tf`` combina las frecuencias de
+    los campos multiplicadas por su peso y normalizadas por el largo del
+    campo (un título corto que nombra el término pesa más que una
+    descripción larga). Se actualiza documento por documento.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, pesos):
+        """
+        Args:
+            pesos: Pares (campo, peso) en el orden en que se pasan los textos
+        """
+        self.campos = tuple(campo for campo, _ in pesos)
+        self.pesos = tuple(float(peso) for _, peso in pesos)
+        self.postings = {}  # término → {documento: frecuencias por campo}
+        self.longitudes = {}  # documento → largo de cada campo
+        self.terminos = {}  # documento → sus términos (para quitarlo sin recorrer el vocabulario)
+        self.suma_longitudes = [0] * len(self.campos)
+
+    @classmethod
+    def construir(cls, pesos, documentos):
+        """
+        Índice completo a partir de pares (documento, textos)
+
+        Pausa el recolector de basura mientras tanto: el índice son millones
+        de objetos chicos de larga vida y las pasadas del GC durante la carga
+        triplican el tiempo de construcción.
+        """
+        indice = cls(pesos)
+        recolector_activo = gc.isenabled()
+        gc.disable()
+        try:
+            for documento, textos in documentos:
+                indice.agregar(documento, textos)
+        finally:
+            if recolector_activo:
+                gc.enable()
+        return indice
+
+    def __len__(self):
+        return len(self.longitudes)
+
+    def __contains__(self, documento):
+        return documento in self.longitudes
+
+    def agregar(self, documento, textos):
+        """
+        Indexa (o reindexa) un documento
+
+        Args:
+            documento: Id del documento
+            textos: {campo: texto}; los campos que falten quedan vacíos
+        """
+        self.quitar(documento)
+        frecuencias = {}
+        longitudes = []
+        for posicion, campo in enumerate(self.campos):
+            terminos = tokenizar(textos.get(campo))
+            longitudes.append(len(terminos))
+            for termino in terminos:
+                frecuencias.setdefault(termino, [0] * len(self.campos))[posicion] += 1
+
+        for termino, frecuencia in frecuencias.items():
+            self.postings.setdefault(termino, {})[documento] = tuple(frecuencia)
+        self.longitudes[documento] = tuple(longitudes)
+        self.terminos[documento] = tuple(frecuencias)
+        for posicion, longitud in enumerate(longitudes):
+            self.suma_longitudes[posicion] += longitud
+
+    def quitar(self, documento):
+        """Saca un documento del índice (no hace nada si no estaba)"""
+        longitudes = self.longitudes.pop(documento, None)
+        if longitudes is None:
+            return
+        for posicion, longitud in enumerate(longitudes):
+            self.suma_longitudes[posicion] -= longitud
+        for termino in self.terminos.pop(documento):
+            del self.postings[termino][documento]
+            if not self.postings[termino]:
+                del self.postings[termino]
+
+    def buscar(self, consulta, limite=None):
+        """
+        Documentos que contienen algún término de la consulta, por relevancia
+
+        Returns:
+            list: [(documento, puntaje)] de mayor a menor puntaje
+        """
+        terminos = [t for t in dict.fromkeys(tokenizar(consulta)) if t in self.postings]
+        total = len(self.longitudes)
+        if not terminos or not total:
+            return []
+
+        promedios = [max(suma / total, 1e-9) for suma in self.suma_longitudes]
+        puntajes = {}
+        for termino in terminos:
+            documentos = self.postings[termino]
+            idf = math.log(1 + (total - len(documentos) + 0.5) / (len(documentos) + 0.5))
+            for documento, frecuencias in documentos.items():
+                longitudes = self.longitudes[documento]
+                tf = 0.0
+                for peso, frecuencia, longitud, promedio in zip(self.pesos, frecuencias, longitudes, promedios):
+                    if frecuencia:
+                        tf += peso * frecuencia / (1 - self.B + self.B * longitud / promedio)
+                puntajes[documento] = puntajes.get(documento, 0.0) + idf * tf / (self.K1 + tf)
+
+        if limite is None:
+            return sorted(puntajes.items(), key=lambda par: (-par[1], par[0]))
+        return heapq.nsmallest(limite, puntajes.items(), key=lambda par: (-par[1], par[0]))
+
+
+def palabras(texto):
+    """Palabras plegadas de un texto, sin raíz (para buscar por prefijo)"""
+    return _PATRON_TOKEN.findall(plegar(texto))
+
+
+class IndicePrefijos:
+    """Sugerencias por prefijo de palabra, de la más a la menos popular.
+
+    El vocabulario es una lista ordenada: las palabras que empiezan con un
+    prefijo son un rango contiguo que se ubica con ``bisect``. Cada palabra
+    apunta a un ``array`` compacto de ranuras (una por entrada) ordenado por
+    popularidad, así que las mejores sugerencias salen de mezclar las listas
+    del rango y cortar al llegar al límite. Los prefijos cortos abarcan
+    miles de palabras y mezclarlas costaría más que recorrer las entradas en
+    orden de popularidad hasta juntar el límite (casi todas coinciden), así
+    que esos se resuelven recorriendo y quedan cacheados hasta que cambie
+    alguna entrada con ese prefijo. Las entradas se agregan y quitan de a
+    una; la popularidad de una entrada no cambia hasta reconstruir el índice.
+    Las ranuras que deja libres una entrada quitada se reusan al agregar, así
+    que los arrays no crecen más que la cantidad máxima de entradas vivas.
+    """
+
+    # Con más palabras que esto en el rango del prefijo se recorre por popularidad en vez de mezclar
+    RANGO_AMPLIO = 256
+
+    def __init__(self):
+        self.vocabulario = []  # palabras ordenadas
+        self.postings = {}  # palabra → array de ranuras ordenado por (-popularidad, ranura)
+        self.orden = array('l')  # ranuras vivas ordenadas por (-popularidad, ranura)
+        self.ranura_de = {}  # id de la entrada → ranura
+        self.ids = array('q')
+        self.popularidad = array('d')
+        self.textos = []  # texto a mostrar por ranura (None = ranura libre)
+        self.palabras_ranura = []  # palabras de cada ranura
+        self.libres = []  # ranuras de entradas quitadas, para reusar
+        self._cache = {}  # prefijo amplio → {límite: resultados}
+
+    def __len__(self):
+        return len(self.ranura_de)
+
+    def _orden(self, ranura):
+        return (-self.popularidad[ranura], ranura)
+
+    @classmethod
+    def construir(cls, entradas):
+        """
+        Índice completo a partir de (id, texto a mostrar, texto a indexar, popularidad)
+
+        Las ranuras se asignan de mayor a menor popularidad: cada posting
+        queda ordenado con solo agregar al final.
+        """
+        indice = cls()
+        recolector_activo = gc.isenabled()
+        gc.disable()
+        try:
+            for entrada_id, texto, indexado, popularidad in sorted(entradas, key=lambda e: (-e[3], e[0])):
+                ranura = indice._nueva_ranura(entrada_id, texto, indexado, popularidad)
+                indice.orden.append(ranura)
+                for palabra in indice.palabras_ranura[ranura]:
+                    posting = indice.postings.get(palabra)
+                    if posting is None:
+                        posting = indice.postings[palabra] = array('l')
+                    posting.append(ranura)
+            indice.vocabulario = sorted(indice.postings)
+        finally:
+            if recolector_activo:
+                gc.enable()
+        return indice
+
+    def _nueva_ranura(self, entrada_id, texto, indexado, popularidad):
+        propias = tuple(sys.intern(palabra) for palabra in dict.fromkeys(palabras(indexado)))
+        if self.libres:
+            ranura = self.libres.pop()
+            self.ids[ranura] = entrada_id
+            self.popularidad[ranura] = float(popularidad)
+            self.textos[ranura] = texto
+            self.palabras_ranura[ranura] = propias
+        else:
+            ranura = len(self.ids)
+            self.ids.append(entrada_id)
+            self.popularidad.append(float(popularidad))
+            self.textos.append(texto)
+            self.palabras_ranura.append(propias)
+        self.ranura_de[entrada_id] = ranura
+        return ranura
+
+    def _invalidar(self, ranura):
+        """Descarta lo cacheado para los prefijos de las palabras de una ranura"""
+        if not self._cache:
+            return
+        for palabra in self.palabras_ranura[ranura]:
+            for largo in range(1, len(palabra) + 1):
+                self._cache.pop(palabra[:largo], None)
+
+    def agregar(self, entrada_id, texto, indexado, popularidad=0.0):
+        """Agrega (o reemplaza) una entrada; al reemplazar reusa la misma ranura"""
+        self.quitar(entrada_id)
+        ranura = self._nueva_ranura(entrada_id, texto, indexado, popularidad)
+        self._invalidar(ranura)
+        bisect.insort(self.orden, ranura, key=self._orden)
+        for palabra in self.palabras_ranura[ranura]:
+            posting = self.postings.get(palabra)
+            if posting is None:
+                posting = self.postings[palabra] = array('l')
+                bisect.insort(self.vocabulario, palabra)
+            bisect.insort(posting, ranura, key=self._orden)
+
+    def quitar(self, entrada_id):
+        """Quita una entrada (no hace nada si no estaba)"""
+        ranura = self.ranura_de.pop(entrada_id, None)
+        if ranura is None:
+            return
+        self._invalidar(ranura)
+        clave = self._orden(ranura)
+        del self.orden[bisect.bisect_left(self.orden, clave, key=self._orden)]
+        for palabra in self.palabras_ranura[ranura]:
+            posting = self.postings[palabra]
+            del posting[bisect.bisect_left(posting, clave, key=self._orden)]
+            if not posting:
+                del self.postings[palabra]
+                del self.vocabulario[bisect.bisect_left(self.vocabulario, palabra)]
+        self.textos[ranura] = None
+        self.palabras_ranura[ranura] = ()
+        self.libres.append(ranura)
+
+    def sugerir(self, consulta, limite=8):
+        """
+        Entradas cuyas palabras empiezan con cada palabra de la consulta
+
+        Returns:
+            list: [(id, texto)] de la más a la menos popular
+        """
+        terminos = list(dict.fromkeys(palabras(consulta)))
+        if not terminos:
+            return []
+
+        # El término más largo suele tener el rango más chico
+        principal = max(terminos, key=len)
+        inicio = bisect.bisect_left(self.vocabulario, principal)
+        fin = bisect.bisect_left(self.vocabulario, principal + '\x7f')
+        amplio = fin - inicio > self.RANGO_AMPLIO
+        if amplio and len(terminos) == 1 and limite in self._cache.get(principal, {}):
+            return self._cache[principal][limite]
+
+        if amplio:
+            candidatas = self.orden
+            filtros = terminos
+        else:
+            candidatas = heapq.merge(*(self.postings[palabra] for palabra in self.vocabulario[inicio:fin]),
+                                     key=self._orden)
+            filtros = [termino for termino in terminos if termino != principal]
+
+        resultados, vistas = [], set()
+        for ranura in candidatas:
+            if ranura in vistas:
+                continue
+            vistas.add(ranura)
+            propias = self.palabras_ranura[ranura]
+            if all(any(palabra.startswith(termino) for palabra in propias) for termino in filtros):
+                resultados.append((self.ids[ranura], self.textos[ranura]))
+                if len(resultados) >= limite:
+                    break
+
+        if amplio and len(terminos) == 1:
+            self._cache.setdefault(principal, {})[limite] = resultados
+        return resultados
@@ -0,0 +1,54 @@
+"""
+Management command para recalcular o verificar las calificaciones desnormalizadas de los productos
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tienda.services.calificaciones_service import CalificacionesService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde las reseñas el promedio, total e histograma de calificaciones de cada producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Solo informa los productos con diferencias, sin corregirlos (sale con error si hay alguno)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=CalificacionesService.LOTE,
+            help=f'Productos por lote (default: {CalificacionesService.LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+
+        verificar = options['verificar']
+        self.stdout.write(self.style.SUCCESS(
+            'Verificando calificaciones...' if verificar else 'Recalculando calificaciones...'
+        ))
+        inicio = time.monotonic()
+        revisados, con_diferencias = CalificacionesService.recalcular(
+            lote=options['lote'], solo_verificar=verificar
+        )
+        duracion = time.monotonic() - inicio
+
+        if verificar and con_diferencias:
+            raise CommandError(
+                f'{con_diferencias} de {revisados} productos con calificaciones desactualizadas '
+                '(corregir con: python manage.py rebuild_product_ratings)'
+            )
+        accion = 'con diferencias' if verificar else 'corregidos'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {revisados} productos revisados en {duracion:.2f}s, {con_diferencias} {accion}'
+        ))
+
+        if not verificar:
+            self.stdout.write(self.style.SUCCESS('\nPara automatizar (control semanal):'))
+            self.stdout.write(
+                f'  Agregar a crontab: 30 4 * * 0 cd {settings.BASE_DIR} && python manage.py rebuild_product_ratings --verificar'
+            )
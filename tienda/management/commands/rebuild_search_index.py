@@ -0,0 +1,41 @@
+"""
+Management command para reconstruir el índice de búsqueda de productos
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from tienda.services.busqueda_service import BusquedaService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de texto de productos del backend de búsqueda activo y prueba una consulta'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--probar',
+            type=str,
+            default=None,
+            help='Consulta de prueba a ejecutar después de reconstruir'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            backend = BusquedaService.backend()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Reconstruyendo índice de búsqueda (backend: {backend.nombre})...'))
+        inicio = time.monotonic()
+        total = BusquedaService.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} productos indexados en {time.monotonic() - inicio:.2f}s'))
+        if backend.nombre == 'mysql':
+            self.stdout.write('  MySQL mantiene los índices FULLTEXT solo; no hace falta reconstruirlos.')
+        else:
+            self.stdout.write('  Los productos creados, editados o borrados se reindexan solos.')
+
+        if options['probar']:
+            inicio = time.monotonic()
+            resultados = BusquedaService.buscar(options['probar'], limite=10)
+            self.stdout.write(
+                f"  '{options['probar']}': {len(resultados)} resultados en "
+                f"{(time.monotonic() - inicio) * 1000:.1f}ms → {resultados}"
+            )
@@ -0,0 +1,80 @@
+"""
+Management command para resumir por día las búsquedas del catálogo
+"""
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from tienda.models import ResumenConsultaDia
+from tienda.services.analitica_busqueda_service import AnaliticaBusquedaService
+
+
+class Command(BaseCommand):
+    help = 'Resume por día las búsquedas del catálogo: consultas más buscadas, sin resultados y latencia p50/p95'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            type=str,
+            default=None,
+            help='Último día a resumir, AAAA-MM-DD (default: ayer)'
+        )
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=1,
+            help='Cantidad de días a resumir hasta --fecha inclusive (default: 1)'
+        )
+        parser.add_argument(
+            '--conservar-dias',
+            type=int,
+            default=90,
+            help='Borra los registros individuales con más de estos días, 0 = no borrar (default: 90)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Consultas a listar en la salida (default: 10)'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1:
+            raise CommandError('--dias debe ser al menos 1')
+        if options['conservar_dias'] < 0:
+            raise CommandError('--conservar-dias no puede ser negativo')
+        try:
+            hasta = date.fromisoformat(options['fecha']) if options['fecha'] else timezone.localdate() - timedelta(days=1)
+        except ValueError:
+            raise CommandError('--fecha debe tener el formato AAAA-MM-DD')
+
+        # Los eventos que este proceso tenga en memoria entran en el resumen
+        AnaliticaBusquedaService.vaciar()
+        self.stdout.write(self.style.SUCCESS('Resumiendo búsquedas...'))
+        inicio = time.monotonic()
+        for desplazamiento in range(options['dias'] - 1, -1, -1):
+            fecha = hasta - timedelta(days=desplazamiento)
+            resumen = AnaliticaBusquedaService.resumir_dia(fecha)
+            p50 = f'{resumen.latencia_p50_ms:.1f}ms' if resumen.latencia_p50_ms is not None else '-'
+            p95 = f'{resumen.latencia_p95_ms:.1f}ms' if resumen.latencia_p95_ms is not None else '-'
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {fecha}: {resumen.busquedas} búsquedas ({resumen.consultas_distintas} distintas), '
+                f'{resumen.sin_resultados} sin resultados, {resumen.con_clic} con clic, latencia p50 {p50} / p95 {p95}'
+            ))
+
+        consultas = ResumenConsultaDia.objects.filter(fecha=hasta)
+        self.stdout.write(f'\nMás buscadas el {hasta}:')
+        for fila in consultas.order_by('-busquedas', 'consulta')[:options['top']]:
+            self.stdout.write(f'  {fila.consulta}: {fila.busquedas} ({fila.resultados_promedio:.0f} resultados en promedio)')
+        self.stdout.write(f'\nSin resultados el {hasta}:')
+        for fila in consultas.filter(sin_resultados__gt=0).order_by('-sin_resultados', 'consulta')[:options['top']]:
+            self.stdout.write(f'  {fila.consulta}: {fila.sin_resultados}')
+
+        if options['conservar_dias']:
+            borrados = AnaliticaBusquedaService.purgar(options['conservar_dias'])
+            self.stdout.write(f'\n{borrados} registros con más de {options["conservar_dias"]} días borrados')
+        self.stdout.write(self.style.SUCCESS(f'\nListo en {time.monotonic() - inicio:.2f}s'))
+
+        self.stdout.write(self.style.SUCCESS('\nPara automatizar:'))
+        self.stdout.write(f'  Agregar a crontab: 30 0 * * * cd {settings.BASE_DIR} && python manage.py rollup_search_stats')
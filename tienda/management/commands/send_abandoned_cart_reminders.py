@@ -82,6 +82,9 @@ class Command(BaseCommand):
                 )
             return
 
+        # Recomendaciones de todos los usuarios en una sola pasada del modelo
+        recomendaciones_por_usuario = self._recomendaciones(carritos_para_recordar)
+
         # Enviar recordatorios
         enviados = 0
         errores = 0
@@ -91,12 +94,12 @@ class Command(BaseCommand):
                 # Obtener productos del carrito
                 productos_carrito = list(carrito.carritoproducto_set.all())
 
-                # Obtener recomendaciones (productos populares)
-                from tienda.models import Producto
-                recomendaciones = Producto.objects.filter(
-                    stock__gt=0,
-                    estado='activo'
-                ).order_by('-stock')[:3]  # Productos más vendidos
+                # Recomendaciones personalizadas, sin repetir lo que ya está en el carrito
+                en_carrito = {item.producto_id for item in productos_carrito}
+                recomendaciones = [
+                    r['producto'] for r in recomendaciones_por_usuario.get(carrito.usuario_id, [])
+                    if r['producto'].id not in en_carrito
+                ][:3]
 
                 # Enviar email
                 email_service = EmailService()
@@ -127,4 +130,18 @@ class Command(BaseCommand):
         if enviados > 0:
             self.stdout.write(self.style.SUCCESS(f'\nPara automatizar:'))
             self.stdout.write(f'  Agregar a crontab: 0 */6 * * * cd {settings.BASE_DIR} && python manage.py send_abandoned_cart_reminders')
-            self.stdout.write(f'  (Ejecuta cada 6 horas)')
\ No newline at end of file
+            self.stdout.write(f'  (Ejecuta cada 6 horas)')
+
+    def _recomendaciones(self, carritos):
+        """Recomendaciones por usuario para todos los carritos a recordar"""
+        if not carritos:
+            return {}
+        try:
+            from tienda.services.recomendador_service import obtener_recomendador
+            # Pedir de más para poder descartar los productos que ya están en el carrito
+            return obtener_recomendador().recomendar_batch(
+                [carrito.usuario_id for carrito in carritos], top_n=6
+            )
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'⚠️ No se pudieron calcular recomendaciones: {str(e)}'))
+            return {}
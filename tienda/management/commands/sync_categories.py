@@ -0,0 +1,45 @@
+"""
+Management command para crear las categorías desde los productos y recalcular sus conteos
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tienda.services.categorias_service import CategoriasService
+
+
+class Command(BaseCommand):
+    help = 'Crea las categorías que falten a partir de Producto.categoria, reasigna productos y recalcula los conteos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Solo informa las diferencias, sin corregirlas (sale con error si hay alguna)'
+        )
+
+    def handle(self, *args, **options):
+        verificar = options['verificar']
+        self.stdout.write(self.style.SUCCESS(
+            'Verificando categorías...' if verificar else 'Sincronizando categorías...'
+        ))
+        inicio = time.monotonic()
+        creadas, reasignados, corregidos = CategoriasService.sincronizar(solo_verificar=verificar)
+        duracion = time.monotonic() - inicio
+
+        if verificar and (creadas or reasignados or corregidos):
+            raise CommandError(
+                f'{creadas} categorías faltantes, {reasignados} productos mal asignados y {corregidos} conteos '
+                'desactualizados (corregir con: python manage.py sync_categories)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {creadas} categorías creadas, {reasignados} productos reasignados y '
+            f'{corregidos} conteos corregidos en {duracion:.2f}s'
+        ))
+        for categoria in CategoriasService.menu()[:10]:
+            self.stdout.write(f"  {'  ' * categoria['nivel']}{categoria['nombre']}: {categoria['total']} productos")
+
+        if not verificar:
+            self.stdout.write(self.style.SUCCESS('\nPara automatizar (control semanal):'))
+            self.stdout.write(
+                f'  Agregar a crontab: 45 4 * * 0 cd {settings.BASE_DIR} && python manage.py sync_categories --verificar'
+            )
@@ -0,0 +1,106 @@
+"""
+Management command para entrenar el recomendador fuera del ciclo de peticiones
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tienda.models import DeltaInteraccion
+from tienda.recomendador import (
+    InteraccionesUsuarioProducto, RecomendadorIA, activar_version, listar_versiones,
+    publicar_artefacto, ultimo_delta_id, version_actual,
+)
+
+
+class Command(BaseCommand):
+    help = 'Entrena el recomendador con los pedidos y compras y publica un artefacto versionado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directorio',
+            type=str,
+            default=None,
+            help='Directorio de artefactos (default: settings.RECOMENDADOR_ARTEFACTOS_DIR)'
+        )
+        parser.add_argument(
+            '--vecinos',
+            type=int,
+            default=20,
+            help='Vecinos más similares a guardar por producto (default: 20)'
+        )
+        parser.add_argument(
+            '--factores',
+            type=int,
+            default=32,
+            help='Dimensión de la factorización de rango bajo, 0 para omitirla (default: 32)'
+        )
+        parser.add_argument(
+            '--conservar',
+            type=int,
+            default=5,
+            help='Cantidad de versiones anteriores a conservar para rollback (default: 5)'
+        )
+        parser.add_argument(
+            '--activar',
+            type=str,
+            help='No entrenar: activar una versión existente (rollback)'
+        )
+        parser.add_argument(
+            '--listar',
+            action='store_true',
+            help='No entrenar: listar las versiones disponibles'
+        )
+
+    def handle(self, *args, **options):
+        directorio = options['directorio'] or settings.RECOMENDADOR_ARTEFACTOS_DIR
+
+        if options['listar']:
+            actual = version_actual(directorio)
+            for version in listar_versiones(directorio):
+                marca = ' (activa)' if version == actual else ''
+                self.stdout.write(f'  {version}{marca}')
+            return
+
+        if options['activar']:
+            try:
+                activar_version(directorio, options['activar'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'✅ Versión activa: {options["activar"]}'))
+            return
+
+        if options['factores'] < 0:
+            raise CommandError('--factores no puede ser negativo')
+        if options['conservar'] < 1:
+            raise CommandError('--conservar debe ser al menos 1')
+
+        self.stdout.write(self.style.SUCCESS('Entrenando recomendador...'))
+        inicio = time.monotonic()
+
+        # Los deltas hasta este id ya están en los pedidos que se leen a continuación
+        hasta_delta = ultimo_delta_id()
+        interacciones = InteraccionesUsuarioProducto.desde_bd()
+        if interacciones.vacia:
+            self.stdout.write(self.style.WARNING('⚠️ No hay pedidos ni compras: no se publicó ningún artefacto'))
+            return
+
+        recomendador = RecomendadorIA(
+            modo='item', vecinos_por_producto=options['vecinos'], factores=options['factores']
+        )
+        recomendador.entrenar(interacciones)
+        recomendador.ultimo_delta_id = hasta_delta
+        duracion = time.monotonic() - inicio
+
+        manifest = publicar_artefacto(
+            recomendador, directorio, conservar=options['conservar'], duracion=duracion
+        )
+
+        # Los deltas incluidos en el artefacto ya no hacen falta
+        eliminados, _ = DeltaInteraccion.objects.filter(id__lte=hasta_delta).delete()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Artefacto publicado: {manifest["version"]}'))
+        self.stdout.write(f'  Usuarios: {manifest["usuarios"]}')
+        self.stdout.write(f'  Productos: {manifest["productos"]}')
+        self.stdout.write(f'  Interacciones: {manifest["interacciones"]}')
+        self.stdout.write(f'  Factores: {manifest["factores"]}')
+        self.stdout.write(f'  Tiempo de entrenamiento: {manifest["duracion_segundos"]}s')
+        self.stdout.write(f'  Deltas incorporados: {eliminados}')
@@ -0,0 +1,32 @@
+"""
+Management command para recalcular la similitud de contenido entre productos
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from tienda.services.contenido_service import ContenidoService
+
+
+class Command(BaseCommand):
+    help = 'Entrena el TF-IDF de nombre, categoría y descripción y guarda los productos más parecidos de cada uno'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vecinos',
+            type=int,
+            default=ContenidoService.VECINOS,
+            help=f'Productos similares a guardar por producto (default: {ContenidoService.VECINOS})'
+        )
+
+    def handle(self, *args, **options):
+        if options['vecinos'] < 1:
+            raise CommandError('--vecinos debe ser al menos 1')
+
+        self.stdout.write(self.style.SUCCESS('Calculando similitud de contenido...'))
+        inicio = time.monotonic()
+        try:
+            total = ContenidoService.recalcular(k=options['vecinos'])
+        except ImportError:
+            raise CommandError('scikit-learn es necesario para entrenar el modelo de contenido')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} productos indexados en {time.monotonic() - inicio:.2f}s'))
+        self.stdout.write('  Los productos nuevos o editados se indexan solos al guardarse.')
@@ -0,0 +1,40 @@
+"""
+Management command para recalcular el índice de popularidad por ventas
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tienda.models import PopularidadProducto
+from tienda.services.popularidad_service import PopularidadService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las unidades e ingresos vendidos (7/30/90 días) y el puntaje de popularidad de cada producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vida-media',
+            type=float,
+            default=None,
+            help='Días en que una venta pierde la mitad de su peso (default: settings.POPULARIDAD_VIDA_MEDIA_DIAS)'
+        )
+
+    def handle(self, *args, **options):
+        vida_media = options['vida_media']
+        if vida_media is not None and vida_media <= 0:
+            raise CommandError('--vida-media debe ser mayor que 0')
+
+        self.stdout.write(self.style.SUCCESS('Recalculando índice de popularidad...'))
+        inicio = time.monotonic()
+        total = PopularidadService.recalcular(vida_media_dias=vida_media)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} productos indexados en {time.monotonic() - inicio:.2f}s'))
+        for popularidad in PopularidadProducto.objects.select_related('producto')[:5]:
+            self.stdout.write(
+                f'  {popularidad.producto.nombre}: {popularidad.unidades_30d} u. (30d), '
+                f'${popularidad.ingresos_30d} (30d), puntaje {popularidad.puntaje:.1f}'
+            )
+
+        if total > 0:
+            self.stdout.write(self.style.SUCCESS('\nPara automatizar:'))
+            self.stdout.write(f'  Agregar a crontab: 15 * * * * cd {settings.BASE_DIR} && python manage.py update_popularity_index')
@@ -0,0 +1,48 @@
+"""
+Management command para recalcular las asociaciones "comprados juntos"
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tienda.services.asociaciones_service import AsociacionesService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las reglas de asociación entre productos (soporte, confianza y lift) a partir de los pedidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Reglas a guardar por producto (default: 10)'
+        )
+        parser.add_argument(
+            '--min-pedidos',
+            type=int,
+            default=2,
+            help='Pedidos mínimos en común para considerar un par (default: 2)'
+        )
+        parser.add_argument(
+            '--max-productos-pedido',
+            type=int,
+            default=50,
+            help='Ignorar pedidos con más productos distintos que este valor (default: 50)'
+        )
+
+    def handle(self, *args, **options):
+        if options['top'] < 1 or options['min_pedidos'] < 1:
+            raise CommandError('--top y --min-pedidos deben ser al menos 1')
+
+        self.stdout.write(self.style.SUCCESS('Recalculando productos comprados juntos...'))
+        inicio = time.monotonic()
+        total = AsociacionesService.recalcular(
+            top_n=options['top'],
+            min_pedidos=options['min_pedidos'],
+            max_productos_pedido=options['max_productos_pedido'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} reglas guardadas en {time.monotonic() - inicio:.2f}s'))
+
+        if total > 0:
+            self.stdout.write(self.style.SUCCESS('\nPara automatizar:'))
+            self.stdout.write(f'  Agregar a crontab: 30 3 * * * cd {settings.BASE_DIR} && python manage.py update_product_associations')
@@ -0,0 +1,49 @@
+"""
+Management command para recalcular los productos relacionados del detalle de producto
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tienda.models import ProductoRelacionado
+from tienda.services.relacionados_service import RelacionadosService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la lista de productos relacionados de cada producto (compras conjuntas, texto y categoría)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=RelacionadosService.TOP,
+            help=f'Relacionados a guardar por producto (default: {RelacionadosService.TOP})'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=RelacionadosService.LOTE,
+            help=f'Productos por lote (default: {RelacionadosService.LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['top'] < 1:
+            raise CommandError('--top debe ser al menos 1')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+
+        self.stdout.write(self.style.SUCCESS('Recalculando productos relacionados...'))
+        inicio = time.monotonic()
+        procesados, guardados = RelacionadosService.recalcular(top_n=options['top'], lote=options['lote'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {procesados} productos procesados, {guardados} relaciones guardadas en {time.monotonic() - inicio:.2f}s'
+        ))
+        for relacion in ProductoRelacionado.objects.select_related('producto', 'relacionado').filter(posicion=0)[:5]:
+            self.stdout.write(
+                f'  {relacion.producto.nombre} → {relacion.relacionado.nombre} '
+                f'({relacion.get_motivo_display()}, {relacion.puntaje:.2f})'
+            )
+
+        if procesados > 0:
+            self.stdout.write(self.style.SUCCESS('\nPara automatizar (después de update_product_associations y update_content_similarity):'))
+            self.stdout.write(f'  Agregar a crontab: 30 3 * * * cd {settings.BASE_DIR} && python manage.py update_related_products')
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0027_deltainteraccion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularidadProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(max_length=100)),
+                ('puntaje', models.FloatField(default=0)),
+                ('unidades_7d', models.IntegerField(default=0)),
+                ('unidades_30d', models.IntegerField(default=0)),
+                ('unidades_90d', models.IntegerField(default=0)),
+                ('ingresos_7d', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ingresos_30d', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ingresos_90d', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fecha_calculo', models.DateTimeField()),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='popularidad', to='tienda.producto')),
+            ],
+            options={
+                'verbose_name': 'Popularidad de Producto',
+                'verbose_name_plural': 'Popularidad de Productos',
+                'ordering': ['-puntaje'],
+                'indexes': [models.Index(fields=['-puntaje'], name='tienda_popu_puntaje_2424f2_idx'), models.Index(fields=['categoria', '-puntaje'], name='tienda_popu_categor_915da9_idx')],
+            },
+        ),
+    ]
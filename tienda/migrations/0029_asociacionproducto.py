@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0028_popularidadproducto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsociacionProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('pedidos_juntos', models.IntegerField(help_text='Pedidos que contienen ambos productos')),
+                ('soporte', models.FloatField(help_text='Fracción de pedidos con ambos productos')),
+                ('confianza', models.FloatField(help_text='Fracción de los pedidos de producto que incluyen recomendado')),
+                ('lift', models.FloatField(help_text='Confianza dividida por la popularidad de recomendado')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asociaciones', to='tienda.producto')),
+                ('recomendado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tienda.producto')),
+            ],
+            options={
+                'verbose_name': 'Asociación de Productos',
+                'verbose_name_plural': 'Asociaciones de Productos',
+                'ordering': ['producto', 'posicion'],
+                'indexes': [models.Index(fields=['producto', 'posicion'], name='tienda_asoc_product_05bb9c_idx')],
+                'unique_together': {('producto', 'recomendado')},
+            },
+        ),
+    ]
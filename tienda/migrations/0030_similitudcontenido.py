@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0029_asociacionproducto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilitudContenido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntaje', models.FloatField(help_text='Similitud coseno entre los textos (0 a 1)')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares_contenido', to='tienda.producto')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tienda.producto')),
+            ],
+            options={
+                'verbose_name': 'Similitud de Contenido',
+                'verbose_name_plural': 'Similitudes de Contenido',
+                'ordering': ['producto', '-puntaje'],
+                'indexes': [models.Index(fields=['producto', '-puntaje'], name='tienda_simi_product_d237d1_idx')],
+                'unique_together': {('producto', 'similar')},
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:34
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def calcular_calificaciones(apps, schema_editor):
+    """Histograma, total y promedio de las reseñas existentes de cada producto"""
+    Producto = apps.get_model('tienda', 'Producto')
+    Resena = apps.get_model('tienda', 'Resena')
+    histogramas = {}
+    for producto_id, calificacion, total in Resena.objects.filter(calificacion__range=(1, 5)).order_by().values_list(
+        'producto_id', 'calificacion'
+    ).annotate(total=Count('id')).values_list('producto_id', 'calificacion', 'total'):
+        histogramas.setdefault(producto_id, {})[f'rating_{calificacion}'] = total
+
+    for producto_id, histograma in histogramas.items():
+        total = sum(histograma.values())
+        suma = sum(int(campo[-1]) * cantidad for campo, cantidad in histograma.items())
+        Producto.objects.filter(id=producto_id).update(
+            rating_total=total, rating_promedio=suma / total, **histograma
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0030_similitudcontenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='rating_1',
+            field=models.IntegerField(default=0, help_text='Reseñas con 1 estrella'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='rating_2',
+            field=models.IntegerField(default=0, help_text='Reseñas con 2 estrellas'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='rating_3',
+            field=models.IntegerField(default=0, help_text='Reseñas con 3 estrellas'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='rating_4',
+            field=models.IntegerField(default=0, help_text='Reseñas con 4 estrellas'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='rating_5',
+            field=models.IntegerField(default=0, help_text='Reseñas con 5 estrellas'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='rating_promedio',
+            field=models.FloatField(default=0, help_text='Promedio de calificaciones de las reseñas'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='rating_total',
+            field=models.IntegerField(default=0, help_text='Cantidad de reseñas'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['-rating_promedio', '-rating_total'], name='tienda_prod_rating__49d949_idx'),
+        ),
+        migrations.RunPython(calcular_calificaciones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0031_producto_rating'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='tienda_prod_rating__49d949_idx',
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre', 'id'], name='tienda_prod_nombre_68440b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['precio', 'id'], name='tienda_prod_precio_685fea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['-rating_promedio', '-rating_total', '-id'], name='tienda_prod_rating__629a35_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+# Índices FULLTEXT de la búsqueda (solo MySQL): uno por columna para el peso
+# de cada campo y uno con todas para el WHERE
+INDICES_FULLTEXT = (
+    ('producto_ft_nombre', 'nombre'),
+    ('producto_ft_categoria', 'categoria'),
+    ('producto_ft_sku', 'sku'),
+    ('producto_ft_descripcion', 'descripcion'),
+    ('producto_ft_todos', 'nombre, categoria, sku, descripcion'),
+)
+
+
+def crear_indices_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for nombre, columnas in INDICES_FULLTEXT:
+        schema_editor.execute(f"ALTER TABLE tienda_producto ADD FULLTEXT INDEX {nombre} ({columnas})")
+
+
+def borrar_indices_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for nombre, _ in INDICES_FULLTEXT:
+        schema_editor.execute(f"ALTER TABLE tienda_producto DROP INDEX {nombre}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0032_producto_indices_catalogo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='producto',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(crear_indices_fulltext, borrar_indices_fulltext),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0033_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenBusquedasDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('busquedas', models.IntegerField(default=0)),
+                ('sin_resultados', models.IntegerField(default=0)),
+                ('con_clic', models.IntegerField(default=0, help_text='Búsquedas seguidas de al menos un clic en un resultado')),
+                ('consultas_distintas', models.IntegerField(default=0)),
+                ('latencia_p50_ms', models.FloatField(blank=True, null=True)),
+                ('latencia_p95_ms', models.FloatField(blank=True, null=True)),
+                ('fecha_calculo', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Búsquedas',
+                'verbose_name_plural': 'Resúmenes Diarios de Búsquedas',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistroBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('busqueda', 'Búsqueda'), ('clic', 'Clic en resultado')], default='busqueda', max_length=10)),
+                ('busqueda', models.CharField(db_index=True, help_text='Id de la búsqueda (compartido con sus clics)', max_length=32)),
+                ('fecha', models.DateTimeField(db_index=True)),
+                ('consulta', models.CharField(blank=True, help_text='Texto buscado normalizado', max_length=200)),
+                ('filtros', models.JSONField(blank=True, default=dict)),
+                ('resultados', models.IntegerField(blank=True, null=True)),
+                ('latencia_ms', models.FloatField(blank=True, null=True)),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tienda.producto')),
+            ],
+            options={
+                'verbose_name': 'Registro de Búsqueda',
+                'verbose_name_plural': 'Registros de Búsquedas',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenConsultaDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('consulta', models.CharField(max_length=200)),
+                ('busquedas', models.IntegerField(default=0)),
+                ('sin_resultados', models.IntegerField(default=0)),
+                ('con_clic', models.IntegerField(default=0)),
+                ('resultados_promedio', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Consulta',
+                'verbose_name_plural': 'Resúmenes Diarios de Consultas',
+                'ordering': ['fecha', '-busquedas'],
+                'indexes': [models.Index(fields=['fecha', '-busquedas'], name='tienda_resu_fecha_3b7dc9_idx'), models.Index(fields=['fecha', '-sin_resultados'], name='tienda_resu_fecha_ba506e_idx')],
+                'unique_together': {('fecha', 'consulta')},
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils.text import slugify
+
+
+def crear_categorias(apps, schema_editor):
+    """Una Categoria por nombre distinto (por slug) con sus productos asignados y contados"""
+    Categoria = apps.get_model('tienda', 'Categoria')
+    Producto = apps.get_model('tienda', 'Producto')
+    categoria_por_slug = {}
+    for nombre in Producto.objects.order_by().values_list('categoria', flat=True).distinct():
+        slug = slugify((nombre or '').strip())[:60]
+        if not slug:
+            continue
+        if slug not in categoria_por_slug:
+            categoria_por_slug[slug] = Categoria.objects.create(nombre=nombre.strip()[:50], slug=slug).id
+        Producto.objects.filter(categoria=nombre).update(categoria_ref_id=categoria_por_slug[slug])
+
+    for categoria_id, total in Producto.objects.filter(categoria_ref__isnull=False).order_by().values_list(
+        'categoria_ref_id'
+    ).annotate(total=Count('id')).values_list('categoria_ref_id', 'total'):
+        Categoria.objects.filter(id=categoria_id).update(total_productos=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0034_registro_busquedas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Categoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50)),
+                ('slug', models.SlugField(max_length=60, unique=True)),
+                ('orden', models.IntegerField(default=0, help_text='Posición en los menús (menor primero)')),
+                ('total_productos', models.IntegerField(default=0, help_text='Productos con esta categoría (sin contar subcategorías)')),
+                ('padre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='hijas', to='tienda.categoria')),
+            ],
+            options={
+                'verbose_name': 'Categoría',
+                'verbose_name_plural': 'Categorías',
+                'ordering': ['orden', 'nombre'],
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='categoria_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='productos', to='tienda.categoria'),
+        ),
+        migrations.RunPython(crear_categorias, migrations.RunPython.noop),
+    ]
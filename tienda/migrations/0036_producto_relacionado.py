@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0035_categoria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoRelacionado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('puntaje', models.FloatField()),
+                ('motivo', models.CharField(choices=[('compras', 'Comprados juntos'), ('contenido', 'Similar'), ('categoria', 'Misma categoría')], max_length=10)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relacionados', to='tienda.producto')),
+                ('relacionado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tienda.producto')),
+            ],
+            options={
+                'verbose_name': 'Producto Relacionado',
+                'verbose_name_plural': 'Productos Relacionados',
+                'ordering': ['producto', 'posicion'],
+                'indexes': [models.Index(fields=['producto', 'posicion'], name='tienda_prod_product_096c0d_idx')],
+                'unique_together': {('producto', 'relacionado')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_categorias(apps, schema_editor):
+    """La categoría normalizada de cada producto del índice (hasta el próximo recálculo)"""
+    PopularidadProducto = apps.get_model('tienda', 'PopularidadProducto')
+    Producto = apps.get_model('tienda', 'Producto')
+    PopularidadProducto.objects.update(categoria_ref_id=Subquery(
+        Producto.objects.filter(id=OuterRef('producto_id')).values('categoria_ref_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0036_producto_relacionado'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='popularidadproducto',
+            name='tienda_popu_categor_915da9_idx',
+        ),
+        migrations.RemoveField(
+            model_name='popularidadproducto',
+            name='categoria',
+        ),
+        migrations.AddField(
+            model_name='popularidadproducto',
+            name='categoria_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tienda.categoria'),
+        ),
+        migrations.AddIndex(
+            model_name='popularidadproducto',
+            index=models.Index(fields=['categoria_ref', '-puntaje'], name='tienda_popu_categor_8d65c2_idx'),
+        ),
+        migrations.RunPython(copiar_categorias, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,55 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.db.models import Sum
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+
+class ProductoQuerySet(models.QuerySet):
+    def para_catalogo(self):
+        """
+        Anota la imagen principal de cada producto en la misma consulta
+
+        ``imagen_principal`` y ``tiene_imagen`` usan la anotación cuando está
+        presente, así un listado no hace consultas extra por tarjeta (la
+        calificación ya vive en columnas propias del producto).
+        """
+        from django.db.models import OuterRef, Subquery
+
+        return self.annotate(
+            imagen_principal_id=Subquery(
+                ProductoImagen.objects.filter(producto=OuterRef('pk')).order_by(
+                    '-es_principal', 'orden', 'fecha_subida'
+                ).values('id')[:1]
+            ),
+        )
+
+
+class Categoria(models.Model):
+    """Categoría del catálogo, con jerarquía opcional (``padre``).
+
+    ``Producto.categoria`` sigue guardando el nombre; las señales lo resuelven
+    a una ``Categoria`` por ``slug`` (así "Hogar" y "hogar" son la misma) y
+    mantienen ``total_productos``. `sync_categories` crea las que falten
+    desde los nombres existentes y recalcula los conteos.
+    """
+    nombre = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=60, unique=True)
+    padre = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='hijas')
+    orden = models.IntegerField(default=0, help_text="Posición en los menús (menor primero)")
+    total_productos = models.IntegerField(default=0, help_text="Productos con esta categoría (sin contar subcategorías)")
+
+    class Meta:
+        verbose_name = "Categoría"
+        verbose_name_plural = "Categorías"
+        ordering = ['orden', 'nombre']
+
+    def __str__(self):
+        return self.nombre
+
+
 class Producto(models.Model):
     ESTADO_CHOICES = [
         ('activo', 'Activo'),
@@ -14,6 +61,10 @@ class Producto(models.Model):
     nombre = models.CharField(max_length=100, default='Producto sin nombre')
     precio = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     categoria = models.CharField(max_length=50, default='Sin categoría')
+    # Categoría normalizada de ``categoria`` (la asignan las señales); los filtros usan esta FK indexada
+    categoria_ref = models.ForeignKey(
+        Categoria, on_delete=models.SET_NULL, null=True, blank=True, related_name='productos'
+    )
     descripcion = models.TextField(blank=True, null=True)
 
     # Campos de inventario mejorados
@@ -26,7 +77,19 @@ class Producto(models.Model):
     # Estado del producto
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='activo')
     fecha_creacion = models.DateTimeField(default=timezone.now, help_text="Fecha de creación del producto")
-    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Calificaciones desnormalizadas: las mantienen las señales de Resena
+    # (rebuild_product_ratings las recalcula o verifica)
+    rating_promedio = models.FloatField(default=0, help_text="Promedio de calificaciones de las reseñas")
+    rating_total = models.IntegerField(default=0, help_text="Cantidad de reseñas")
+    rating_1 = models.IntegerField(default=0, help_text="Reseñas con 1 estrella")
+    rating_2 = models.IntegerField(default=0, help_text="Reseñas con 2 estrellas")
+    rating_3 = models.IntegerField(default=0, help_text="Reseñas con 3 estrellas")
+    rating_4 = models.IntegerField(default=0, help_text="Reseñas con 4 estrellas")
+    rating_5 = models.IntegerField(default=0, help_text="Reseñas con 5 estrellas")
+
+    objects = ProductoQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.nombre} (SKU: {self.sku or 'N/A'})"
@@ -51,7 +114,8 @@ class Producto(models.Model):
         if cantidad > self.stock:
             raise ValueError(f"No hay suficiente stock. Disponible: {self.stock}, Solicitado: {cantidad}")
         self.stock -= cantidad
-        self.save()
+        # Solo el stock: las señales no reindexan el producto en cada venta
+        self.save(update_fields=['stock', 'fecha_actualizacion'])
         # Crear registro de movimiento de inventario
         descripcion = f"Venta - Reducción de stock por pedido #{pedido.id}" if pedido else "Venta - Reducción de stock por pedido"
         MovimientoInventario.objects.create(
@@ -91,6 +155,10 @@ class Producto(models.Model):
     @property
     def imagen_principal(self):
         """Devuelve la URL de la imagen principal del producto"""
+        if 'imagen_principal_id' in self.__dict__:
+            if self.imagen_principal_id is None:
+                return None
+            return f"/producto/{self.id}/imagen/{self.imagen_principal_id}/"
         imagen_principal = self.imagenes.filter(es_principal=True).first()
         if imagen_principal:
             return imagen_principal.url_imagen
@@ -103,6 +171,8 @@ class Producto(models.Model):
     @property
     def tiene_imagen(self):
         """Verifica si el producto tiene alguna imagen"""
+        if 'imagen_principal_id' in self.__dict__:
+            return self.imagen_principal_id is not None
         return self.imagenes.exists()
 
     @property
@@ -137,19 +207,28 @@ class Producto(models.Model):
     @property
     def total_resenas(self):
         """Devuelve el total de reseñas del producto"""
-        return self.resena_set.count()
+        return self.rating_total
 
     @property
     def promedio_calificacion(self):
         """Devuelve el promedio de calificaciones del producto"""
-        from django.db.models import Avg
-        avg_rating = self.resena_set.aggregate(avg=Avg('calificacion'))['avg']
-        return round(avg_rating, 1) if avg_rating else 0.0
+        return round(self.rating_promedio, 1) if self.rating_total else 0.0
+
+    @property
+    def histograma_calificaciones(self):
+        """Cantidad de reseñas por estrella, de 5 a 1"""
+        return {estrellas: getattr(self, f'rating_{estrellas}') for estrellas in range(5, 0, -1)}
 
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Claves de la paginación por cursor del catálogo
+            models.Index(fields=['nombre', 'id']),
+            models.Index(fields=['precio', 'id']),
+            models.Index(fields=['-rating_promedio', '-rating_total', '-id']),
+        ]
 
 
 class ProductoImagen(models.Model):
@@ -179,6 +258,16 @@ class ProductoImagen(models.Model):
         """Devuelve la URL para acceder a esta imagen"""
         return f"/producto/{self.producto.id}/imagen/{self.id}/"
 
+    @classmethod
+    def urls_principales(cls, producto_ids):
+        """URL de la imagen principal (o la primera) de varios productos con una sola consulta"""
+        urls = {}
+        for producto_id, imagen_id in cls.objects.filter(producto_id__in=producto_ids).order_by(
+            'producto_id', '-es_principal', 'orden', 'fecha_subida'
+        ).values_list('producto_id', 'id'):
+            urls.setdefault(producto_id, f"/producto/{producto_id}/imagen/{imagen_id}/")
+        return urls
+
     def save(self, *args, **kwargs):
         # Si esta imagen es principal, quitar el flag principal de otras imágenes del mismo producto
         if self.es_principal:
@@ -1025,6 +1114,10 @@ class Wishlist(models.Model):
         # Reducir stock del producto
         self.producto.reducir_stock(1)
 
+        # Incorporar la compra al recomendador sin esperar al próximo entrenamiento
+        from .services.recomendador_service import registrar_pedido
+        registrar_pedido(pedido)
+
         # Marcar contribuciones como procesadas
         self.contribuciones.filter(estado='completado').update(estado='procesado', pedido_generado=pedido)
 
@@ -1323,6 +1416,36 @@ class NewsletterCampaign(models.Model):
         self.estado = 'enviado'
         self.save()
 
+    def _recomendaciones_por_email(self, suscriptores, top_n=3):
+        """
+        Productos recomendados para los suscriptores que tienen cuenta en la tienda
+
+        Calcula todas las recomendaciones de la campaña en un solo lote.
+
+        Returns:
+            dict: {email en minúsculas: [Producto, ...]}
+        """
+        emails = {s.email.lower() for s in suscriptores if s.recibir_recomendaciones}
+        if not emails:
+            return {}
+        try:
+            from django.db.models.functions import Lower
+            from .services.recomendador_service import obtener_recomendador
+
+            usuarios = {}
+            for usuario_id, email in User.objects.filter(is_active=True).annotate(
+                email_normalizado=Lower('email')
+            ).filter(email_normalizado__in=emails).values_list('id', 'email_normalizado'):
+                usuarios.setdefault(usuario_id, email)
+            recomendaciones = obtener_recomendador().recomendar_batch(list(usuarios), top_n=top_n)
+            return {
+                email: [r['producto'] for r in recomendaciones.get(usuario_id, [])]
+                for usuario_id, email in usuarios.items()
+            }
+        except Exception as e:
+            logger.error(f"Error calculando recomendaciones del newsletter: {str(e)}")
+            return {}
+
     def send_campaign(self):
         """
         Envía la campaña de newsletter a todos los suscriptores objetivo.
@@ -1344,6 +1467,7 @@ class NewsletterCampaign(models.Model):
         suscriptores = self.obtener_suscriptores_target()
         emails_enviados = 0
         emails_fallidos = 0
+        recomendaciones_por_email = self._recomendaciones_por_email(suscriptores)
 
         for suscriptor in suscriptores:
             try:
@@ -1356,6 +1480,7 @@ class NewsletterCampaign(models.Model):
                     'suscriptor': suscriptor,
                     'unsubscribe_url': unsubscribe_url,
                     'es_prueba': False,
+                    'recomendaciones': recomendaciones_por_email.get(suscriptor.email.lower(), []),
                 }
 
                 # Renderizar contenido
@@ -1729,3 +1854,216 @@ class HistorialCompartir(models.Model):
 
     def __str__(self):
         return f"{self.usuario.username} compartió en {self.plataforma} - {self.fecha_compartido}"
+
+
+class DeltaInteraccion(models.Model):
+    """Compras nuevas pendientes de incorporar al recomendador.
+
+    Se registran en la misma transacción que el pedido; los workers las aplican
+    al modelo en memoria y `train_recommender` elimina las que ya quedaron
+    incluidas en un artefacto.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    cantidad = models.IntegerField()
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Delta de Interacción"
+        verbose_name_plural = "Deltas de Interacciones"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.usuario_id} → {self.producto_id} x{self.cantidad}"
+
+
+class PopularidadProducto(models.Model):
+    """Índice de popularidad por ventas, recalculado por `update_popularity_index`.
+
+    Una fila por producto vendido en los últimos 90 días. ``puntaje`` son las
+    unidades vendidas con decaimiento exponencial por antigüedad; los índices
+    permiten leer el top global o de una categoría sin ordenar toda la tabla.
+    ``categoria_ref`` copia la del producto al recalcular.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name='popularidad')
+    categoria_ref = models.ForeignKey(
+        Categoria, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    puntaje = models.FloatField(default=0)
+    unidades_7d = models.IntegerField(default=0)
+    unidades_30d = models.IntegerField(default=0)
+    unidades_90d = models.IntegerField(default=0)
+    ingresos_7d = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ingresos_30d = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ingresos_90d = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    fecha_calculo = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Popularidad de Producto"
+        verbose_name_plural = "Popularidad de Productos"
+        ordering = ['-puntaje']
+        indexes = [
+            models.Index(fields=['-puntaje']),
+            models.Index(fields=['categoria_ref', '-puntaje']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} ({self.puntaje:.1f})"
+
+
+class AsociacionProducto(models.Model):
+    """Regla "quien compra ``producto`` también compra ``recomendado``".
+
+    Generada por `update_product_associations` a partir de los pedidos; se
+    guardan solo las mejores reglas de cada producto, en el orden de ``posicion``.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='asociaciones')
+    recomendado = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+')
+    posicion = models.PositiveSmallIntegerField()
+    pedidos_juntos = models.IntegerField(help_text="Pedidos que contienen ambos productos")
+    soporte = models.FloatField(help_text="Fracción de pedidos con ambos productos")
+    confianza = models.FloatField(help_text="Fracción de los pedidos de producto que incluyen recomendado")
+    lift = models.FloatField(help_text="Confianza dividida por la popularidad de recomendado")
+
+    class Meta:
+        verbose_name = "Asociación de Productos"
+        verbose_name_plural = "Asociaciones de Productos"
+        ordering = ['producto', 'posicion']
+        unique_together = ['producto', 'recomendado']
+        indexes = [
+            models.Index(fields=['producto', 'posicion']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} → {self.recomendado_id} (lift {self.lift:.2f})"
+
+
+class SimilitudContenido(models.Model):
+    """Productos más parecidos por texto (nombre, categoría y descripción).
+
+    Los k vecinos de cada producto, generados por `update_content_similarity`
+    y actualizados al crear o editar un producto.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='similares_contenido')
+    similar = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+')
+    puntaje = models.FloatField(help_text="Similitud coseno entre los textos (0 a 1)")
+
+    class Meta:
+        verbose_name = "Similitud de Contenido"
+        verbose_name_plural = "Similitudes de Contenido"
+        ordering = ['producto', '-puntaje']
+        unique_together = ['producto', 'similar']
+        indexes = [
+            models.Index(fields=['producto', '-puntaje']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} ~ {self.similar_id} ({self.puntaje:.2f})"
+
+
+class ProductoRelacionado(models.Model):
+    """Lista precalculada de productos relacionados, en el orden de ``posicion``.
+
+    Mezcla compras conjuntas (``AsociacionProducto``), similitud de texto
+    (``SimilitudContenido``) y los más populares de la misma categoría.
+    La genera `update_related_products` y se rehace la de un producto al
+    editarlo; ``motivo`` es la fuente que más aportó al puntaje.
+    """
+    MOTIVO_CHOICES = [
+        ('compras', 'Comprados juntos'),
+        ('contenido', 'Similar'),
+        ('categoria', 'Misma categoría'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='relacionados')
+    relacionado = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+')
+    posicion = models.PositiveSmallIntegerField()
+    puntaje = models.FloatField()
+    motivo = models.CharField(max_length=10, choices=MOTIVO_CHOICES)
+
+    class Meta:
+        verbose_name = "Producto Relacionado"
+        verbose_name_plural = "Productos Relacionados"
+        ordering = ['producto', 'posicion']
+        unique_together = ['producto', 'relacionado']
+        indexes = [
+            models.Index(fields=['producto', 'posicion']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} → {self.relacionado_id} ({self.motivo}, {self.puntaje:.2f})"
+
+
+class RegistroBusqueda(models.Model):
+    """Evento del buscador del catálogo: una búsqueda o un clic en uno de sus resultados.
+
+    Se escriben por lotes desde un buffer en memoria (`AnaliticaBusquedaService`);
+    el clic apunta a su búsqueda por ``busqueda``. `rollup_search_stats` los
+    resume por día y borra los viejos.
+    """
+    TIPO_CHOICES = [
+        ('busqueda', 'Búsqueda'),
+        ('clic', 'Clic en resultado'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, default='busqueda')
+    busqueda = models.CharField(max_length=32, db_index=True, help_text="Id de la búsqueda (compartido con sus clics)")
+    fecha = models.DateTimeField(db_index=True)
+    consulta = models.CharField(max_length=200, blank=True, help_text="Texto buscado normalizado")
+    filtros = models.JSONField(default=dict, blank=True)
+    resultados = models.IntegerField(null=True, blank=True)
+    latencia_ms = models.FloatField(null=True, blank=True)
+    producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        verbose_name = "Registro de Búsqueda"
+        verbose_name_plural = "Registros de Búsquedas"
+        ordering = ['id']
+
+    def __str__(self):
+        if self.tipo == 'clic':
+            return f"{self.busqueda} → {self.producto_id}"
+        return f"'{self.consulta}' ({self.resultados} resultados, {self.latencia_ms:.0f}ms)"
+
+
+class ResumenBusquedasDia(models.Model):
+    """Totales de un día del buscador, generados por `rollup_search_stats`"""
+    fecha = models.DateField(unique=True)
+    busquedas = models.IntegerField(default=0)
+    sin_resultados = models.IntegerField(default=0)
+    con_clic = models.IntegerField(default=0, help_text="Búsquedas seguidas de al menos un clic en un resultado")
+    consultas_distintas = models.IntegerField(default=0)
+    latencia_p50_ms = models.FloatField(null=True, blank=True)
+    latencia_p95_ms = models.FloatField(null=True, blank=True)
+    fecha_calculo = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Resumen Diario de Búsquedas"
+        verbose_name_plural = "Resúmenes Diarios de Búsquedas"
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"{self.fecha}: {self.busquedas} búsquedas, p95 {self.latencia_p95_ms or 0:.0f}ms"
+
+
+class ResumenConsultaDia(models.Model):
+    """Cuántas veces se buscó una consulta en un día, con y sin resultados"""
+    fecha = models.DateField()
+    consulta = models.CharField(max_length=200)
+    busquedas = models.IntegerField(default=0)
+    sin_resultados = models.IntegerField(default=0)
+    con_clic = models.IntegerField(default=0)
+    resultados_promedio = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = "Resumen Diario de Consulta"
+        verbose_name_plural = "Resúmenes Diarios de Consultas"
+        ordering = ['fecha', '-busquedas']
+        unique_together = ['fecha', 'consulta']
+        indexes = [
+            models.Index(fields=['fecha', '-busquedas']),
+            models.Index(fields=['fecha', '-sin_resultados']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} '{self.consulta}' x{self.busquedas}"
@@ -1,143 +1,777 @@
-try:
-    import pandas as pd
-except Exception:
-    pd = None
-
-try:
-    from sklearn.metrics.pairwise import cosine_similarity
-except Exception:
-    cosine_similarity = None
-
 try:
     import numpy as np
 except Exception:
     np = None
 
-# If sklearn is not available, provide a lightweight numpy-based fallback
-if cosine_similarity is None:
-    if np is not None:
-        def _cosine_similarity(arr):
-            # Accept pandas DataFrame or numpy array
-            try:
-                mat = arr.values if hasattr(arr, 'values') else np.array(arr)
-            except Exception:
-                mat = np.array(arr)
-
-            # compute norms
-            norms = np.linalg.norm(mat, axis=1)
-            # avoid division by zero
-            norms[norms == 0] = 1.0
-            sim = mat.dot(mat.T) / (norms[:, None] * norms[None, :])
-            return sim
-
-        cosine_similarity = _cosine_similarity
-    else:
-        # Last-resort fallback: return identity-like similarity using pure python
-        def _cosine_similarity_py(arr):
-            # Try to get number of rows
-            try:
-                n = len(arr)
-            except Exception:
-                n = 0
-            return [[1.0 if i == j else 0.0 for j in range(n)] for i in range(n)]
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Max, Sum
+from django.utils import timezone
+from .models import DeltaInteraccion, PedidoProducto, Producto, User
+from .services.popularidad_service import PopularidadService
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_PEDIDO_COMPLETADO = ['pagado', 'enviado', 'entregado']
+
+# Confianza de cada estado como señal de gusto: un pedido entregado (y no
+# devuelto) pesa más que uno recién pagado. Las compras directas (Compra)
+# cuentan como entregadas.
+PESOS_ESTADO_PEDIDO = {'entregado': 1.0, 'enviado': 0.85, 'pagado': 0.7}
+
+# Archivo (dentro del directorio de artefactos) con el nombre de la versión activa
+ARCHIVO_VERSION_ACTUAL = 'ACTUAL'
+
+# Palabras sin valor para comparar productos por su texto
+PALABRAS_VACIAS = frozenset(
+    'de la el en y a o los las del al un una unos unas por con sin para que es se su sus lo como mas muy'.split()
+)
+
+
+# scipy.sparse se importa recién al entrenar (ver cargar_scipy): servir desde un
+# artefacto solo necesita NumPy. False = se intentó y no está instalado.
+_scipy_sparse = None
+
+
+def cargar_scipy():
+    """Importa scipy.sparse (una vez por proceso) y lo devuelve, o None si no está instalado.
+
+    A partir de ese momento las matrices nuevas se construyen con scipy; antes
+    (y siempre sin scipy) se usa MatrizCSR, que solo necesita NumPy.
+    """
+    global _scipy_sparse
+    if _scipy_sparse is None:
+        try:
+            from scipy import sparse
+        except Exception:
+            sparse = False
+        _scipy_sparse = sparse
+    return _scipy_sparse or None
+
+
+def es_scipy(matriz):
+    """True si ``matriz`` es una matriz dispersa de scipy (y no una MatrizCSR)"""
+    return bool(_scipy_sparse) and _scipy_sparse.issparse(matriz)
+
+
+def peso_interaccion(cantidades, edades_dias, pesos_estado=1.0, vida_media_dias=None):
+    """
+    Peso implícito de compras, calculado de forma vectorizada
+
+    ``peso = peso_estado · log1p(cantidad) · 0.5 ** (edad / vida_media)``: la
+    cantidad en escala logarítmica (50 unidades no valen 50 compras) y las
+    compras viejas pierden la mitad de su peso cada ``vida_media_dias``. Una
+    edad negativa (compra posterior a la referencia) pesa más que 1.
+
+    Args:
+        cantidades: Unidades de cada compra
+        edades_dias: Antigüedad de cada compra respecto de la referencia, en días
+        pesos_estado: Peso del estado del pedido de cada compra (o un escalar)
+        vida_media_dias: Sin decaimiento si es None o 0
+
+    Returns:
+        numpy.ndarray: Un peso float64 por compra
+    """
+    pesos = np.log1p(np.asarray(cantidades, dtype=np.float64)) * pesos_estado
+    if vida_media_dias:
+        pesos = pesos * 0.5 ** (np.asarray(edades_dias, dtype=np.float64) / vida_media_dias)
+    return pesos
+
+
+def vida_media_interacciones():
+    """Vida media (días) del peso de una compra en el recomendador"""
+    return getattr(settings, 'RECOMENDADOR_VIDA_MEDIA_DIAS', 180)
+
+
+def ultimo_delta_id():
+    """Id del último DeltaInteraccion registrado (0 si no hay)"""
+    return DeltaInteraccion.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+
+
+class MatrizCSR:
+    """Matriz dispersa en formato CSR respaldada por arrays de NumPy.
+
+    Se usa cuando scipy no está instalado. Expone los mismos atributos que
+    ``scipy.sparse.csr_matrix`` (``data``, ``indices``, ``indptr``, ``shape``)
+    para que el resto del recomendador trabaje igual con ambas.
+    """
+
+    def __init__(self, data, indices, indptr, shape):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = shape
+
+    @property
+    def nnz(self):
+        return int(self.data.shape[0])
+
+
+def construir_csr(filas, columnas, valores, shape):
+    """Construye una matriz CSR sumando las entradas duplicadas (fila, columna)"""
+    n_filas, n_columnas = shape
+    if filas.size:
+        # Ordenar por (fila, columna) y colapsar duplicados
+        orden = np.lexsort((columnas, filas))
+        filas, columnas, valores = filas[orden], columnas[orden], valores[orden]
+        nuevo = np.ones(filas.size, dtype=bool)
+        nuevo[1:] = (filas[1:] != filas[:-1]) | (columnas[1:] != columnas[:-1])
+        inicios = np.flatnonzero(nuevo)
+        valores = np.add.reduceat(valores, inicios)
+        filas, columnas = filas[inicios], columnas[inicios]
+
+    indptr = np.zeros(n_filas + 1, dtype=np.int64)
+    np.cumsum(np.bincount(filas, minlength=n_filas), out=indptr[1:])
+    return csr_desde_arrays(valores.astype(np.float32), columnas.astype(np.int32), indptr, shape)
+
+
+def csr_desde_arrays(data, indices, indptr, shape):
+    """Envuelve arrays CSR ya construidos (sin copiarlos si es posible)"""
+    shape = (int(shape[0]), int(shape[1]))
+    if _scipy_sparse:
+        return _scipy_sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+    return MatrizCSR(data, indices, indptr, shape)
+
+
+def sumar_por_fila(matriz, valores):
+    """Suma ``valores`` (alineado con ``matriz.data``) fila por fila"""
+    indptr = matriz.indptr
+    resultado = np.zeros(matriz.shape[0], dtype=np.float64)
+    no_vacias = indptr[:-1] < indptr[1:]
+    if valores.size:
+        resultado[no_vacias] = np.add.reduceat(valores, indptr[:-1][no_vacias])
+    return resultado
+
+
+def transponer_csr(matriz):
+    """Devuelve la transpuesta de una matriz CSR (también en formato CSR)"""
+    n_filas, n_columnas = matriz.shape
+    filas = np.repeat(np.arange(n_filas, dtype=np.int64), np.diff(matriz.indptr))
+    return construir_csr(
+        matriz.indices.astype(np.int64), filas,
+        np.asarray(matriz.data, dtype=np.float64), (n_columnas, n_filas)
+    )
+
+
+def producto_csr_denso(matriz, denso, celdas_por_bloque=4_000_000):
+    """Producto matriz CSR (n×m) por matriz densa (m×k)"""
+    if es_scipy(matriz):
+        return np.asarray(matriz.dot(denso))
+    resultado = np.zeros((matriz.shape[0], denso.shape[1]), dtype=np.float64)
+    indptr = matriz.indptr
+    no_vacias = indptr[:-1] < indptr[1:]
+    if matriz.nnz:
+        # Los productos parciales ocupan nnz×columnas: procesar por bloques de columnas
+        bloque = max(1, celdas_por_bloque // matriz.nnz)
+        for inicio in range(0, denso.shape[1], bloque):
+            parciales = matriz.data[:, None] * denso[matriz.indices, inicio:inicio + bloque]
+            resultado[no_vacias, inicio:inicio + bloque] = np.add.reduceat(
+                parciales, indptr[:-1][no_vacias], axis=0
+            )
+    return resultado
+
+
+def svd_truncada(matriz, k, iteraciones=4, semilla=0):
+    """
+    SVD truncada aleatorizada (Halko et al.) de una matriz CSR
+
+    Usa ``sklearn.utils.extmath.randomized_svd`` si está disponible y la matriz
+    es de scipy; si no, la misma técnica implementada solo con NumPy.
+
+    Returns:
+        tuple: (U, S, V) con U (n×k), S (k,) y V (m×k)
+    """
+    n, m = matriz.shape
+    k = max(1, min(k, n, m))
+    if es_scipy(matriz):
+        try:
+            from sklearn.utils.extmath import randomized_svd
+        except Exception:
+            randomized_svd = None
+        if randomized_svd is not None:
+            u, s, vt = randomized_svd(matriz, k, n_iter=iteraciones, random_state=semilla)
+            return u, s, vt.T
+
+    rng = np.random.default_rng(semilla)
+    transpuesta = transponer_csr(matriz)
+    muestras = min(k + 10, n, m)
+    q, _ = np.linalg.qr(producto_csr_denso(matriz, rng.standard_normal((m, muestras))))
+    for _ in range(iteraciones):
+        z, _ = np.linalg.qr(producto_csr_denso(transpuesta, q))
+        q, _ = np.linalg.qr(producto_csr_denso(matriz, z))
+    # B = Qᵀ X, chica (muestras × m): su SVD exacta da la de X proyectada
+    u_b, s, vt = np.linalg.svd(producto_csr_denso(transpuesta, q).T, full_matrices=False)
+    return (q @ u_b)[:, :k], s[:k], vt[:k].T
+
+
+def filas_densas(matriz, filas):
+    """Filas indicadas (array de índices) de una matriz CSR como array denso"""
+    filas = np.asarray(filas, dtype=np.int64)
+    bloque = np.zeros((filas.size, matriz.shape[1]), dtype=np.float32)
+    inicios = matriz.indptr[filas]
+    largos = matriz.indptr[filas + 1] - inicios
+    # Posiciones en data/indices de todas las entradas de las filas pedidas
+    desplazamientos = np.arange(largos.sum()) - np.repeat(np.cumsum(largos) - largos, largos)
+    posiciones = np.repeat(inicios, largos) + desplazamientos
+    bloque[np.repeat(np.arange(filas.size), largos), matriz.indices[posiciones]] = matriz.data[posiciones]
+    return bloque
+
+
+def seleccionar_top_k(candidatos, puntajes, k):
+    """Por fila, los ``k`` candidatos de mayor puntaje (> 0), ordenados.
+
+    Devuelve ``(vecinos, puntajes)`` de forma (filas × k), con -1/0 de relleno.
+    """
+    filas, columnas = puntajes.shape
+    vecinos_top = np.full((filas, k), -1, dtype=np.int32)
+    puntajes_top = np.zeros((filas, k), dtype=np.float32)
+    k_efectivo = min(k, columnas)
+    if k_efectivo == 0:
+        return vecinos_top, puntajes_top
+
+    top = np.argpartition(-puntajes, k_efectivo - 1, axis=1)[:, :k_efectivo]
+    top_puntajes = np.take_along_axis(puntajes, top, axis=1)
+    orden = np.argsort(-top_puntajes, axis=1)
+    top = np.take_along_axis(top, orden, axis=1)
+    top_puntajes = np.take_along_axis(top_puntajes, orden, axis=1)
+    top_candidatos = np.take_along_axis(candidatos, top, axis=1)
+
+    validos = (top_puntajes > 0) & (top_candidatos >= 0)
+    vecinos_top[:, :k_efectivo] = np.where(validos, top_candidatos, -1)
+    puntajes_top[:, :k_efectivo] = np.where(validos, top_puntajes, 0.0)
+    return vecinos_top, puntajes_top
+
+
+def top_por_fila(scores, top_n):
+    """Columnas con mayor score de cada fila de una matriz densa, ordenadas
+
+    Returns:
+        tuple: (columnas, scores), ambas de forma (filas × min(top_n, columnas))
+    """
+    n = min(top_n, scores.shape[1])
+    top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    orden = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    top = np.take_along_axis(top, orden, axis=1)
+    return top, np.take_along_axis(scores, top, axis=1)
+
+
+class InteraccionesUsuarioProducto:
+    """Matriz usuario×producto con los mapas id ↔ fila/columna.
+
+    Los valores son pesos de interacción (ver ``peso_interaccion``), con la
+    antigüedad medida respecto de ``referencia`` (timestamp Unix, o None si
+    los pesos no decaen con el tiempo).
+    """
+
+    def __init__(self, matriz, usuario_ids, producto_ids, referencia=None):
+        self.matriz = matriz
+        # Ambos arrays están ordenados: la búsqueda inversa es un bisect
+        # (sin diccionarios por proceso, así el artefacto se puede compartir)
+        self.usuario_ids = usuario_ids    # fila -> User.id
+        self.producto_ids = producto_ids  # columna -> Producto.id
+        self.referencia = referencia
+
+    @staticmethod
+    def _buscar(ids, valor):
+        posicion = int(np.searchsorted(ids, valor))
+        if posicion < ids.size and ids[posicion] == valor:
+            return posicion
+        return None
+
+    def fila_de_usuario(self, usuario_id):
+        """Fila del usuario en la matriz (o None si no tiene compras)"""
+        return self._buscar(self.usuario_ids, usuario_id)
+
+    def columna_de_producto(self, producto_id):
+        """Columna del producto en la matriz (o None si nunca se vendió)"""
+        return self._buscar(self.producto_ids, producto_id)
+
+    @property
+    def vacia(self):
+        return self.matriz.nnz == 0
+
+    def productos_de(self, fila):
+        """Columnas compradas por el usuario de la fila dada y sus pesos"""
+        inicio, fin = self.matriz.indptr[fila], self.matriz.indptr[fila + 1]
+        return self.matriz.indices[inicio:fin], self.matriz.data[inicio:fin]
+
+    def como_tripletas(self):
+        """Arrays (usuario_id, producto_id, peso) de todas las interacciones"""
+        filas = np.repeat(np.arange(self.matriz.shape[0]), np.diff(self.matriz.indptr))
+        return (
+            np.asarray(self.usuario_ids)[filas],
+            np.asarray(self.producto_ids)[self.matriz.indices],
+            np.asarray(self.matriz.data, dtype=np.float64),
+        )
+
+    @classmethod
+    def desde_tripletas(cls, usuarios, productos, pesos, referencia=None):
+        """Construye la matriz a partir de arrays (usuario_id, producto_id, peso); los repetidos se suman"""
+        # Se construye para entrenar: desde acá conviene el álgebra dispersa de scipy
+        cargar_scipy()
+        usuario_ids, filas = np.unique(usuarios, return_inverse=True)
+        producto_ids, columnas = np.unique(productos, return_inverse=True)
+        matriz = construir_csr(
+            filas.astype(np.int64), columnas.astype(np.int64),
+            np.asarray(pesos, dtype=np.float64),
+            (usuario_ids.size, producto_ids.size)
+        )
+        return cls(matriz, usuario_ids, producto_ids, referencia=referencia)
+
+    @classmethod
+    def desde_bd(cls, referencia=None, vida_media_dias=None):
+        """
+        Carga las compras agregadas en la base y las convierte en pesos
+
+        Cada fila de las consultas es un (usuario, producto, pedido) con las
+        unidades ya sumadas por la base, así que el costo depende de las líneas
+        de pedido y no de las cantidades. El peso de cada fila se calcula en
+        una sola pasada con ``peso_interaccion`` y se suma por (usuario, producto).
+
+        Args:
+            referencia: Instante respecto del que se mide la antigüedad (default: ahora)
+            vida_media_dias: Vida media del peso de una compra
+                (default: settings.RECOMENDADOR_VIDA_MEDIA_DIAS)
+        """
+        from .models import CompraProducto
+
+        referencia = referencia or timezone.now()
+        if vida_media_dias is None:
+            vida_media_dias = vida_media_interacciones()
+
+        filas = list(
+            PedidoProducto.objects.filter(pedido__estado__in=ESTADOS_PEDIDO_COMPLETADO)
+            .values_list('pedido__usuario_id', 'producto_id', 'pedido__estado', 'pedido__fecha_creacion')
+            .annotate(total=Sum('cantidad'))
+            .order_by()
+            .iterator(chunk_size=5000)
+        )
+        filas.extend(
+            (usuario_id, producto_id, 'entregado', fecha, total)
+            for usuario_id, producto_id, fecha, total in CompraProducto.objects
+            .values_list('compra__usuario_id', 'producto_id', 'compra__fecha')
+            .annotate(total=Sum('cantidad'))
+            .order_by()
+            .iterator(chunk_size=5000)
+        )
+
+        n = len(filas)
+        pesos = peso_interaccion(
+            np.fromiter((f[4] or 0 for f in filas), dtype=np.float64, count=n),
+            np.fromiter(((referencia - f[3]).total_seconds() / 86400 for f in filas), dtype=np.float64, count=n),
+            np.fromiter((PESOS_ESTADO_PEDIDO.get(f[2], 1.0) for f in filas), dtype=np.float64, count=n),
+            vida_media_dias,
+        )
+        return cls.desde_tripletas(
+            np.fromiter((f[0] for f in filas), dtype=np.int64, count=n),
+            np.fromiter((f[1] for f in filas), dtype=np.int64, count=n),
+            pesos,
+            referencia=referencia.timestamp() if vida_media_dias else None,
+        )
+
+
+class ModeloItemItem:
+    """Similitud producto-producto (co-compra) precalculada.
+
+    Para cada producto guarda solo sus ``k`` vecinos más similares en dos
+    arrays compactos (``vecinos`` y ``puntajes``, ambos productos×k). Un
+    vecino ``-1`` indica hueco de relleno.
+    """
+
+    # Tamaño máximo (en celdas) de los bloques densos usados al entrenar
+    CELDAS_POR_BLOQUE = 4_000_000
+
+    def __init__(self, vecinos, puntajes):
+        self.vecinos = vecinos
+        self.puntajes = puntajes
+
+    @property
+    def k(self):
+        return self.vecinos.shape[1]
+
+    @classmethod
+    def entrenar(cls, interacciones, k=20):
+        """Calcula la similitud coseno entre productos y conserva el top-k de cada uno"""
+        n_productos = interacciones.matriz.shape[1]
+        k = max(1, min(k, n_productos - 1)) if n_productos > 1 else 1
+        modelo = cls(
+            np.full((n_productos, k), -1, dtype=np.int32),
+            np.zeros((n_productos, k), dtype=np.float32),
+        )
+        if n_productos < 2:
+            return modelo
+        return modelo.actualizar(interacciones, np.arange(n_productos))
+
+    @classmethod
+    def _similitudes_por_bloques(cls, interacciones, columnas):
+        """Genera ``(columnas_bloque, similitudes)`` con similitudes (productos × bloque)"""
+        matriz_t = transponer_csr(interacciones.matriz)  # productos × usuarios
+        n_productos, n_usuarios = matriz_t.shape
+        normas = np.sqrt(sumar_por_fila(matriz_t, np.asarray(matriz_t.data, dtype=np.float64) ** 2))
+        normas[normas == 0] = 1.0
+
+        # Sin scipy el producto disperso materializa nnz×bloque valores intermedios
+        celdas_por_columna = max(n_usuarios, n_productos, 0 if es_scipy(matriz_t) else matriz_t.nnz)
+        bloque = max(1, min(1024, cls.CELDAS_POR_BLOQUE // celdas_por_columna))
+        for inicio in range(0, len(columnas), bloque):
+            columnas_bloque = columnas[inicio:inicio + bloque]
+            # Co-ocurrencias de todos los productos contra el bloque
+            coocurrencias = producto_csr_denso(matriz_t, filas_densas(matriz_t, columnas_bloque).T)
+            similitudes = coocurrencias / (normas[:, None] * normas[None, columnas_bloque])
+            similitudes[columnas_bloque, np.arange(columnas_bloque.size)] = 0.0
+            yield columnas_bloque, similitudes
+
+    def actualizar(self, interacciones, columnas):
+        """
+        Recalcula la similitud de los productos en ``columnas`` contra todo el catálogo
+
+        La similitud coseno entre dos productos solo cambia si cambió la columna
+        de alguno de ellos: las listas de ``columnas`` se rehacen completas y en
+        el resto de los productos se reemplazan las entradas hacia ellas. Es una
+        aproximación: si un producto afectado baja o sale de la lista de otro,
+        ese lugar no lo recupera un vecino descartado al entrenar (el modelo solo
+        guarda el top k), así que la lista queda más corta o con un vecino peor
+        hasta el próximo entrenamiento completo.
+
+        Returns:
+            ModeloItemItem: Modelo nuevo (no modifica el actual)
+        """
+        vecinos, puntajes = np.array(self.vecinos), np.array(self.puntajes)
+        n_productos = vecinos.shape[0]
+        columnas = np.asarray(columnas, dtype=np.int64)
+
+        # Si se recalculan todas las columnas (entrenamiento completo) no hace falta fusionar
+        fusionar = columnas.size < n_productos
+        for columnas_bloque, similitudes in self._similitudes_por_bloques(interacciones, columnas):
+            if fusionar:
+                # Fusionar en todas las filas: entradas viejas no afectadas + nuevas similitudes
+                vigentes = (vecinos >= 0) & ~np.isin(vecinos, columnas_bloque)
+                candidatos = np.concatenate([
+                    np.where(vigentes, vecinos, -1),
+                    np.broadcast_to(columnas_bloque, (n_productos, columnas_bloque.size)),
+                ], axis=1)
+                candidatos_puntajes = np.concatenate([np.where(vigentes, puntajes, 0.0), similitudes], axis=1)
+                vecinos, puntajes = seleccionar_top_k(candidatos, candidatos_puntajes, self.k)
+
+            # Las filas de los productos del bloque se recalculan completas
+            vecinos[columnas_bloque], puntajes[columnas_bloque] = seleccionar_top_k(
+                np.broadcast_to(np.arange(n_productos), (columnas_bloque.size, n_productos)),
+                similitudes.T, self.k
+            )
+
+        return ModeloItemItem(vecinos, puntajes)
+
+    def remapear(self, mapa_columnas, n_productos):
+        """Traslada el modelo a una matriz con más columnas (``mapa_columnas[vieja] = nueva``)"""
+        vecinos = np.full((n_productos, self.k), -1, dtype=np.int32)
+        puntajes = np.zeros((n_productos, self.k), dtype=np.float32)
+        validos = self.vecinos >= 0
+        vecinos[mapa_columnas] = np.where(validos, mapa_columnas[np.where(validos, self.vecinos, 0)], -1)
+        puntajes[mapa_columnas] = self.puntajes
+        return ModeloItemItem(vecinos, puntajes)
+
+    def puntuar(self, columnas, pesos, top_n):
+        """Suma las filas de vecinos de los productos del usuario.
+
+        Devuelve ``[(columna, score), ...]`` excluyendo los productos ya
+        comprados. El costo depende de ``len(columnas) * k``, no del catálogo.
+        """
+        if len(columnas) == 0:
+            return []
+        candidatos = self.vecinos[columnas].ravel()
+        aportes = (self.puntajes[columnas] * np.asarray(pesos, dtype=np.float32)[:, None]).ravel()
+
+        mascara = (candidatos >= 0) & ~np.isin(candidatos, columnas)
+        candidatos, aportes = candidatos[mascara], aportes[mascara]
+        if candidatos.size == 0:
+            return []
+
+        unicos, inversa = np.unique(candidatos, return_inverse=True)
+        scores = np.bincount(inversa, weights=aportes)
+        n = min(top_n, unicos.size)
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return [(int(unicos[i]), float(scores[i])) for i in top]
+
+    def puntuar_matriz(self, historiales):
+        """Scores densos (usuarios×productos) de un bloque de historiales en CSR.
+
+        Equivale a ``puntuar`` para cada fila: cada producto comprado reparte
+        su peso entre sus ``k`` vecinos, acumulado con un único ``bincount``.
+        """
+        filas, productos = historiales.shape
+        por_fila = np.repeat(np.arange(filas, dtype=np.int64), np.diff(historiales.indptr))
+        vecinos = self.vecinos[historiales.indices]
+        aportes = self.puntajes[historiales.indices] * np.asarray(historiales.data)[:, None]
+        validos = vecinos >= 0
+        lineal = (por_fila[:, None] * productos + vecinos)[validos]
+        return np.bincount(
+            lineal, weights=aportes[validos], minlength=filas * productos
+        ).reshape(filas, productos)
+
+
+class ModeloFactorizacion:
+    """Factorización de rango bajo de la matriz usuario×producto (SVD truncada).
+
+    ``producto_factores`` (productos×f) y ``usuario_factores`` (usuarios×f)
+    cumplen ``usuario_factores ≈ X · producto_factores``, así que el factor de
+    cualquier historial (incluso de un usuario nuevo o con compras recientes)
+    se obtiene sumando las filas de sus productos. Puntuar es un producto
+    punto contra todos los productos y un ``argpartition``.
+    """
+
+    def __init__(self, usuario_factores, producto_factores):
+        self.usuario_factores = usuario_factores
+        self.producto_factores = producto_factores
+
+    @classmethod
+    def entrenar(cls, interacciones, factores=32):
+        # Los valores de la matriz ya son pesos (escala logarítmica y decaimiento)
+        matriz = interacciones.matriz
+        _, _, v = svd_truncada(matriz, factores)
+        producto_factores = v.astype(np.float32)
+        # X · V (= U · S salvo el error de la aproximación aleatorizada), igual que al servir
+        usuario_factores = producto_csr_denso(matriz, producto_factores).astype(np.float32)
+        return cls(usuario_factores, producto_factores)
+
+    @property
+    def factores(self):
+        return self.producto_factores.shape[1]
+
+    def factor_de(self, columnas, pesos):
+        """Factor latente de un historial (columnas compradas y sus pesos)"""
+        return np.asarray(pesos, dtype=np.float32) @ self.producto_factores[columnas]
+
+    def puntuar(self, columnas, pesos, top_n):
+        """Devuelve ``[(columna, score), ...]`` excluyendo los productos ya comprados"""
+        if len(columnas) == 0:
+            return []
+        scores = self.producto_factores @ self.factor_de(columnas, pesos)
+        scores[columnas] = -np.inf
+        n = min(top_n, scores.size - len(columnas))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return [(int(c), float(scores[c])) for c in top if scores[c] > 0]
+
+    def puntuar_matriz(self, historiales):
+        """Scores densos (usuarios×productos) de un bloque de historiales en CSR"""
+        factores = producto_csr_denso(historiales, self.producto_factores)
+        return factores @ self.producto_factores.T
+
+    def remapear(self, mapa_columnas, interacciones):
+        """Traslada los factores de producto a una matriz con más columnas.
+
+        Los productos nuevos quedan con factor cero hasta el próximo
+        entrenamiento; los factores de usuario se recalculan como X · V.
+        """
+        producto_factores = np.zeros(
+            (interacciones.producto_ids.size, self.factores), dtype=np.float32
+        )
+        producto_factores[mapa_columnas] = self.producto_factores
+        usuario_factores = producto_csr_denso(interacciones.matriz, producto_factores).astype(np.float32)
+        return ModeloFactorizacion(usuario_factores, producto_factores)
+
+
+def tokenizar(texto):
+    """Palabras de 2+ caracteres en minúsculas y sin acentos, sin palabras vacías"""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in re.findall(r'\w\w+', texto) if t not in PALABRAS_VACIAS]
+
+
+class ModeloContenido:
+    """Similitud entre productos por su texto (TF-IDF de nombre, categoría y descripción).
+
+    ``matriz`` tiene un vector TF-IDF normalizado por producto (CSR, filas en
+    el orden de ``producto_ids``), así que la similitud coseno es un producto
+    punto. No depende de las ventas: sirve para productos recién creados.
+    El vocabulario y el idf se fijan al entrenar; ``vectorizar`` los usa para
+    productos nuevos o editados.
+    """
+
+    ARRAYS = ('producto_ids', 'hashes', 'idf', 'indptr', 'indices', 'data')
+
+    def __init__(self, producto_ids, hashes, vocabulario, idf, matriz, k=10):
+        self.producto_ids = producto_ids
+        self.hashes = hashes
+        self.vocabulario = vocabulario
+        self.idf = idf
+        self.matriz = matriz
+        self.k = k  # vecinos por producto guardados en el índice
+
+    @staticmethod
+    def texto_de(nombre, categoria, descripcion):
+        # Nombre y categoría repetidos: pesan más que la descripción
+        return f"{nombre} {nombre} {categoria} {categoria} {descripcion or ''}"
+
+    @staticmethod
+    def hash_texto(texto):
+        return int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+    @classmethod
+    def entrenar(cls, productos, k=10):
+        """
+        Ajusta el TF-IDF (scikit-learn) sobre todo el catálogo
+
+        Args:
+            productos: Iterable de (producto_id, texto)
+            k: Vecinos por producto que se guardarán en el índice
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        cargar_scipy()
+        productos = sorted(productos)
+        producto_ids = np.array([p for p, _ in productos], dtype=np.int64)
+        textos = [t for _, t in productos]
+        hashes = np.array([cls.hash_texto(t) for t in textos], dtype=np.int64)
+
+        vectorizador = TfidfVectorizer(
+            tokenizer=tokenizar, lowercase=False, token_pattern=None, sublinear_tf=True, dtype=np.float32
+        )
+        try:
+            matriz = vectorizador.fit_transform(textos).tocsr()
+        except ValueError:
+            # Catálogo vacío o sin ninguna palabra útil
+            return cls(producto_ids, hashes, {}, np.zeros(0, dtype=np.float32),
+                       construir_csr(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                                     np.zeros(0, dtype=np.float32), (producto_ids.size, 0)), k=k)
+        vocabulario = {termino: int(i) for termino, i in vectorizador.vocabulary_.items()}
+        matriz = csr_desde_arrays(
+            matriz.data.astype(np.float32), matriz.indices.astype(np.int32), matriz.indptr.astype(np.int64),
+            matriz.shape,
+        )
+        return cls(producto_ids, hashes, vocabulario, vectorizador.idf_.astype(np.float32), matriz, k=k)
+
+    def fila_de(self, producto_id):
+        fila = int(np.searchsorted(self.producto_ids, producto_id))
+        if fila < self.producto_ids.size and self.producto_ids[fila] == producto_id:
+            return fila
+        return None
+
+    def vectorizar(self, texto):
+        """Vector TF-IDF ``(indices, valores)`` de un texto, igual que al entrenar"""
+        conteos = Counter(self.vocabulario[t] for t in tokenizar(texto) if t in self.vocabulario)
+        if not conteos:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        indices = np.array(sorted(conteos), dtype=np.int32)
+        valores = (1 + np.log([conteos[i] for i in indices.tolist()])) * self.idf[indices]
+        return indices, (valores / np.linalg.norm(valores)).astype(np.float32)
+
+    def similitudes(self, indices, valores):
+        """Similitud coseno de un vector contra todos los productos"""
+        denso = np.zeros((self.idf.size, 1), dtype=np.float32)
+        denso[indices, 0] = valores
+        return producto_csr_denso(self.matriz, denso)[:, 0]
+
+    def vecinos(self):
+        """Genera ``(filas, vecinos, puntajes)`` por bloques: los k productos más similares de cada fila"""
+        n = self.producto_ids.size
+        if n == 0:
+            return
+        usar_scipy = es_scipy(self.matriz)
+        transpuesta = self.matriz.T.tocsr() if usar_scipy else None
+        bloque = max(1, ModeloItemItem.CELDAS_POR_BLOQUE // max(n, self.idf.size))
+        for inicio in range(0, n, bloque):
+            filas = np.arange(inicio, min(n, inicio + bloque))
+            if usar_scipy:
+                similitudes = (self.matriz[filas] @ transpuesta).toarray()
+            else:
+                similitudes = producto_csr_denso(self.matriz, filas_densas(self.matriz, filas).T).T
+            similitudes[np.arange(filas.size), filas] = -np.inf
+            vecinos, puntajes = top_por_fila(similitudes, self.k)
+            yield filas, vecinos, puntajes
+
+    def guardar(self, directorio):
+        """Escribe el modelo en un directorio nuevo (un .npy por array y el vocabulario)"""
+        os.makedirs(directorio, exist_ok=True)
+        arrays = {
+            'producto_ids': self.producto_ids, 'hashes': self.hashes, 'idf': self.idf,
+            'indptr': self.matriz.indptr, 'indices': self.matriz.indices, 'data': self.matriz.data,
+        }
+        for nombre in self.ARRAYS:
+            np.save(os.path.join(directorio, f'{nombre}.npy'), np.ascontiguousarray(arrays[nombre]))
+        with open(os.path.join(directorio, 'vocabulario.json'), 'w', encoding='utf-8') as f:
+            json.dump({'vecinos': self.k, 'vocabulario': self.vocabulario}, f, ensure_ascii=False)
+
+    @classmethod
+    def cargar(cls, directorio):
+        arrays = {nombre: np.load(os.path.join(directorio, f'{nombre}.npy')) for nombre in cls.ARRAYS}
+        with open(os.path.join(directorio, 'vocabulario.json'), encoding='utf-8') as f:
+            guardado = json.load(f)
+        matriz = csr_desde_arrays(
+            arrays['data'], arrays['indices'], arrays['indptr'],
+            (arrays['producto_ids'].size, arrays['idf'].size),
+        )
+        return cls(arrays['producto_ids'], arrays['hashes'], guardado['vocabulario'], arrays['idf'], matriz,
+                   k=guardado['vecinos'])
 
-        cosine_similarity = _cosine_similarity_py
-from django.db import models
-from .models import Pedido, PedidoProducto, Producto, User
 
 class RecomendadorIA:
-    def __init__(self):
-        self.matriz_usuario_producto = None
-        self.productos_dict = {}
+    MODOS = ('item', 'usuario', 'factorizacion')
+    RAZONES = {
+        'item': "Clientes que compraron lo mismo que vos también compraron este producto",
+        'usuario': "Usuarios similares compraron este producto",
+        'factorizacion': "Recomendado según tus gustos de compra",
+    }
+    RAZON_CONTENIDO = "Parecido a productos que compraste"
+    # Con esta cantidad de productos distintos comprados, colaborativo y contenido
+    # pesan lo mismo; con más historial domina el colaborativo
+    HISTORIAL_CONFIABLE = 5
+    # Por encima de este peso colaborativo no se consulta la similitud de contenido
+    PESO_SOLO_COLABORATIVO = 0.8
+    # Candidatos puntuados por recomendación pedida en recomendar_batch
+    CANDIDATOS_POR_RECOMENDACION = 3
+
+    def __init__(self, modo='item', vecinos_por_producto=20, factores=32):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de recomendación no soportado: {modo}")
+        self.modo = modo
+        self.vecinos_por_producto = vecinos_por_producto
+        self.factores = factores
+        self.modelo_item = None
+        self.modelo_factores = None
+        self.interacciones = None
+        self.popularidad = None  # peso total de las compras de cada columna
+        self.version = None
+        # Compras posteriores al entrenamiento (ver aplicar_deltas)
+        self.ultimo_delta_id = 0
+        self._deltas = []
+        self._historial_extra = {}  # usuario_id -> {producto_id: peso}
         # No cargar datos en tiempo de import para evitar dependencias pesadas
         # Carga de datos cuando se necesite (primera llamada a recomendar o manualmente).
-        self.df = None
+        self._normas_usuarios = None
+
+    @property
+    def matriz_usuario_producto(self):
+        return self.interacciones.matriz if self.interacciones is not None else None
 
     def _cargar_datos_reales(self):
         """Carga datos reales de compras desde la base de datos"""
         try:
-            # Obtener todos los pedidos completados
-            pedidos = Pedido.objects.filter(estado__in=['pagado', 'enviado', 'entregado'])
-
-            # También obtener compras directas del modelo Compra
-            from .models import Compra, CompraProducto
-            compras_directas = Compra.objects.all()
-
-            # Crear lista de interacciones usuario-producto
-            interacciones = []
-            usuarios_unicos = set()
-            productos_unicos = set()
-
-            # Procesar pedidos
-            for pedido in pedidos:
-                usuario_id = f"user_{pedido.usuario.id}"
-                usuarios_unicos.add(usuario_id)
-
-                productos_pedido = PedidoProducto.objects.filter(pedido=pedido)
-                for prod_pedido in productos_pedido:
-                    producto_id = f"prod_{prod_pedido.producto.id}"
-                    productos_unicos.add(producto_id)
-
-                    # Agregar múltiples entradas si la cantidad es mayor a 1 (para dar más peso)
-                    for _ in range(prod_pedido.cantidad):
-                        interacciones.append({
-                            'usuario': usuario_id,
-                            'producto': producto_id
-                        })
-
-                    # Guardar información del producto
-                    self.productos_dict[producto_id] = {
-                        'id': prod_pedido.producto.id,
-                        'nombre': prod_pedido.producto.nombre,
-                        'categoria': prod_pedido.producto.categoria
-                    }
-
-            # Procesar compras directas
-            for compra in compras_directas:
-                usuario_id = f"user_{compra.usuario.id}"
-                usuarios_unicos.add(usuario_id)
-
-                productos_compra = CompraProducto.objects.filter(compra=compra)
-                for prod_compra in productos_compra:
-                    producto_id = f"prod_{prod_compra.producto.id}"
-                    productos_unicos.add(producto_id)
-
-                    # Agregar múltiples entradas si la cantidad es mayor a 1
-                    for _ in range(prod_compra.cantidad):
-                        interacciones.append({
-                            'usuario': usuario_id,
-                            'producto': producto_id
-                        })
-
-                    # Guardar información del producto (si no existe ya)
-                    if producto_id not in self.productos_dict:
-                        self.productos_dict[producto_id] = {
-                            'id': prod_compra.producto.id,
-                            'nombre': prod_compra.producto.nombre,
-                            'categoria': prod_compra.producto.categoria
-                        }
-
-
-            if not interacciones:
+            if np is None:
+                raise RuntimeError('numpy no está instalado en el entorno')
+
+            # Leer el último delta antes que las compras: todo delta posterior
+            # corresponde a un pedido que quizás no esté en esta carga
+            self.ultimo_delta_id = ultimo_delta_id()
+            interacciones = InteraccionesUsuarioProducto.desde_bd()
+            if interacciones.vacia:
                 # Si no hay pedidos ni compras, usar datos simulados como fallback
                 self._usar_datos_simulados()
                 return
 
-            # Asegurarse de que pandas esté disponible
-            if pd is None:
-                raise RuntimeError('pandas no está instalado en el entorno')
-
-            # Crear DataFrame
-            self.df = pd.DataFrame(interacciones)
-
-            # Crear matriz usuario-producto
-            usuarios = list(usuarios_unicos)
-            productos = list(productos_unicos)
-            self.matriz_usuario_producto = pd.DataFrame(0, index=usuarios, columns=productos)
-
-            # Llenar la matriz con las interacciones
-            for _, row in self.df.iterrows():
-                self.matriz_usuario_producto.loc[row['usuario'], row['producto']] += 1
+            self._asignar_interacciones(interacciones)
 
         except Exception as e:
             print(f"Error cargando datos reales: {e}")
@@ -145,132 +779,526 @@ class RecomendadorIA:
 
     def _usar_datos_simulados(self):
         """Fallback a datos simulados si no hay datos reales"""
-        self.data = {
-            'usuario': ['user1', 'user1', 'user2', 'user2', 'user3', 'user3'],
-            'producto': ['laptop', 'mouse', 'laptop', 'auriculares', 'libro', 'mouse']
+        if np is None:
+            self.interacciones = None
+            return
+        # Usuarios con ids negativos: nunca coinciden con un usuario real
+        usuarios = np.array([-1, -1, -2, -2, -3, -3], dtype=np.int64)
+        productos = np.array([1, 2, 1, 4, 3, 2], dtype=np.int64)
+        cantidades = np.ones(usuarios.size, dtype=np.float64)
+        self._asignar_interacciones(
+            InteraccionesUsuarioProducto.desde_tripletas(usuarios, productos, cantidades)
+        )
+
+    def _asignar_interacciones(self, interacciones, modelo_item=None, popularidad=None,
+                               normas_usuarios=None, modelo_factores=None):
+        matriz = interacciones.matriz
+        self.interacciones = interacciones
+        if normas_usuarios is None:
+            normas_usuarios = np.sqrt(sumar_por_fila(matriz, matriz.data.astype(np.float64) ** 2))
+        self._normas_usuarios = normas_usuarios
+        if popularidad is None:
+            popularidad = np.bincount(matriz.indices, weights=matriz.data, minlength=matriz.shape[1])
+        self.popularidad = popularidad
+        if modelo_item is not None:
+            self.modelo_item = modelo_item
+        elif self.modo == 'item':
+            self.modelo_item = ModeloItemItem.entrenar(interacciones, k=self.vecinos_por_producto)
+        if modelo_factores is not None:
+            self.modelo_factores = modelo_factores
+        elif self.modo == 'factorizacion':
+            self.modelo_factores = ModeloFactorizacion.entrenar(interacciones, factores=self.factores)
+
+    def entrenar(self, interacciones):
+        """Entrena el modelo con una matriz de interacciones ya cargada"""
+        self._asignar_interacciones(interacciones)
+
+    # Arrays que componen un artefacto; cada uno se guarda como ``<nombre>.npy``
+    ARRAYS_ARTEFACTO = (
+        'usuario_ids', 'producto_ids', 'indptr', 'indices', 'data',
+        'normas_usuarios', 'vecinos', 'puntajes', 'popularidad',
+    )
+    # Opcionales: artefactos anteriores al modo factorización no los tienen
+    ARRAYS_FACTORIZACION = ('usuario_factores', 'producto_factores')
+
+    def guardar_artefacto(self, directorio):
+        """
+        Guarda el modelo entrenado en ``directorio`` (un ``.npy`` por array)
+
+        Se usan archivos ``.npy`` sin comprimir para poder abrirlos con
+        ``numpy.memmap``: todos los workers comparten las mismas páginas del
+        page cache en lugar de tener cada uno su copia.
+
+        Returns:
+            dict: Cantidad de usuarios, productos, interacciones y vecinos guardados
+        """
+        if self.interacciones is None:
+            raise ValueError("El recomendador no tiene datos cargados")
+        if self.modelo_item is None:
+            self.modelo_item = ModeloItemItem.entrenar(self.interacciones, k=self.vecinos_por_producto)
+        if self.modelo_factores is None and self.factores:
+            self.modelo_factores = ModeloFactorizacion.entrenar(self.interacciones, factores=self.factores)
+
+        matriz = self.interacciones.matriz
+        arrays = {
+            'usuario_ids': self.interacciones.usuario_ids,
+            'producto_ids': self.interacciones.producto_ids,
+            'indptr': matriz.indptr,
+            'indices': matriz.indices,
+            'data': matriz.data,
+            'normas_usuarios': self._normas_usuarios,
+            'vecinos': self.modelo_item.vecinos,
+            'puntajes': self.modelo_item.puntajes,
+            'popularidad': self.popularidad,
         }
-        if pd is None:
-            # Si pandas no está disponible, construir estructura mínima usando listas
-            # para permitir que el recomendador funcione parcialmente.
-            self.df = None
-            # crear matriz básica
-            usuarios = list({u for u in self.data['usuario']})
-            productos = list({p for p in self.data['producto']})
-            # matriz simulada usando dict of dicts
-            matriz = {u: {p: 0 for p in productos} for u in usuarios}
-            for u, p in zip(self.data['usuario'], self.data['producto']):
-                matriz[u][p] = 1
-            # guardar estructura mínima que usan otras funciones
-            self.matriz_usuario_producto = None
-        else:
-            self.df = pd.DataFrame(self.data)
-            self.matriz_usuario_producto = self._crear_matriz()
-        self.matriz_usuario_producto = self._crear_matriz()
-        self.productos_dict = {
-            'laptop': {'id': 1, 'nombre': 'Laptop', 'categoria': 'Tecnología'},
-            'mouse': {'id': 2, 'nombre': 'Mouse', 'categoria': 'Tecnología'},
-            'auriculares': {'id': 4, 'nombre': 'Auriculares', 'categoria': 'Tecnología'},
-            'libro': {'id': 3, 'nombre': 'Libro', 'categoria': 'Libros'}
+        nombres = list(self.ARRAYS_ARTEFACTO)
+        if self.modelo_factores is not None:
+            arrays['usuario_factores'] = self.modelo_factores.usuario_factores
+            arrays['producto_factores'] = self.modelo_factores.producto_factores
+            nombres += self.ARRAYS_FACTORIZACION
+
+        os.makedirs(directorio, exist_ok=True)
+        for nombre in nombres:
+            np.save(os.path.join(directorio, f'{nombre}.npy'), np.ascontiguousarray(arrays[nombre]))
+        return {
+            'usuarios': int(matriz.shape[0]),
+            'productos': int(matriz.shape[1]),
+            'interacciones': int(matriz.nnz),
+            'vecinos_por_producto': int(self.modelo_item.k),
+            'factores': int(self.modelo_factores.factores) if self.modelo_factores is not None else 0,
+            'ultimo_delta_id': int(self.ultimo_delta_id),
+            # Instante respecto del que decaen los pesos (timestamp Unix)
+            'referencia_pesos': self.interacciones.referencia,
         }
 
-    def _crear_matriz(self):
-        """Crear matriz usuario-producto para datos simulados"""
-        if pd is None:
-            return None
-        usuarios = self.df['usuario'].unique()
-        productos = self.df['producto'].unique()
-        matriz = pd.DataFrame(0, index=usuarios, columns=productos)
-        for _, row in self.df.iterrows():
-            matriz.loc[row['usuario'], row['producto']] = 1
-        return matriz
+    @classmethod
+    def desde_artefacto(cls, directorio, modo='item', mmap=True):
+        """
+        Crea un recomendador a partir de un artefacto guardado, sin consultar la BD
+
+        Args:
+            directorio: Directorio de la versión (contiene los ``.npy``)
+            modo: Modo de recomendación ('item', 'usuario' o 'factorizacion')
+            mmap: Abrir los arrays como memmap de solo lectura (compartidos entre procesos)
+        """
+        legado = os.path.join(directorio, 'modelo.npz')
+        if os.path.exists(legado):
+            # Versiones anteriores al formato .npy (se cargan en memoria)
+            with np.load(legado) as npz:
+                arrays = {nombre: npz[nombre] for nombre in npz.files}
+        else:
+            arrays = {
+                nombre: np.load(ruta, mmap_mode='r' if mmap else None)
+                for nombre in cls.ARRAYS_ARTEFACTO + cls.ARRAYS_FACTORIZACION
+                for ruta in [os.path.join(directorio, f'{nombre}.npy')]
+                if os.path.exists(ruta) or nombre in cls.ARRAYS_ARTEFACTO
+            }
+
+        usuario_ids, producto_ids = arrays['usuario_ids'], arrays['producto_ids']
+        # MatrizCSR no copia ni convierte los arrays (scipy podría hacerlo al validar índices)
+        matriz = MatrizCSR(
+            arrays['data'], arrays['indices'], arrays['indptr'],
+            (int(usuario_ids.size), int(producto_ids.size))
+        )
+        modelo_factores = None
+        if 'producto_factores' in arrays:
+            modelo_factores = ModeloFactorizacion(arrays['usuario_factores'], arrays['producto_factores'])
+
+        try:
+            with open(os.path.join(directorio, 'manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+
+        recomendador = cls(modo=modo, vecinos_por_producto=arrays['vecinos'].shape[1])
+        recomendador._asignar_interacciones(
+            InteraccionesUsuarioProducto(matriz, usuario_ids, producto_ids, manifest.get('referencia_pesos')),
+            modelo_item=ModeloItemItem(arrays['vecinos'], arrays['puntajes']),
+            popularidad=arrays['popularidad'],
+            normas_usuarios=arrays.get('normas_usuarios'),
+            modelo_factores=modelo_factores,
+        )
+        recomendador.version = os.path.basename(os.path.normpath(directorio))
+        recomendador.ultimo_delta_id = manifest.get('ultimo_delta_id') or 0
+        return recomendador
+
+    def aplicar_deltas(self, deltas):
+        """
+        Incorpora compras nuevas al historial de cada usuario sin reentrenar
+
+        El efecto es inmediato para los usuarios involucrados; la similitud
+        entre productos se actualiza recién en ``con_deltas_fusionados``. Cada
+        compra se pondera como un pedido recién pagado, con la antigüedad
+        medida respecto de la misma referencia que la matriz.
+
+        Args:
+            deltas: Iterable de (delta_id, usuario_id, producto_id, cantidad, fecha_creacion)
+        """
+        referencia = self.interacciones.referencia if self.interacciones is not None else None
+        vida_media = vida_media_interacciones() if referencia is not None else None
+        for delta_id, usuario_id, producto_id, cantidad, fecha in deltas:
+            if delta_id <= self.ultimo_delta_id:
+                continue
+            edad_dias = (referencia - fecha.timestamp()) / 86400 if vida_media else 0.0
+            peso = float(peso_interaccion(cantidad, edad_dias, PESOS_ESTADO_PEDIDO['pagado'], vida_media))
+            self._deltas.append((usuario_id, producto_id, peso))
+            # Copia y reemplazo: las peticiones concurrentes nunca ven un dict a medio modificar
+            historial = dict(self._historial_extra.get(usuario_id, {}))
+            historial[producto_id] = historial.get(producto_id, 0) + peso
+            self._historial_extra[usuario_id] = historial
+            self.ultimo_delta_id = delta_id
+
+    @property
+    def deltas_pendientes(self):
+        return len(self._deltas)
+
+    def instantanea_deltas(self):
+        """(deltas pendientes, último delta leído) para fusionar mientras se siguen aplicando otros"""
+        return len(self._deltas), self.ultimo_delta_id
+
+    def con_deltas_fusionados(self, instantanea=None):
+        """
+        Devuelve un recomendador nuevo con los deltas incorporados a la matriz
+
+        Solo se recalcula la similitud de los productos que aparecen en los
+        deltas (ver ``ModeloItemItem.actualizar``): los pares que los involucran
+        quedan exactos y el resto de las listas es una aproximación que corrige
+        el próximo entrenamiento. El recomendador actual no
+        se modifica, así que puede seguir sirviendo mientras tanto. El nuevo
+        vive en memoria del proceso: no comparte los arrays mapeados del
+        artefacto como el que se cargó de disco.
+
+        Args:
+            instantanea: Resultado de ``instantanea_deltas``; solo se fusionan
+                esos deltas (default: todos los pendientes)
+        """
+        cantidad, ultimo_delta_id = instantanea or self.instantanea_deltas()
+        if not cantidad or self.interacciones is None:
+            return self
+
+        deltas = np.array(self._deltas[:cantidad], dtype=np.float64)
+        usuarios, productos, pesos = self.interacciones.como_tripletas()
+        interacciones = InteraccionesUsuarioProducto.desde_tripletas(
+            np.concatenate([usuarios, deltas[:, 0].astype(np.int64)]),
+            np.concatenate([productos, deltas[:, 1].astype(np.int64)]),
+            np.concatenate([pesos, deltas[:, 2]]),
+            referencia=self.interacciones.referencia,
+        )
+
+        nuevas_columnas = np.searchsorted(interacciones.producto_ids, self.interacciones.producto_ids)
+        modelo_item = None
+        if self.modelo_item is not None:
+            afectadas = np.searchsorted(interacciones.producto_ids, np.unique(deltas[:, 1].astype(np.int64)))
+            modelo_item = self.modelo_item.remapear(
+                nuevas_columnas, interacciones.producto_ids.size
+            ).actualizar(interacciones, afectadas)
+
+        modelo_factores = None
+        if self.modelo_factores is not None:
+            modelo_factores = self.modelo_factores.remapear(nuevas_columnas, interacciones)
+
+        fusionado = RecomendadorIA(
+            modo=self.modo, vecinos_por_producto=self.vecinos_por_producto, factores=self.factores
+        )
+        fusionado._asignar_interacciones(interacciones, modelo_item=modelo_item, modelo_factores=modelo_factores)
+        fusionado.version = self.version
+        fusionado.ultimo_delta_id = ultimo_delta_id
+        return fusionado
+
+    def _historial(self, usuario_id):
+        """Fila del usuario (o None) y sus columnas/pesos, deltas incluidos"""
+        fila = self.interacciones.fila_de_usuario(usuario_id)
+        if fila is not None:
+            columnas, pesos = self.interacciones.productos_de(fila)
+        else:
+            columnas, pesos = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+        extra = self._historial_extra.get(usuario_id)
+        if extra:
+            # Productos que nunca se vendieron antes no tienen columna todavía
+            pares = [
+                (columna, peso) for columna, peso in (
+                    (self.interacciones.columna_de_producto(p), c) for p, c in extra.items()
+                ) if columna is not None
+            ]
+            if pares:
+                todas = np.concatenate([columnas, np.array([c for c, _ in pares], dtype=np.int32)])
+                pesos = np.concatenate([pesos, np.array([q for _, q in pares], dtype=np.float32)])
+                columnas, inversa = np.unique(todas, return_inverse=True)
+                pesos = np.bincount(inversa, weights=pesos).astype(np.float32)
+        return fila, columnas, pesos
 
     def recomendar(self, usuario, top_n=4):
         """Recomendar productos basados en compras similares"""
-        if self.matriz_usuario_producto is None or self.matriz_usuario_producto.empty:
+        if self.interacciones is None or self.interacciones.vacia:
             return self._recomendaciones_generales(top_n)
 
-        usuario_id = f"user_{usuario.id}"
+        try:
+            # Sin compras previas o sin resultados: recomendaciones generales
+            puntuados = self._puntuar_mezclado(usuario.id, top_n)
+            if not puntuados:
+                return self._recomendaciones_generales(top_n)
+            return self._hidratar(puntuados)
 
-        # Si el usuario no tiene compras previas, mostrar recomendaciones generales
-        if usuario_id not in self.matriz_usuario_producto.index:
+        except Exception as e:
+            print(f"Error en recomendaciones: {e}")
             return self._recomendaciones_generales(top_n)
 
-        try:
-            # Calcular similitud coseno entre usuarios
-            similitudes = cosine_similarity(self.matriz_usuario_producto)
-            similitudes_df = pd.DataFrame(
-                similitudes,
-                index=self.matriz_usuario_producto.index,
-                columns=self.matriz_usuario_producto.index
+    def puntuar_usuario(self, usuario_id, top_n=4):
+        """
+        Pares (columna, score) recomendados para un usuario, sin consultar la base
+
+        Returns:
+            list: ``[(columna, score), ...]`` ordenados; vacía si el usuario no
+            tiene historial
+        """
+        fila, columnas, pesos = self._historial(usuario_id)
+        if len(columnas) == 0:
+            return []
+        if self.modo == 'item':
+            return self.modelo_item.puntuar(columnas, pesos, top_n)
+        if self.modo == 'factorizacion':
+            return self.modelo_factores.puntuar(columnas, pesos, top_n)
+        return self._puntuar_usuario_usuario(fila, columnas, pesos, top_n)
+
+    def _puntuar_mezclado(self, usuario_id, top_n):
+        """
+        Scores colaborativos mezclados con similitud de contenido según el historial
+
+        El peso colaborativo es ``n / (n + HISTORIAL_CONFIABLE)`` con ``n``
+        productos distintos comprados: con poco historial los productos
+        parecidos por texto (incluidos los que nunca se vendieron) ganan lugar.
+
+        Returns:
+            list: ``[(producto_id, score, razon), ...]`` ordenados por score
+        """
+        _, columnas, pesos = self._historial(usuario_id)
+        if len(columnas) == 0:
+            return []
+        razon = self.RAZONES[self.modo]
+        colaborativo = {
+            int(self.interacciones.producto_ids[c]): score
+            for c, score in self.puntuar_usuario(usuario_id, top_n * 2)
+        }
+        peso = len(columnas) / (len(columnas) + self.HISTORIAL_CONFIABLE)
+        if peso >= self.PESO_SOLO_COLABORATIVO:
+            contenido = {}
+        else:
+            from .services.contenido_service import ContenidoService
+
+            contenido = ContenidoService.puntajes_similares(
+                self.interacciones.producto_ids[columnas].tolist(), pesos.tolist()
             )
+        if not contenido:
+            mejores = sorted(colaborativo.items(), key=lambda x: x[1], reverse=True)[:top_n]
+            return [(producto_id, score, razon) for producto_id, score in mejores]
 
-            # Encontrar usuarios similares (excluir el mismo usuario)
-            if usuario_id in similitudes_df.columns:
-                usuarios_similares = similitudes_df[usuario_id].sort_values(ascending=False).index[1:]
-            else:
-                return self._recomendaciones_generales(top_n)
+        # Normalizar cada fuente a [0, 1] antes de mezclar
+        maximo_colaborativo = max(colaborativo.values(), default=0) or 1.0
+        maximo_contenido = max(contenido.values()) or 1.0
+        mezcla = {}
+        for producto_id in set(colaborativo) | set(contenido):
+            aporte_colaborativo = peso * colaborativo.get(producto_id, 0) / maximo_colaborativo
+            aporte_contenido = (1 - peso) * contenido.get(producto_id, 0) / maximo_contenido
+            mezcla[producto_id] = (
+                aporte_colaborativo + aporte_contenido,
+                razon if aporte_colaborativo >= aporte_contenido else self.RAZON_CONTENIDO,
+            )
+        mejores = sorted(mezcla.items(), key=lambda x: x[1][0], reverse=True)[:top_n]
+        return [(producto_id, score, razon) for producto_id, (score, razon) in mejores]
 
-            # Obtener productos que ha comprado el usuario actual
-            productos_usuario = set()
-            if usuario_id in self.matriz_usuario_producto.index:
-                productos_usuario = set(
-                    self.matriz_usuario_producto.loc[usuario_id][
-                        self.matriz_usuario_producto.loc[usuario_id] > 0
-                    ].index
-                )
-
-            # Recomendar productos que compraron usuarios similares pero no el usuario actual
-            recomendaciones = {}
-            for u in usuarios_similares[:5]:  # Considerar solo los 5 usuarios más similares
-                if u in self.matriz_usuario_producto.index:
-                    productos_u = self.matriz_usuario_producto.loc[u]
-                    productos_similares = productos_u[productos_u > 0].index
-
-                    for prod in productos_similares:
-                        if prod not in productos_usuario:
-                            # Calcular score basado en similitud y frecuencia
-                            similitud = similitudes_df.loc[usuario_id, u]
-                            frecuencia = productos_u[prod]
-                            score = similitud * frecuencia
-
-                            if prod not in recomendaciones:
-                                recomendaciones[prod] = score
-                            else:
-                                recomendaciones[prod] = max(recomendaciones[prod], score)
-
-            # Ordenar por score y tomar top_n
-            recomendaciones_ordenadas = sorted(
-                recomendaciones.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:top_n]
-
-            # Convertir IDs de productos a objetos Producto
-            productos_recomendados = []
-            for prod_id, score in recomendaciones_ordenadas:
-                if prod_id in self.productos_dict:
-                    prod_info = self.productos_dict[prod_id]
-                    try:
-                        producto = Producto.objects.get(id=prod_info['id'])
-                        productos_recomendados.append({
-                            'producto': producto,
-                            'score': score,
-                            'razon': f"Usuarios similares compraron este producto"
-                        })
-                    except Producto.DoesNotExist:
-                        continue
-
-            return productos_recomendados
+    def recomendar_batch(self, usuario_ids, top_n=4):
+        """
+        Recomendaciones para muchos usuarios a la vez (emails, campañas)
 
-        except Exception as e:
-            print(f"Error en recomendaciones: {e}")
-            return self._recomendaciones_generales(top_n)
+        Los usuarios se puntúan por bloques con productos matriciales, acotando
+        la memoria a ``CELDAS_POR_BLOQUE`` scores; los productos comprados se
+        excluyen con la máscara dispersa del historial y todos los productos
+        recomendados se cargan con un único ``in_bulk`` (solo activos y con
+        stock; por eso se puntúan ``CANDIDATOS_POR_RECOMENDACION`` veces más).
+
+        Args:
+            usuario_ids: Ids de los usuarios a recomendar
+            top_n: Cantidad de recomendaciones por usuario
+
+        Returns:
+            dict: {usuario_id: [{'producto', 'score', 'razon'}, ...]}, con el
+            mismo formato que ``recomendar``
+        """
+        usuario_ids = list(dict.fromkeys(int(u) for u in usuario_ids))
+        pares_por_usuario = {}
+        if usuario_ids and self.interacciones is not None and not self.interacciones.vacia:
+            try:
+                # Candidatos de más: los sin stock o inactivos se descartan al cargarlos
+                pares_por_usuario = self._puntuar_batch(usuario_ids, top_n * self.CANDIDATOS_POR_RECOMENDACION)
+            except Exception as e:
+                logger.error(f"Error en recomendaciones batch: {str(e)}")
+                pares_por_usuario = {}
+
+        producto_ids = {
+            int(self.interacciones.producto_ids[c])
+            for pares in pares_por_usuario.values() for c, _ in pares
+        }
+        productos = Producto.objects.filter(stock__gt=0, estado='activo').in_bulk(
+            list(producto_ids)
+        ) if producto_ids else {}
+
+        razon = self.RAZONES[self.modo]
+        generales = None
+        recomendaciones = {}
+        for usuario_id in usuario_ids:
+            lista = []
+            for columna, score in pares_por_usuario.get(usuario_id, []):
+                producto = productos.get(int(self.interacciones.producto_ids[columna]))
+                if producto is not None:
+                    lista.append({'producto': producto, 'score': score, 'razon': razon})
+                    if len(lista) == top_n:
+                        break
+            if not lista:
+                if generales is None:
+                    generales = self._recomendaciones_generales(top_n)
+                lista = list(generales)
+            recomendaciones[usuario_id] = lista
+        return recomendaciones
+
+    def _puntuar_batch(self, usuario_ids, top_n):
+        """Pares (columna, score) por usuario, puntuando bloques de usuarios"""
+        resultado = {}
+        if self.modo == 'usuario':
+            # La similitud usuario-usuario toma el máximo entre vecinos, no una suma:
+            # se mantiene el cálculo por usuario
+            for usuario_id in usuario_ids:
+                fila, columnas, pesos = self._historial(usuario_id)
+                if len(columnas):
+                    resultado[usuario_id] = self._puntuar_usuario_usuario(fila, columnas, pesos, top_n)
+            return resultado
+
+        modelo = self.modelo_item if self.modo == 'item' else self.modelo_factores
+        n_productos = self.interacciones.producto_ids.size
+        bloque = max(1, ModeloItemItem.CELDAS_POR_BLOQUE // n_productos)
+        for inicio in range(0, len(usuario_ids), bloque):
+            ids_bloque = usuario_ids[inicio:inicio + bloque]
+            historiales = self._matriz_historiales(ids_bloque)
+            scores = modelo.puntuar_matriz(historiales)
+
+            # Excluir lo ya comprado: las posiciones no nulas del historial
+            por_fila = np.repeat(np.arange(len(ids_bloque)), np.diff(historiales.indptr))
+            scores[por_fila, historiales.indices] = -np.inf
+
+            top, valores = top_por_fila(scores, top_n)
+            for i, usuario_id in enumerate(ids_bloque):
+                pares = [(int(c), float(v)) for c, v in zip(top[i], valores[i]) if v > 0]
+                if pares:
+                    resultado[usuario_id] = pares
+        return resultado
+
+    def _matriz_historiales(self, usuario_ids):
+        """CSR (usuarios×productos) con el historial de cada usuario, deltas incluidos"""
+        interacciones = self.interacciones
+        matriz = interacciones.matriz
+        ids = np.asarray(usuario_ids, dtype=np.int64)
+
+        # Filas existentes en la matriz, copiadas en bloque
+        posiciones = np.minimum(np.searchsorted(interacciones.usuario_ids, ids), interacciones.usuario_ids.size - 1)
+        existe = interacciones.usuario_ids[posiciones] == ids
+        filas = np.flatnonzero(existe)
+        origen = posiciones[existe]
+        desde = np.asarray(matriz.indptr[origen], dtype=np.int64)
+        largos = np.asarray(matriz.indptr[origen + 1], dtype=np.int64) - desde
+        indices = np.repeat(desde - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+        filas_nnz = [np.repeat(filas, largos)]
+        columnas = [np.asarray(matriz.indices[indices], dtype=np.int64)]
+        pesos = [np.asarray(matriz.data[indices], dtype=np.float64)]
+
+        # Compras todavía no fusionadas
+        extra = [
+            (fila, producto_id, peso)
+            for fila, usuario_id in enumerate(usuario_ids)
+            for producto_id, peso in self._historial_extra.get(usuario_id, {}).items()
+        ]
+        if extra:
+            extra = np.array(extra, dtype=np.float64)
+            productos = extra[:, 1].astype(np.int64)
+            posiciones = np.minimum(
+                np.searchsorted(interacciones.producto_ids, productos), interacciones.producto_ids.size - 1
+            )
+            conocido = interacciones.producto_ids[posiciones] == productos
+            filas_nnz.append(extra[conocido, 0].astype(np.int64))
+            columnas.append(posiciones[conocido])
+            pesos.append(extra[conocido, 2])
+
+        return construir_csr(
+            np.concatenate(filas_nnz), np.concatenate(columnas), np.concatenate(pesos),
+            (len(usuario_ids), interacciones.producto_ids.size),
+        )
+
+    def _puntuar_usuario_usuario(self, fila, columnas_usuario, pesos_usuario, top_n):
+        """Productos comprados por los usuarios más similares (similitud coseno)"""
+        matriz = self.interacciones.matriz
+
+        # Similitud coseno del usuario contra el resto (un producto matriz-vector disperso)
+        vector = np.zeros(matriz.shape[1], dtype=np.float64)
+        vector[columnas_usuario] = pesos_usuario
+        productos_punto = sumar_por_fila(matriz, matriz.data * vector[matriz.indices])
+        denominador = self._normas_usuarios * np.linalg.norm(vector)
+        denominador[denominador == 0] = 1.0
+        similitudes = productos_punto / denominador
+        if fila is not None:
+            similitudes[fila] = -np.inf  # excluir el mismo usuario
+
+        # Considerar solo los 5 usuarios más similares
+        k = min(5, similitudes.size - (1 if fila is not None else 0))
+        if k <= 0:
+            return []
+        candidatos = np.argpartition(-similitudes, k - 1)[:k]
+        candidatos = candidatos[np.argsort(-similitudes[candidatos])]
+
+        # Recomendar productos que compraron usuarios similares pero no el usuario actual
+        productos_usuario = set(columnas_usuario.tolist())
+        recomendaciones = {}
+        for u in candidatos:
+            similitud = similitudes[u]
+            columnas_u, pesos_u = self.interacciones.productos_de(u)
+            for columna, peso in zip(columnas_u.tolist(), pesos_u.tolist()):
+                if columna in productos_usuario:
+                    continue
+                # Calcular score basado en similitud y peso
+                score = float(similitud * peso)
+                if score > recomendaciones.get(columna, float('-inf')):
+                    recomendaciones[columna] = score
+
+        # Ordenar por score y tomar top_n
+        return sorted(recomendaciones.items(), key=lambda x: x[1], reverse=True)[:top_n]
+
+    def _hidratar(self, puntuados):
+        """Convierte ``(producto_id, score, razon)`` en objetos Producto con una sola consulta"""
+        productos = Producto.objects.in_bulk([producto_id for producto_id, _, _ in puntuados])
+
+        productos_recomendados = []
+        for producto_id, score, razon in puntuados:
+            producto = productos.get(producto_id)
+            if producto is None:
+                continue
+            productos_recomendados.append({
+                'producto': producto,
+                'score': score,
+                'razon': razon
+            })
+        return productos_recomendados
 
     def _recomendaciones_generales(self, top_n=4):
         """Recomendaciones generales cuando no hay suficientes datos"""
         try:
-            # Obtener productos populares (más vendidos)
-            productos_populares = Producto.objects.filter(stock__gt=0).order_by('-stock')[:top_n]
+            # Índice de popularidad por ventas recientes
+            productos_populares = PopularidadService.mas_vendidos(top_n)
+            if not productos_populares and self.popularidad is not None and self.interacciones is not None:
+                # Índice todavía sin calcular: unidades vendidas según el modelo
+                productos_populares = self._mas_vendidos(top_n)
+            if not productos_populares:
+                # Sin historial de ventas: novedades con stock
+                productos_populares = Producto.objects.filter(
+                    stock__gt=0, estado='activo'
+                ).order_by('-fecha_creacion')[:top_n]
 
             recomendaciones = []
             for producto in productos_populares:
@@ -286,6 +1314,88 @@ class RecomendadorIA:
             print(f"Error en recomendaciones generales: {e}")
             return []
 
+    def _mas_vendidos(self, top_n):
+        """Productos con stock ordenados por el peso total de sus compras en el modelo"""
+        n = min(self.popularidad.size, top_n * 3)
+        if n == 0:
+            return []
+        top = np.argpartition(-self.popularidad, n - 1)[:n]
+        top = top[np.argsort(-self.popularidad[top])]
+        producto_ids = [int(self.interacciones.producto_ids[c]) for c in top]
+        productos = Producto.objects.filter(stock__gt=0).in_bulk(producto_ids)
+        return [productos[pid] for pid in producto_ids if pid in productos][:top_n]
+
     def actualizar_datos(self):
         """Actualizar la matriz con los datos más recientes"""
-        self._cargar_datos_reales()
\ No newline at end of file
+        self._cargar_datos_reales()
+
+
+def listar_versiones(directorio_base):
+    """Versiones de artefactos disponibles, de la más antigua a la más nueva"""
+    if not os.path.isdir(directorio_base):
+        return []
+    return sorted(
+        nombre for nombre in os.listdir(directorio_base)
+        if os.path.isfile(os.path.join(directorio_base, nombre, 'manifest.json'))
+    )
+
+
+def version_actual(directorio_base):
+    """Nombre de la versión activa (o None si nunca se publicó un artefacto)"""
+    try:
+        with open(os.path.join(directorio_base, ARCHIVO_VERSION_ACTUAL), encoding='utf-8') as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    return version if version in listar_versiones(directorio_base) else None
+
+
+def activar_version(directorio_base, version):
+    """Marca ``version`` como activa (reemplazo atómico del archivo ACTUAL)"""
+    if version not in listar_versiones(directorio_base):
+        raise ValueError(f"La versión {version} no existe en {directorio_base}")
+    temporal = os.path.join(directorio_base, f'.{ARCHIVO_VERSION_ACTUAL}.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(temporal, os.path.join(directorio_base, ARCHIVO_VERSION_ACTUAL))
+
+
+def publicar_artefacto(recomendador, directorio_base, conservar=5, duracion=None):
+    """
+    Guarda el recomendador como una nueva versión y la activa
+
+    Args:
+        recomendador: RecomendadorIA con datos cargados
+        directorio_base: Directorio que contiene todas las versiones
+        conservar: Cantidad de versiones a mantener para poder hacer rollback
+        duracion: Segundos que tomó el entrenamiento (se guarda en el manifest)
+
+    Returns:
+        dict: Manifest de la versión publicada
+    """
+    os.makedirs(directorio_base, exist_ok=True)
+    version = time.strftime('%Y%m%d%H%M%S')
+    while os.path.exists(os.path.join(directorio_base, version)):
+        version = f"{version}_1"
+
+    # Escribir en un directorio temporal y renombrar para no exponer versiones a medias
+    temporal = os.path.join(directorio_base, f'.{version}.tmp')
+    conteos = recomendador.guardar_artefacto(temporal)
+    manifest = {
+        'version': version,
+        'creado': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'duracion_segundos': round(duracion, 3) if duracion is not None else None,
+        **conteos,
+    }
+    with open(os.path.join(temporal, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(temporal, os.path.join(directorio_base, version))
+
+    activar_version(directorio_base, version)
+
+    # Rotación: conservar las últimas N versiones (nunca la activa)
+    for vieja in listar_versiones(directorio_base)[:-conservar or None]:
+        if vieja != version:
+            shutil.rmtree(os.path.join(directorio_base, vieja), ignore_errors=True)
+
+    return manifest
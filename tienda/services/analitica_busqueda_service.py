@@ -0,0 +1,241 @@
+"""
+Registro de las búsquedas del catálogo y resúmenes diarios (consultas más buscadas, sin resultados y latencia)
+"""
+import atexit
+import logging
+import math
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, time as hora, timedelta
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+from django.utils import timezone
+from tienda.busqueda import palabras
+from tienda.models import RegistroBusqueda, ResumenBusquedasDia, ResumenConsultaDia
+
+logger = logging.getLogger(__name__)
+
+_PATRON_ID_BUSQUEDA = re.compile(r'[0-9a-f]{32}')
+
+
+class AnaliticaBusquedaService:
+    """Registro de búsquedas con buffer por proceso.
+
+    Cada búsqueda (y cada clic en uno de sus resultados) se agrega a una lista
+    en memoria, sin tocar la base durante el request; la lista se escribe con
+    un ``bulk_create`` desde un hilo aparte al juntar ``LOTE`` eventos, cada
+    ``INTERVALO_SEGUNDOS`` (un hilo temporizador por proceso, que arranca con
+    el primer evento, aunque no lleguen búsquedas nuevas) y al terminar el
+    proceso.
+    Si la base falla se pierde el lote (se loguea), nunca la búsqueda.
+    """
+
+    LOTE = 200
+    INTERVALO_SEGUNDOS = 30
+    # Eventos como máximo en memoria si la base no responde
+    MAXIMO_PENDIENTES = 10000
+    LARGO_CONSULTA = 200
+
+    _lock = threading.Lock()
+    _pendientes = []
+    _vaciado = time.monotonic()
+    _vaciando = False
+    _temporizador = None
+
+    @staticmethod
+    def normalizar(consulta):
+        """Consulta en minúsculas, sin acentos ni signos y con un espacio entre palabras"""
+        return ' '.join(palabras(consulta))[:AnaliticaBusquedaService.LARGO_CONSULTA]
+
+    @staticmethod
+    def es_id_valido(busqueda_id):
+        return bool(busqueda_id) and _PATRON_ID_BUSQUEDA.fullmatch(busqueda_id) is not None
+
+    @staticmethod
+    def _agregar(evento):
+        with AnaliticaBusquedaService._lock:
+            pendientes = AnaliticaBusquedaService._pendientes
+            if len(pendientes) >= AnaliticaBusquedaService.MAXIMO_PENDIENTES:
+                return
+            pendientes.append(evento)
+            AnaliticaBusquedaService._iniciar_temporizador()
+            vencido = time.monotonic() - AnaliticaBusquedaService._vaciado >= AnaliticaBusquedaService.INTERVALO_SEGUNDOS
+            if len(pendientes) < AnaliticaBusquedaService.LOTE and not vencido:
+                return
+            if AnaliticaBusquedaService._vaciando:
+                return
+            AnaliticaBusquedaService._vaciando = True
+        threading.Thread(target=AnaliticaBusquedaService._vaciar_en_segundo_plano, daemon=True).start()
+
+    @staticmethod
+    def _iniciar_temporizador():
+        """Arranca el hilo que vacía el buffer por tiempo si este proceso no lo tiene (tras un fork no sigue vivo)"""
+        temporizador = AnaliticaBusquedaService._temporizador
+        if temporizador is not None and temporizador.is_alive():
+            return
+        AnaliticaBusquedaService._temporizador = threading.Thread(
+            target=AnaliticaBusquedaService._vaciar_periodicamente, daemon=True
+        )
+        AnaliticaBusquedaService._temporizador.start()
+
+    @staticmethod
+    def _vaciar_periodicamente():
+        while True:
+            transcurrido = time.monotonic() - AnaliticaBusquedaService._vaciado
+            time.sleep(max(AnaliticaBusquedaService.INTERVALO_SEGUNDOS - transcurrido, 1))
+            with AnaliticaBusquedaService._lock:
+                vencido = (
+                    time.monotonic() - AnaliticaBusquedaService._vaciado >= AnaliticaBusquedaService.INTERVALO_SEGUNDOS
+                )
+                if not vencido or not AnaliticaBusquedaService._pendientes or AnaliticaBusquedaService._vaciando:
+                    continue
+                AnaliticaBusquedaService._vaciando = True
+            AnaliticaBusquedaService._vaciar_en_segundo_plano()
+
+    @staticmethod
+    def _vaciar_en_segundo_plano():
+        try:
+            # Lo que se juntó mientras se escribía sale en la misma pasada
+            while AnaliticaBusquedaService.vaciar() and (
+                len(AnaliticaBusquedaService._pendientes) >= AnaliticaBusquedaService.LOTE
+            ):
+                pass
+        finally:
+            AnaliticaBusquedaService._vaciando = False
+            # El hilo no debe dejar su conexión abierta
+            connection.close()
+
+    @staticmethod
+    def registrar_busqueda(consulta, filtros, resultados, latencia_ms):
+        """
+        Agrega una búsqueda al buffer
+
+        Args:
+            consulta: Texto buscado (se guarda normalizado)
+            filtros: Filtros y orden activos (solo los que no son el default)
+            resultados: Productos encontrados
+            latencia_ms: Tiempo de la búsqueda en el servidor
+
+        Returns:
+            str: Id de la búsqueda, para atribuirle los clics en sus resultados
+        """
+        busqueda_id = uuid.uuid4().hex
+        try:
+            AnaliticaBusquedaService._agregar(RegistroBusqueda(
+                tipo='busqueda',
+                busqueda=busqueda_id,
+                fecha=timezone.now(),
+                consulta=AnaliticaBusquedaService.normalizar(consulta),
+                filtros=filtros,
+                resultados=resultados,
+                latencia_ms=round(latencia_ms, 2),
+            ))
+        except Exception as e:
+            logger.error(f"Error registrando la búsqueda '{consulta}': {str(e)}")
+        return busqueda_id
+
+    @staticmethod
+    def registrar_clic(busqueda_id, producto_id):
+        """Agrega al buffer un clic en un resultado (ids de búsqueda inválidos se ignoran)"""
+        if not AnaliticaBusquedaService.es_id_valido(busqueda_id):
+            return
+        try:
+            AnaliticaBusquedaService._agregar(RegistroBusqueda(
+                tipo='clic', busqueda=busqueda_id, fecha=timezone.now(), producto_id=producto_id,
+            ))
+        except Exception as e:
+            logger.error(f"Error registrando el clic en el producto {producto_id}: {str(e)}")
+
+    @staticmethod
+    def vaciar():
+        """
+        Escribe los eventos pendientes del proceso
+
+        Returns:
+            int: Eventos escritos
+        """
+        with AnaliticaBusquedaService._lock:
+            pendientes = AnaliticaBusquedaService._pendientes
+            AnaliticaBusquedaService._pendientes = []
+            AnaliticaBusquedaService._vaciado = time.monotonic()
+        if not pendientes:
+            return 0
+        try:
+            RegistroBusqueda.objects.bulk_create(pendientes, batch_size=AnaliticaBusquedaService.LOTE)
+        except Exception as e:
+            logger.error(f"Error guardando {len(pendientes)} registros de búsqueda: {str(e)}")
+            return 0
+        return len(pendientes)
+
+    @staticmethod
+    def _percentil(registros, total, fraccion):
+        """Percentil por rango más cercano, ordenando en la base (sin traer las latencias)"""
+        if not total:
+            return None
+        posicion = max(math.ceil(fraccion * total) - 1, 0)
+        return registros.order_by('latencia_ms').values_list('latencia_ms', flat=True)[posicion]
+
+    @staticmethod
+    def resumir_dia(fecha):
+        """
+        Resume las búsquedas de un día (en la zona horaria del sitio)
+
+        Reemplaza el resumen del día si ya existía, así se puede volver a
+        correr sobre días ya resumidos.
+
+        Args:
+            fecha: date del día a resumir
+
+        Returns:
+            ResumenBusquedasDia: Totales del día
+        """
+        zona = timezone.get_current_timezone()
+        desde = timezone.make_aware(datetime.combine(fecha, hora.min), zona)
+        hasta = timezone.make_aware(datetime.combine(fecha + timedelta(days=1), hora.min), zona)
+        busquedas = RegistroBusqueda.objects.filter(tipo='busqueda', fecha__gte=desde, fecha__lt=hasta).annotate(
+            clic=Exists(RegistroBusqueda.objects.filter(tipo='clic', busqueda=OuterRef('busqueda')))
+        )
+
+        por_consulta = [
+            ResumenConsultaDia(fecha=fecha, **fila)
+            for fila in busquedas.order_by().values('consulta').annotate(
+                busquedas=Count('id'),
+                sin_resultados=Count('id', filter=Q(resultados=0)),
+                con_clic=Count('id', filter=Q(clic=True)),
+                resultados_promedio=Avg('resultados'),
+            )
+        ]
+        total = sum(fila.busquedas for fila in por_consulta)
+        latencias = busquedas.filter(latencia_ms__isnull=False)
+        con_latencia = latencias.count()
+
+        with transaction.atomic():
+            ResumenConsultaDia.objects.filter(fecha=fecha).delete()
+            ResumenConsultaDia.objects.bulk_create(por_consulta, batch_size=1000)
+            resumen, _ = ResumenBusquedasDia.objects.update_or_create(fecha=fecha, defaults={
+                'busquedas': total,
+                'sin_resultados': sum(fila.sin_resultados for fila in por_consulta),
+                'con_clic': sum(fila.con_clic for fila in por_consulta),
+                'consultas_distintas': len(por_consulta),
+                'latencia_p50_ms': AnaliticaBusquedaService._percentil(latencias, con_latencia, 0.5),
+                'latencia_p95_ms': AnaliticaBusquedaService._percentil(latencias, con_latencia, 0.95),
+            })
+        logger.info(f"Resumen de búsquedas del {fecha}: {total} búsquedas, {len(por_consulta)} consultas distintas")
+        return resumen
+
+    @staticmethod
+    def purgar(dias):
+        """
+        Borra los registros de búsqueda con más de ``dias`` días (los resúmenes se conservan)
+
+        Returns:
+            int: Registros borrados
+        """
+        borrados, _ = RegistroBusqueda.objects.filter(fecha__lt=timezone.now() - timedelta(days=dias)).delete()
+        return borrados
+
+
+# Lo que quede en el buffer se escribe al terminar el worker
+atexit.register(AnaliticaBusquedaService.vaciar)
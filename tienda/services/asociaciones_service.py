@@ -0,0 +1,182 @@
+"""
+Índice de productos que se compran juntos (reglas de asociación sobre pedidos)
+"""
+import logging
+from django.db import transaction
+from tienda.models import AsociacionProducto, PedidoProducto
+
+logger = logging.getLogger(__name__)
+
+
+class AsociacionesService:
+    """Calcula y consulta el índice ``AsociacionProducto``"""
+
+    # Máximo de pares (producto, producto) generados por bloque de pedidos
+    PARES_POR_BLOQUE = 4_000_000
+
+    @staticmethod
+    def recalcular(top_n=10, min_pedidos=2, max_productos_pedido=50):
+        """
+        Recalcula las reglas de asociación a partir de los pedidos completados
+
+        Cada pedido es una cesta. Los pares de productos de cada cesta se
+        cuentan de forma vectorizada (por bloques de cestas) y para cada par
+        (A, B) se calcula soporte = pedidos(A y B) / pedidos, confianza =
+        pedidos(A y B) / pedidos(A) y lift = confianza / (pedidos(B) / pedidos).
+
+        Args:
+            top_n: Reglas a guardar por producto (las de mayor lift)
+            min_pedidos: Pedidos mínimos en común para considerar un par
+            max_productos_pedido: Los pedidos más grandes no generan pares
+                (crecen de forma cuadrática y aportan poca señal)
+
+        Returns:
+            int: Cantidad de reglas guardadas
+        """
+        from tienda.recomendador import ESTADOS_PEDIDO_COMPLETADO
+
+        # NumPy solo al recalcular: importar el servicio (desde las vistas) no lo carga
+        try:
+            import numpy as np
+        except ImportError:
+            raise RuntimeError("NumPy es necesario para calcular las asociaciones")
+
+        filas = list(
+            PedidoProducto.objects.filter(pedido__estado__in=ESTADOS_PEDIDO_COMPLETADO)
+            .values_list('pedido_id', 'producto_id').order_by().iterator(chunk_size=5000)
+        )
+        registros = []
+        if filas:
+            pares = np.array(filas, dtype=np.int64)
+            registros = AsociacionesService._reglas(
+                pares[:, 0], pares[:, 1], top_n, min_pedidos, max_productos_pedido
+            )
+
+        with transaction.atomic():
+            AsociacionProducto.objects.all().delete()
+            AsociacionProducto.objects.bulk_create(registros, batch_size=1000)
+
+        logger.info(f"Asociaciones de productos recalculadas: {len(registros)} reglas")
+        return len(registros)
+
+    @staticmethod
+    def _reglas(pedido_ids, producto_ids, top_n, min_pedidos, max_productos_pedido):
+        import numpy as np
+
+        productos, columnas = np.unique(producto_ids, return_inverse=True)
+        _, cestas = np.unique(pedido_ids, return_inverse=True)
+
+        # Ordenar por (cesta, producto) y quitar productos repetidos dentro de un pedido
+        orden = np.lexsort((columnas, cestas))
+        cestas, columnas = cestas[orden], columnas[orden]
+        unico = np.ones(cestas.size, dtype=bool)
+        unico[1:] = (cestas[1:] != cestas[:-1]) | (columnas[1:] != columnas[:-1])
+        cestas, columnas = cestas[unico], columnas[unico]
+
+        n_cestas = int(cestas[-1]) + 1
+        n_productos = productos.size
+        pedidos_por_producto = np.bincount(columnas, minlength=n_productos)
+        largos = np.bincount(cestas, minlength=n_cestas)
+        inicios = np.concatenate([[0], np.cumsum(largos)])
+
+        claves, conteos = AsociacionesService._contar_pares(
+            columnas, largos, inicios, n_productos, max_productos_pedido
+        )
+        if claves.size == 0:
+            return []
+
+        frecuentes = conteos >= min_pedidos
+        claves, conteos = claves[frecuentes], conteos[frecuentes].astype(np.float64)
+        origen, destino = claves // n_productos, claves % n_productos
+
+        soporte = conteos / n_cestas
+        confianza = conteos / pedidos_por_producto[origen]
+        lift = confianza / (pedidos_por_producto[destino] / n_cestas)
+
+        # Las top_n reglas de cada producto: ordenar por (origen, -lift, -pedidos juntos)
+        orden = np.lexsort((-conteos, -lift, origen))
+        origen, destino = origen[orden], destino[orden]
+        nuevo_grupo = np.ones(origen.size, dtype=bool)
+        nuevo_grupo[1:] = origen[1:] != origen[:-1]
+        inicio_grupo = np.maximum.accumulate(np.where(nuevo_grupo, np.arange(origen.size), 0))
+        posicion = np.arange(origen.size) - inicio_grupo
+        seleccion = orden[posicion < top_n]
+        posicion = posicion[posicion < top_n]
+
+        return [
+            AsociacionProducto(
+                producto_id=int(productos[claves[i] // n_productos]),
+                recomendado_id=int(productos[claves[i] % n_productos]),
+                posicion=int(p),
+                pedidos_juntos=int(conteos[i]),
+                soporte=float(soporte[i]),
+                confianza=float(confianza[i]),
+                lift=float(lift[i]),
+            )
+            for i, p in zip(seleccion.tolist(), posicion.tolist())
+        ]
+
+    @staticmethod
+    def _contar_pares(columnas, largos, inicios, n_productos, max_productos_pedido):
+        """Cuenta los pares ordenados (A, B), A != B, que aparecen en la misma cesta.
+
+        Returns:
+            tuple: (claves A * n_productos + B, cantidad de cestas con el par)
+        """
+        import numpy as np
+
+        validas = (largos >= 2) & (largos <= max_productos_pedido)
+        pares_por_cesta = np.where(validas, largos ** 2, 0)
+        acumulado = np.cumsum(pares_por_cesta)
+
+        claves, conteos = [], []
+        desde = 0
+        while desde < largos.size:
+            # Bloque de cestas con a lo sumo PARES_POR_BLOQUE pares (o una sola cesta)
+            base = acumulado[desde - 1] if desde else 0
+            hasta = max(int(np.searchsorted(acumulado, base + AsociacionesService.PARES_POR_BLOQUE, 'right')),
+                        desde + 1)
+            cestas_bloque = np.flatnonzero(validas[desde:hasta]) + desde
+            desde = hasta
+            if cestas_bloque.size == 0:
+                continue
+
+            # Cada producto de la cesta se repite tantas veces como productos tiene la cesta
+            largo = largos[cestas_bloque]
+            entradas = np.repeat(inicios[cestas_bloque], largo) + (
+                np.arange(largo.sum()) - np.repeat(np.cumsum(largo) - largo, largo)
+            )
+            repeticiones = np.repeat(largo, largo)
+            izquierda = np.repeat(entradas, repeticiones)
+            derecha = np.repeat(np.repeat(inicios[cestas_bloque], largo), repeticiones) + (
+                np.arange(izquierda.size) - np.repeat(np.cumsum(repeticiones) - repeticiones, repeticiones)
+            )
+            a, b = columnas[izquierda], columnas[derecha]
+            distintos = a != b
+            unicas, cantidades = np.unique(a[distintos] * n_productos + b[distintos], return_counts=True)
+            claves.append(unicas)
+            conteos.append(cantidades)
+
+        if not claves:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        unicas, inversa = np.unique(np.concatenate(claves), return_inverse=True)
+        return unicas, np.bincount(inversa, weights=np.concatenate(conteos)).astype(np.int64)
+
+    @staticmethod
+    def puntajes(producto_ids):
+        """
+        Confianza sumada de las reglas que parten de los productos indicados
+
+        Returns:
+            dict: {producto_id: puntaje}, sin incluir los productos de entrada
+        """
+        producto_ids = set(producto_ids)
+        if not producto_ids:
+            return {}
+
+        puntajes = {}
+        for recomendado_id, confianza in AsociacionProducto.objects.filter(
+            producto_id__in=producto_ids
+        ).exclude(recomendado_id__in=producto_ids).values_list('recomendado_id', 'confianza'):
+            puntajes[recomendado_id] = puntajes.get(recomendado_id, 0) + confianza
+        return puntajes
@@ -0,0 +1,281 @@
+"""
+Autocompletado del buscador: sugerencias por prefijo de productos y categorías
+"""
+import logging
+import re
+import threading
+import time
+from django.db import connection
+from django.db.models import Max
+from django.urls import reverse
+from django.utils.http import urlencode
+from tienda.busqueda import IndicePrefijos
+from tienda.models import PopularidadProducto, Producto
+from tienda.services.categorias_service import CategoriasService
+
+logger = logging.getLogger(__name__)
+
+
+def texto_sugerible(nombre, categoria, sku):
+    """Texto indexado para sugerir un producto: nombre, categoría y SKU (también compacto)"""
+    sku = sku or ''
+    return f"{nombre or ''} {categoria or ''} {sku} {re.sub(r'[^0-9A-Za-z]', '', sku)}"
+
+
+class AutocompletarService:
+    """Sugerencias del buscador a partir de índices por prefijo en memoria.
+
+    Cada proceso arma en un hilo aparte, a partir de la primera consulta, un
+    ``IndicePrefijos`` de los productos activos (ordenados por
+    ``PopularidadProducto.puntaje``) y otro de las categorías (por cantidad
+    de productos, del menú de ``CategoriasService``); hasta que termina no
+    hay sugerencias. Los productos guardados en este proceso se actualizan al
+    instante por señales; los editados en otros workers se levantan cada
+    ``REVISION_SEGUNDOS`` por ``fecha_actualizacion``. Los borrados en otros
+    workers no dejan rastro, así que cada sugerencia se confirma contra la
+    base por clave primaria y las que ya no existen salen del índice.
+    Cuando ``update_popularity_index`` recalcula los puntajes el índice se
+    reconstruye en un hilo aparte y se reemplaza al terminar, sin frenar las
+    consultas. Con 1M de productos el índice ocupa del orden de cientos de MB
+    por proceso y responde en pocos milisegundos.
+    """
+
+    REVISION_SEGUNDOS = 5
+    # Cada cuánto se mira si cambió el cálculo de popularidad
+    REVISION_POPULARIDAD_SEGUNDOS = 60
+    LIMITE = 8
+    LIMITE_CATEGORIAS = 3
+    # Sugerencias de más que se piden al índice por si alguna ya no existe
+    HOLGURA = 4
+    LARGO_MAXIMO_CONSULTA = 100
+
+    _lock = threading.RLock()
+    _productos = None
+    _categorias = None
+    _nombres_categorias = []
+    _marca = None  # última fecha_actualizacion indexada
+    _marca_popularidad = None  # fecha_calculo de los puntajes usados
+    _revisado = 0.0
+    _revisado_popularidad = 0.0
+    _categorias_vencidas = False
+    _reconstruyendo = False
+
+    @staticmethod
+    def _filas_productos(productos):
+        """(id, nombre, texto indexado, popularidad) de los productos activos"""
+        for producto_id, nombre, categoria, sku, puntaje in productos.filter(estado='activo').values_list(
+            'id', 'nombre', 'categoria', 'sku', 'popularidad__puntaje'
+        ).iterator(chunk_size=5000):
+            yield producto_id, nombre, texto_sugerible(nombre, categoria, sku), puntaje or 0.0
+
+    @staticmethod
+    def _construir_categorias():
+        filas = [(categoria['nombre'], categoria['total']) for categoria in CategoriasService.menu() if categoria['total']]
+        indice = IndicePrefijos.construir(
+            (posicion, categoria, categoria, total) for posicion, (categoria, total) in enumerate(filas)
+        )
+        return indice, filas
+
+    @staticmethod
+    def reconstruir():
+        """
+        Arma los índices desde cero y los publica para el proceso
+
+        Returns:
+            int: Productos indexados
+        """
+        inicio = time.monotonic()
+        marca = Producto.objects.aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+        marca_popularidad = PopularidadProducto.objects.aggregate(ultima=Max('fecha_calculo'))['ultima']
+        productos = IndicePrefijos.construir(
+            AutocompletarService._filas_productos(Producto.objects.filter(fecha_actualizacion__lte=marca))
+            if marca is not None else ()
+        )
+        categorias, nombres_categorias = AutocompletarService._construir_categorias()
+
+        with AutocompletarService._lock:
+            # Lo editado mientras se construía entra con la próxima sincronización
+            AutocompletarService._productos = productos
+            AutocompletarService._categorias = categorias
+            AutocompletarService._nombres_categorias = nombres_categorias
+            AutocompletarService._marca = marca
+            AutocompletarService._marca_popularidad = marca_popularidad
+            AutocompletarService._revisado = AutocompletarService._revisado_popularidad = time.monotonic()
+            AutocompletarService._categorias_vencidas = False
+        logger.info(
+            f"Índice de autocompletado: {len(productos)} productos y {len(nombres_categorias)} categorías "
+            f"en {time.monotonic() - inicio:.1f}s"
+        )
+        return len(productos)
+
+    @staticmethod
+    def _reconstruir_en_segundo_plano():
+        try:
+            AutocompletarService.reconstruir()
+        except Exception as e:
+            logger.error(f"Error reconstruyendo el índice de autocompletado: {str(e)}")
+        finally:
+            AutocompletarService._reconstruyendo = False
+            connection.close()
+
+    @staticmethod
+    def _iniciar_reconstruccion():
+        with AutocompletarService._lock:
+            if AutocompletarService._reconstruyendo:
+                return
+            AutocompletarService._reconstruyendo = True
+        threading.Thread(target=AutocompletarService._reconstruir_en_segundo_plano, daemon=True).start()
+
+    @staticmethod
+    def _sincronizar():
+        """
+        Pone el índice al día con lo editado en otros workers
+
+        Returns:
+            bool: False si el índice todavía se está armando
+        """
+        if AutocompletarService._productos is None:
+            AutocompletarService._iniciar_reconstruccion()
+            return False
+
+        ahora = time.monotonic()
+        if (
+            ahora - AutocompletarService._revisado_popularidad >= AutocompletarService.REVISION_POPULARIDAD_SEGUNDOS
+            and not AutocompletarService._reconstruyendo
+        ):
+            AutocompletarService._revisado_popularidad = ahora
+            marca_popularidad = PopularidadProducto.objects.aggregate(ultima=Max('fecha_calculo'))['ultima']
+            if marca_popularidad != AutocompletarService._marca_popularidad:
+                AutocompletarService._iniciar_reconstruccion()
+
+        if ahora - AutocompletarService._revisado < AutocompletarService.REVISION_SEGUNDOS:
+            return True
+        # Las consultas se hacen sin el lock (las sugerencias siguen saliendo del índice de antes);
+        # el lock se toma para reclamar la revisión y para aplicar los cambios
+        with AutocompletarService._lock:
+            if time.monotonic() - AutocompletarService._revisado < AutocompletarService.REVISION_SEGUNDOS:
+                return True
+            AutocompletarService._revisado = time.monotonic()
+            indice, marca_anterior = AutocompletarService._productos, AutocompletarService._marca
+            categorias_vencidas = AutocompletarService._categorias_vencidas
+            AutocompletarService._categorias_vencidas = False
+
+        cambiados = Producto.objects.all() if marca_anterior is None else Producto.objects.filter(
+            fecha_actualizacion__gt=marca_anterior
+        )
+        # La marca nueva se toma antes de leer: lo editado mientras tanto entra en la próxima revisión
+        marca = cambiados.aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+        filas, inactivos = [], []
+        if marca is not None:
+            cambiados = cambiados.filter(fecha_actualizacion__lte=marca)
+            filas = list(AutocompletarService._filas_productos(cambiados))
+            inactivos = list(cambiados.exclude(estado='activo').values_list('id', flat=True))
+            categorias_vencidas = True
+        categorias = AutocompletarService._construir_categorias() if categorias_vencidas else None
+
+        with AutocompletarService._lock:
+            # Si mientras tanto se publicó un índice reconstruido, lo leído ya está (o entra en la próxima)
+            if AutocompletarService._productos is indice and AutocompletarService._marca == marca_anterior:
+                for producto_id, nombre, texto, popularidad in filas:
+                    indice.agregar(producto_id, nombre, texto, popularidad)
+                for producto_id in inactivos:
+                    indice.quitar(producto_id)
+                if marca is not None:
+                    AutocompletarService._marca = marca
+            if categorias is not None:
+                AutocompletarService._categorias, AutocompletarService._nombres_categorias = categorias
+        return True
+
+    @staticmethod
+    def _vigentes(productos):
+        """Descarta (y saca del índice) las sugerencias de productos borrados o desactivados en otro worker"""
+        activos = set(Producto.objects.filter(
+            id__in=[producto_id for producto_id, _ in productos], estado='activo'
+        ).values_list('id', flat=True))
+        if len(activos) < len(productos):
+            with AutocompletarService._lock:
+                for producto_id, _ in productos:
+                    if producto_id not in activos:
+                        AutocompletarService._productos.quitar(producto_id)
+        return [(producto_id, nombre) for producto_id, nombre in productos if producto_id in activos]
+
+    @staticmethod
+    def sugerir(consulta, limite=None):
+        """
+        Productos y categorías cuyas palabras empiezan con las de la consulta
+
+        Args:
+            consulta: Lo tipeado hasta ahora ("cam ro" sugiere "Camisa Roja")
+            limite: Máximo de productos (default: LIMITE)
+
+        Returns:
+            dict: productos [{id, nombre, url}] del más al menos popular y
+            categorias [{nombre, total, url}] de la más a la menos poblada
+            (ambas vacías mientras se arma el índice)
+        """
+        consulta = (consulta or '').strip()[:AutocompletarService.LARGO_MAXIMO_CONSULTA]
+        if not consulta:
+            return {'productos': [], 'categorias': []}
+        inicio = time.monotonic()
+        if not AutocompletarService._sincronizar():
+            return {'productos': [], 'categorias': []}
+        limite = limite or AutocompletarService.LIMITE
+        with AutocompletarService._lock:
+            productos = AutocompletarService._productos.sugerir(consulta, limite + AutocompletarService.HOLGURA)
+            categorias = [
+                AutocompletarService._nombres_categorias[posicion]
+                for posicion, _ in AutocompletarService._categorias.sugerir(
+                    consulta, AutocompletarService.LIMITE_CATEGORIAS
+                )
+            ]
+        productos = AutocompletarService._vigentes(productos)[:limite] if productos else []
+        url_catalogo = reverse('productos')
+        sugerencias = {
+            'productos': [
+                {'id': producto_id, 'nombre': nombre, 'url': reverse('producto_detalle', args=[producto_id])}
+                for producto_id, nombre in productos
+            ],
+            'categorias': [
+                {'nombre': categoria, 'total': total, 'url': f"{url_catalogo}?{urlencode({'categoria': categoria})}"}
+                for categoria, total in categorias
+            ],
+        }
+        logger.debug(
+            f"Autocompletado '{consulta}': {len(productos)} productos en {(time.monotonic() - inicio) * 1000:.1f}ms"
+        )
+        return sugerencias
+
+    @staticmethod
+    def actualizar_producto_seguro(producto):
+        """Actualiza las sugerencias de un producto creado o editado sin propagar errores (para usar desde señales)"""
+        try:
+            if AutocompletarService._productos is None:
+                return
+            puntaje = PopularidadProducto.objects.filter(producto_id=producto.id).values_list(
+                'puntaje', flat=True
+            ).first() if producto.estado == 'activo' else None
+            with AutocompletarService._lock:
+                if AutocompletarService._productos is None:
+                    return
+                if producto.estado == 'activo':
+                    AutocompletarService._productos.agregar(
+                        producto.id, producto.nombre,
+                        texto_sugerible(producto.nombre, producto.categoria, producto.sku), puntaje or 0.0,
+                    )
+                else:
+                    AutocompletarService._productos.quitar(producto.id)
+                AutocompletarService._categorias_vencidas = True
+        except Exception as e:
+            logger.error(f"Error actualizando el autocompletado del producto {producto.id}: {str(e)}")
+
+    @staticmethod
+    def eliminar_producto_seguro(producto_id):
+        """Saca un producto borrado de las sugerencias sin propagar errores (para usar desde señales)"""
+        try:
+            with AutocompletarService._lock:
+                if AutocompletarService._productos is None:
+                    return
+                AutocompletarService._productos.quitar(producto_id)
+                AutocompletarService._categorias_vencidas = True
+        except Exception as e:
+            logger.error(f"Error quitando el producto {producto_id} del autocompletado: {str(e)}")
@@ -0,0 +1,344 @@
+"""
+Búsqueda de texto de productos con ranking por relevancia
+"""
+import logging
+import re
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from tienda.busqueda import PALABRAS_VACIAS, IndiceInvertido, palabras, raiz, tokenizar
+from tienda.models import Producto
+
+logger = logging.getLogger(__name__)
+
+# Campos indexados y su peso en el ranking
+CAMPOS_BUSQUEDA = (
+    ('nombre', 3.0),
+    ('categoria', 2.0),
+    ('sku', 2.0),
+    ('descripcion', 1.0),
+)
+
+
+def textos_producto(nombre, categoria, sku, descripcion):
+    """Textos a indexar de un producto (el SKU también sin separadores: 'AB-12' → 'AB12')"""
+    sku = sku or ''
+    return {
+        'nombre': nombre or '',
+        'categoria': categoria or '',
+        'sku': f"{sku} {re.sub(r'[^0-9A-Za-z]', '', sku)}",
+        'descripcion': descripcion or '',
+    }
+
+
+def _filas_productos(productos=None):
+    productos = Producto.objects.all() if productos is None else productos
+    for producto_id, nombre, categoria, sku, descripcion in productos.order_by('id').values_list(
+        'id', 'nombre', 'categoria', 'sku', 'descripcion'
+    ).iterator(chunk_size=2000):
+        yield producto_id, textos_producto(nombre, categoria, sku, descripcion)
+
+
+class BackendMemoria:
+    """Índice invertido BM25F en memoria, uno por proceso.
+
+    Se construye con la primera búsqueda. Los productos guardados en este
+    proceso se reindexan al instante (señales); los editados en otros
+    workers se levantan cada ``REVISION_SEGUNDOS`` con una consulta por
+    ``fecha_actualizacion``. Los productos borrados en otro proceso pueden
+    quedar en el índice, pero las vistas filtran los resultados contra la base.
+    """
+
+    nombre = 'memoria'
+    REVISION_SEGUNDOS = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.indice = None
+        self.marca = None  # última fecha_actualizacion indexada
+        self.revisado = 0.0
+
+    def reconstruir(self):
+        marca = Producto.objects.aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+        indice = IndiceInvertido.construir(CAMPOS_BUSQUEDA, _filas_productos())
+        with self._lock:
+            self.indice, self.marca, self.revisado = indice, marca, time.monotonic()
+        return len(indice)
+
+    def _sincronizar(self):
+        if self.indice is None:
+            self.reconstruir()
+            return
+        if time.monotonic() - self.revisado < self.REVISION_SEGUNDOS:
+            return
+        with self._lock:
+            self.revisado = time.monotonic()
+            cambiados = Producto.objects.all() if self.marca is None else Producto.objects.filter(
+                fecha_actualizacion__gt=self.marca
+            )
+            # La marca nueva se toma antes de leer: lo editado mientras tanto entra en la próxima revisión
+            marca = cambiados.aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+            if marca is None:
+                return
+            for producto_id, textos in _filas_productos(cambiados.filter(fecha_actualizacion__lte=marca)):
+                self.indice.agregar(producto_id, textos)
+            self.marca = marca
+
+    def buscar(self, consulta, limite):
+        self._sincronizar()
+        with self._lock:
+            return self.indice.buscar(consulta, limite)
+
+    def actualizar(self, producto):
+        if self.indice is None:
+            return
+        with self._lock:
+            self.indice.agregar(producto.id, textos_producto(
+                producto.nombre, producto.categoria, producto.sku, producto.descripcion
+            ))
+
+    def eliminar(self, producto_id):
+        if self.indice is None:
+            return
+        with self._lock:
+            self.indice.quitar(producto_id)
+
+
+class BackendSQLite:
+    """Tabla virtual FTS5 con los textos ya normalizados y ``bm25()`` con pesos por columna.
+
+    Guarda los términos que produce ``tokenizar`` (sin acentos y con raíz),
+    así la búsqueda coincide con la del índice en memoria. La tabla se crea
+    y se llena la primera vez que se usa.
+    """
+
+    nombre = 'sqlite'
+    TABLA = 'tienda_busqueda_fts'
+
+    def __init__(self):
+        self._lista = False
+
+    @staticmethod
+    def disponible():
+        if connection.vendor != 'sqlite':
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+                return bool(cursor.fetchone()[0])
+        except Exception:
+            return False
+
+    def _asegurar_tabla(self):
+        if self._lista:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [self.TABLA])
+            existe = cursor.fetchone() is not None
+        if not existe:
+            self.reconstruir()
+        self._lista = True
+
+    @staticmethod
+    def _fila(producto_id, textos):
+        return [producto_id] + [' '.join(tokenizar(textos[campo])) for campo, _ in CAMPOS_BUSQUEDA]
+
+    def reconstruir(self):
+        columnas = ', '.join(campo for campo, _ in CAMPOS_BUSQUEDA)
+        marcadores = ', '.join(['%s'] * (len(CAMPOS_BUSQUEDA) + 1))
+        filas = [self._fila(producto_id, textos) for producto_id, textos in _filas_productos()]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.TABLA}")
+            cursor.execute(f"CREATE VIRTUAL TABLE {self.TABLA} USING fts5({columnas})")
+            cursor.executemany(f"INSERT INTO {self.TABLA} (rowid, {columnas}) VALUES ({marcadores})", filas)
+        self._lista = True
+        return len(filas)
+
+    def buscar(self, consulta, limite):
+        terminos = list(dict.fromkeys(tokenizar(consulta)))
+        if not terminos:
+            return []
+        self._asegurar_tabla()
+        pesos = ', '.join(str(peso) for _, peso in CAMPOS_BUSQUEDA)
+        expresion = ' OR '.join(f'"{termino}"' for termino in terminos)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, -bm25({self.TABLA}, {pesos}) AS puntaje FROM {self.TABLA} "
+                f"WHERE {self.TABLA} MATCH %s ORDER BY puntaje DESC, rowid LIMIT %s",
+                [expresion, limite],
+            )
+            return [(int(producto_id), float(puntaje)) for producto_id, puntaje in cursor.fetchall()]
+
+    def actualizar(self, producto):
+        self._asegurar_tabla()
+        columnas = ', '.join(campo for campo, _ in CAMPOS_BUSQUEDA)
+        marcadores = ', '.join(['%s'] * (len(CAMPOS_BUSQUEDA) + 1))
+        fila = self._fila(producto.id, textos_producto(
+            producto.nombre, producto.categoria, producto.sku, producto.descripcion
+        ))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLA} WHERE rowid = %s", [producto.id])
+            cursor.execute(f"INSERT INTO {self.TABLA} (rowid, {columnas}) VALUES ({marcadores})", fila)
+
+    def eliminar(self, producto_id):
+        self._asegurar_tabla()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLA} WHERE rowid = %s", [producto_id])
+
+
+class BackendMySQL:
+    """Índices FULLTEXT de InnoDB (migración 0033) en modo booleano.
+
+    InnoDB indexa las palabras tal cual, así que cada término se busca como
+    prefijo de su raíz cuando la raíz es prefijo de la palabra (``camis*``
+    encuentra camisa y camisas) y si no como prefijo de la palabra plegada
+    (``luces*``, no ``luz*``); la colación de la tabla ya ignora acentos y
+    mayúsculas. El puntaje suma la relevancia de cada columna por su peso.
+    MySQL mantiene los índices solo, así que actualizar no hace nada.
+    """
+
+    nombre = 'mysql'
+    INDICE_TODOS = 'producto_ft_todos'
+
+    @staticmethod
+    def disponible():
+        if connection.vendor != 'mysql':
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                    "AND table_name = %s AND index_name = %s LIMIT 1",
+                    [Producto._meta.db_table, BackendMySQL.INDICE_TODOS],
+                )
+                return cursor.fetchone() is not None
+        except Exception:
+            return False
+
+    def reconstruir(self):
+        return Producto.objects.count()
+
+    @staticmethod
+    def terminos(consulta):
+        """Prefijos a buscar: la raíz si es prefijo de la palabra, si no la palabra ('luces' no empieza con 'luz')"""
+        terminos = []
+        for palabra in palabras(consulta):
+            if palabra in PALABRAS_VACIAS:
+                continue
+            termino = raiz(palabra)
+            terminos.append(termino if palabra.startswith(termino) else palabra)
+        return list(dict.fromkeys(terminos))
+
+    def buscar(self, consulta, limite):
+        terminos = BackendMySQL.terminos(consulta)
+        if not terminos:
+            return []
+        expresion = ' '.join(f'{termino}*' for termino in terminos)
+        relevancia = ' + '.join(
+            f"{peso} * MATCH({campo}) AGAINST (%s IN BOOLEAN MODE)" for campo, peso in CAMPOS_BUSQUEDA
+        )
+        columnas = ', '.join(campo for campo, _ in CAMPOS_BUSQUEDA)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, {relevancia} AS puntaje FROM {Producto._meta.db_table} "
+                f"WHERE MATCH({columnas}) AGAINST (%s IN BOOLEAN MODE) ORDER BY puntaje DESC, id LIMIT %s",
+                [expresion] * len(CAMPOS_BUSQUEDA) + [expresion, limite],
+            )
+            return [(int(producto_id), float(puntaje)) for producto_id, puntaje in cursor.fetchall()]
+
+    def actualizar(self, producto):
+        pass
+
+    def eliminar(self, producto_id):
+        pass
+
+
+class BusquedaService:
+    """Busca productos por texto con el backend disponible.
+
+    ``settings.BUSQUEDA_BACKEND`` elige ``'mysql'``, ``'sqlite'``, ``'memoria'``
+    o ``'auto'`` (default): FULLTEXT si la base es MySQL con los índices
+    creados, FTS5 si es SQLite con FTS5, y si no el índice en memoria.
+    """
+
+    # Resultados como máximo por búsqueda (los más relevantes)
+    LIMITE = 1000
+
+    BACKENDS = {
+        'mysql': BackendMySQL,
+        'sqlite': BackendSQLite,
+        'memoria': BackendMemoria,
+    }
+
+    _lock = threading.Lock()
+    _backend = None
+
+    @staticmethod
+    def backend():
+        """Backend de búsqueda del proceso (se elige una vez)"""
+        if BusquedaService._backend is None:
+            with BusquedaService._lock:
+                if BusquedaService._backend is None:
+                    BusquedaService._backend = BusquedaService._elegir_backend()
+                    logger.info(f"Backend de búsqueda: {BusquedaService._backend.nombre}")
+        return BusquedaService._backend
+
+    @staticmethod
+    def _elegir_backend():
+        nombre = getattr(settings, 'BUSQUEDA_BACKEND', 'auto')
+        if nombre != 'auto':
+            if nombre not in BusquedaService.BACKENDS:
+                raise ValueError(f"BUSQUEDA_BACKEND desconocido: {nombre}")
+            return BusquedaService.BACKENDS[nombre]()
+        if BackendMySQL.disponible():
+            return BackendMySQL()
+        if BackendSQLite.disponible():
+            return BackendSQLite()
+        return BackendMemoria()
+
+    @staticmethod
+    def buscar(consulta, limite=None):
+        """
+        Productos que coinciden con la consulta, del más al menos relevante
+
+        Args:
+            consulta: Texto buscado (se normaliza igual que los productos)
+            limite: Máximo de resultados (default: LIMITE)
+
+        Returns:
+            list: Ids de productos ordenados por relevancia
+        """
+        inicio = time.monotonic()
+        resultados = BusquedaService.backend().buscar(consulta, limite or BusquedaService.LIMITE)
+        logger.debug(
+            f"Búsqueda '{consulta}': {len(resultados)} resultados en {(time.monotonic() - inicio) * 1000:.1f}ms"
+        )
+        return [producto_id for producto_id, _ in resultados]
+
+    @staticmethod
+    def reconstruir():
+        """
+        Reconstruye el índice del backend activo
+
+        Returns:
+            int: Productos indexados
+        """
+        return BusquedaService.backend().reconstruir()
+
+    @staticmethod
+    def actualizar_producto_seguro(producto):
+        """Reindexa un producto creado o editado sin propagar errores (para usar desde señales)"""
+        try:
+            BusquedaService.backend().actualizar(producto)
+        except Exception as e:
+            logger.error(f"Error actualizando el índice de búsqueda del producto {producto.id}: {str(e)}")
+
+    @staticmethod
+    def eliminar_producto_seguro(producto_id):
+        """Saca un producto borrado del índice sin propagar errores (para usar desde señales)"""
+        try:
+            BusquedaService.backend().eliminar(producto_id)
+        except Exception as e:
+            logger.error(f"Error quitando el producto {producto_id} del índice de búsqueda: {str(e)}")
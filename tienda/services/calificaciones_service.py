@@ -0,0 +1,140 @@
+"""
+Calificaciones desnormalizadas de los productos (promedio, total e histograma)
+"""
+import logging
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from tienda.models import Producto, Resena
+
+logger = logging.getLogger(__name__)
+
+
+class CalificacionesService:
+    """Mantiene ``rating_promedio``, ``rating_total`` y ``rating_1``..``rating_5`` de ``Producto``.
+
+    Cada reseña creada, editada o borrada ajusta los contadores con
+    aritmética sobre las columnas (sin volver a agregar las reseñas);
+    ``recalcular`` reconstruye o verifica todo el catálogo por lotes.
+    """
+
+    ESTRELLAS = (1, 2, 3, 4, 5)
+    LOTE = 1000
+
+    @staticmethod
+    def _campo(calificacion):
+        if calificacion not in CalificacionesService.ESTRELLAS:
+            raise ValueError(f"Calificación inválida: {calificacion}")
+        return f'rating_{calificacion}'
+
+    @staticmethod
+    def _promedio():
+        """Promedio a partir del histograma, evaluado por la base"""
+        suma = sum(F(f'rating_{estrellas}') * estrellas for estrellas in CalificacionesService.ESTRELLAS)
+        return Case(
+            When(rating_total__gt=0, then=Cast(suma, FloatField()) / F('rating_total')),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    @staticmethod
+    def ajustar(producto_id, sumar=None, restar=None):
+        """
+        Suma una reseña a una estrella y/o la resta de otra
+
+        Son dos ``UPDATE`` sobre la fila del producto: contadores y luego el
+        promedio (en un ``UPDATE`` aparte porque MySQL evalúa las
+        asignaciones de izquierda a derecha con los valores ya cambiados).
+
+        Args:
+            producto_id: Producto a ajustar
+            sumar: Calificación de la reseña nueva (o None)
+            restar: Calificación de la reseña quitada (o None)
+        """
+        cambios = {}
+        if sumar is not None:
+            campo = CalificacionesService._campo(sumar)
+            cambios[campo] = F(campo) + 1
+        if restar is not None:
+            campo = CalificacionesService._campo(restar)
+            cambios[campo] = cambios.get(campo, F(campo)) - 1
+        total = (sumar is not None) - (restar is not None)
+        if total:
+            cambios['rating_total'] = F('rating_total') + total
+
+        if not cambios:
+            return
+        with transaction.atomic():
+            productos = Producto.objects.filter(id=producto_id)
+            productos.update(**cambios)
+            productos.update(rating_promedio=CalificacionesService._promedio())
+
+    @staticmethod
+    def ajustar_seguro(producto_id, sumar=None, restar=None):
+        """``ajustar`` sin propagar errores (para usar desde señales)"""
+        try:
+            CalificacionesService.ajustar(producto_id, sumar=sumar, restar=restar)
+        except Exception as e:
+            logger.error(f"Error actualizando las calificaciones del producto {producto_id}: {str(e)}")
+
+    @staticmethod
+    def recalcular(lote=None, solo_verificar=False):
+        """
+        Recalcula los agregados de todos los productos desde las reseñas, por lotes
+
+        Cada lote lee los productos y cuenta sus reseñas por estrella con una
+        sola consulta agrupada; solo se escriben los productos con diferencias.
+
+        Args:
+            lote: Productos por lote (default: LOTE)
+            solo_verificar: Si es True no corrige nada, solo cuenta las diferencias
+
+        Returns:
+            tuple: (productos revisados, productos con diferencias)
+        """
+        lote = lote or CalificacionesService.LOTE
+        campos = ['rating_total'] + [f'rating_{estrellas}' for estrellas in CalificacionesService.ESTRELLAS]
+        revisados = con_diferencias = 0
+        ultimo_id = 0
+
+        while True:
+            productos = list(
+                Producto.objects.filter(id__gt=ultimo_id).order_by('id').only('id', 'rating_promedio', *campos)[:lote]
+            )
+            if not productos:
+                break
+            ultimo_id = productos[-1].id
+
+            conteos = {}
+            for producto_id, calificacion, total in Resena.objects.filter(
+                producto_id__in=[p.id for p in productos]
+            ).order_by().values('producto_id', 'calificacion').annotate(total=Count('id')).values_list(
+                'producto_id', 'calificacion', 'total'
+            ):
+                conteos.setdefault(producto_id, {})[calificacion] = total
+
+            corregir = []
+            for producto in productos:
+                histograma = conteos.get(producto.id, {})
+                esperado = {f'rating_{e}': histograma.get(e, 0) for e in CalificacionesService.ESTRELLAS}
+                esperado['rating_total'] = sum(histograma.values())
+                suma = sum(e * n for e, n in histograma.items())
+                esperado['rating_promedio'] = suma / esperado['rating_total'] if esperado['rating_total'] else 0.0
+
+                if any(
+                    abs(getattr(producto, campo) - valor) > 1e-9 for campo, valor in esperado.items()
+                ):
+                    con_diferencias += 1
+                    for campo, valor in esperado.items():
+                        setattr(producto, campo, valor)
+                    corregir.append(producto)
+
+            if corregir and not solo_verificar:
+                Producto.objects.bulk_update(corregir, ['rating_promedio'] + campos)
+            revisados += len(productos)
+
+        logger.info(
+            f"Calificaciones {'verificadas' if solo_verificar else 'recalculadas'}: "
+            f"{revisados} productos, {con_diferencias} con diferencias"
+        )
+        return revisados, con_diferencias
@@ -0,0 +1,182 @@
+"""
+Paginación del catálogo por cursores (keyset)
+"""
+from decimal import Decimal
+from django.core import signing
+from django.db.models import Q
+from tienda.models import ConfiguracionSistema
+
+
+class CatalogoService:
+    """Páginas del catálogo sin ``OFFSET``.
+
+    Cada página se pide con ``WHERE clave > última clave vista`` sobre el
+    orden activo, así la página 500 cuesta lo mismo que la primera. La clave
+    termina siempre en el id para que el orden sea total. Los cursores son
+    tokens firmados (opacos para el cliente) con el orden, la dirección y la
+    clave del borde de la página.
+    """
+
+    # Campos de la clave de cada orden ('-' = descendente)
+    ORDENES = {
+        'nombre': ('nombre', 'id'),
+        'precio': ('precio', 'id'),
+        'precio_desc': ('-precio', '-id'),
+        'fecha_desc': ('-id',),
+        'calificacion': ('-rating_promedio', '-rating_total', '-id'),
+    }
+    ORDEN_DEFAULT = 'nombre'
+    # Orden de una búsqueda de texto: el cursor es la posición en el ranking
+    RELEVANCIA = 'relevancia'
+    MAXIMO_POR_PAGINA = 100
+
+    SAL_CURSOR = 'tienda.catalogo.cursor'
+
+    @staticmethod
+    def por_pagina():
+        """Productos por página según ``ConfiguracionSistema.productos_por_pagina``"""
+        configuracion = ConfiguracionSistema.get_configuracion()
+        return max(1, min(configuracion.productos_por_pagina or 12, CatalogoService.MAXIMO_POR_PAGINA))
+
+    @staticmethod
+    def _campos(orden):
+        return CatalogoService.ORDENES.get(orden) or CatalogoService.ORDENES[CatalogoService.ORDEN_DEFAULT]
+
+    @staticmethod
+    def _invertir(campos):
+        return tuple(campo[1:] if campo.startswith('-') else f'-{campo}' for campo in campos)
+
+    @staticmethod
+    def _despues_de(campos, valores):
+        """Filtro de las filas que siguen a ``valores`` en el orden ``campos``
+
+        Para (a, id) ascendente: ``a > x OR (a = x AND id > y)``.
+        """
+        filtro = Q()
+        iguales = {}
+        for campo, valor in zip(campos, valores):
+            nombre = campo.lstrip('-')
+            comparacion = 'lt' if campo.startswith('-') else 'gt'
+            filtro |= Q(**iguales, **{f'{nombre}__{comparacion}': valor})
+            iguales[nombre] = valor
+        return filtro
+
+    @staticmethod
+    def _clave(producto, campos):
+        valores = []
+        for campo in campos:
+            valor = getattr(producto, campo.lstrip('-'))
+            valores.append(str(valor) if isinstance(valor, Decimal) else valor)
+        return valores
+
+    @staticmethod
+    def crear_cursor(orden, direccion, valores):
+        return signing.dumps([orden, direccion, valores], salt=CatalogoService.SAL_CURSOR, compress=True)
+
+    @staticmethod
+    def leer_cursor(cursor, orden):
+        """
+        Decodifica un cursor
+
+        Returns:
+            tuple: (dirección, valores), o None si el cursor falta, es inválido
+            o pertenece a otro orden (se vuelve a la primera página)
+        """
+        if not cursor:
+            return None
+        try:
+            orden_cursor, direccion, valores = signing.loads(cursor, salt=CatalogoService.SAL_CURSOR)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        campos = ('posicion',) if orden == CatalogoService.RELEVANCIA else CatalogoService._campos(orden)
+        if orden_cursor != orden or direccion not in ('siguiente', 'anterior') or len(valores) != len(campos):
+            return None
+        return direccion, valores
+
+    @staticmethod
+    def paginar(queryset, orden, cursor=None, por_pagina=None):
+        """
+        Una página del catálogo a partir de un cursor
+
+        Args:
+            queryset: Productos ya filtrados (sin ordenar)
+            orden: Clave de ``ORDENES`` (las desconocidas usan ``ORDEN_DEFAULT``)
+            cursor: Token recibido en una página anterior (None = primera página)
+            por_pagina: Tamaño de página (default: la configuración del sistema)
+
+        Returns:
+            dict: productos, cursor_siguiente y cursor_anterior (None si no hay
+            más páginas en esa dirección)
+        """
+        if orden not in CatalogoService.ORDENES:
+            orden = CatalogoService.ORDEN_DEFAULT
+        por_pagina = por_pagina or CatalogoService.por_pagina()
+        campos = CatalogoService._campos(orden)
+        posicion = CatalogoService.leer_cursor(cursor, orden)
+        hacia_atras = posicion is not None and posicion[0] == 'anterior'
+
+        # Hacia atrás se recorre el orden invertido desde el primer producto de la página actual
+        recorrido = CatalogoService._invertir(campos) if hacia_atras else campos
+        productos = queryset.order_by(*recorrido)
+        if posicion is not None:
+            productos = productos.filter(CatalogoService._despues_de(recorrido, posicion[1]))
+
+        productos = list(productos[:por_pagina + 1])
+        hay_mas = len(productos) > por_pagina
+        productos = productos[:por_pagina]
+        if hacia_atras:
+            productos.reverse()
+
+        hay_siguiente = True if hacia_atras else hay_mas
+        hay_anterior = hay_mas if hacia_atras else posicion is not None
+        return {
+            'productos': productos,
+            'cursor_siguiente': CatalogoService.crear_cursor(
+                orden, 'siguiente', CatalogoService._clave(productos[-1], campos)
+            ) if productos and hay_siguiente else None,
+            'cursor_anterior': CatalogoService.crear_cursor(
+                orden, 'anterior', CatalogoService._clave(productos[0], campos)
+            ) if productos and hay_anterior else None,
+        }
+
+    @staticmethod
+    def paginar_ranking(queryset, ranking, cursor=None, por_pagina=None):
+        """
+        Una página de resultados de búsqueda en orden de relevancia
+
+        El ranking ya está acotado (``BusquedaService.LIMITE``), así que se
+        pagina por posición en la lista: una consulta para saber cuáles pasan
+        los filtros y otra para traer los productos de la página.
+
+        Args:
+            queryset: Productos ya filtrados
+            ranking: Ids de productos del más al menos relevante
+            cursor: Token recibido en una página anterior (None = primera página)
+            por_pagina: Tamaño de página (default: la configuración del sistema)
+
+        Returns:
+            dict: Igual que ``paginar``
+        """
+        por_pagina = por_pagina or CatalogoService.por_pagina()
+        visibles = set(queryset.filter(id__in=ranking).values_list('id', flat=True))
+        ids = [producto_id for producto_id in ranking if producto_id in visibles]
+
+        inicio = 0
+        posicion = CatalogoService.leer_cursor(cursor, CatalogoService.RELEVANCIA)
+        if posicion is not None and isinstance(posicion[1][0], int):
+            direccion, (indice,) = posicion
+            inicio = indice if direccion == 'siguiente' else indice - por_pagina
+        inicio = min(max(inicio, 0), len(ids))
+
+        pagina_ids = ids[inicio:inicio + por_pagina]
+        encontrados = queryset.in_bulk(pagina_ids)
+        fin = inicio + len(pagina_ids)
+        return {
+            'productos': [encontrados[producto_id] for producto_id in pagina_ids if producto_id in encontrados],
+            'cursor_siguiente': CatalogoService.crear_cursor(
+                CatalogoService.RELEVANCIA, 'siguiente', [fin]
+            ) if fin < len(ids) else None,
+            'cursor_anterior': CatalogoService.crear_cursor(
+                CatalogoService.RELEVANCIA, 'anterior', [inicio]
+            ) if inicio > 0 else None,
+        }
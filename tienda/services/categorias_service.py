@@ -0,0 +1,186 @@
+"""
+Categorías normalizadas del catálogo: resolución de nombres, conteos y menús cacheados
+"""
+import logging
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils.text import slugify
+from tienda.models import Categoria, Producto
+
+logger = logging.getLogger(__name__)
+
+
+class CategoriasService:
+    """Categorías del catálogo a partir de la tabla ``Categoria``.
+
+    Los menús y filtros leen una lista cacheada de la tabla (unas pocas
+    filas) en vez de recorrer los productos con ``DISTINCT``; se invalida
+    cuando cambian los conteos. Filtrar por una categoría es filtrar por la
+    FK ``categoria_ref`` con la categoría y sus subcategorías.
+    """
+
+    CLAVE_CACHE = 'catalogo:categorias'
+    TTL = 300
+
+    @staticmethod
+    def slug(nombre):
+        """Slug de un nombre de categoría ('Electrónica' → 'electronica'); '' si no tiene letras ni dígitos"""
+        return slugify((nombre or '').strip())[:60]
+
+    @staticmethod
+    def _calcular_menu():
+        categorias = list(Categoria.objects.values('id', 'nombre', 'slug', 'padre_id', 'total_productos'))
+        hijas = {}
+        for categoria in categorias:
+            hijas.setdefault(categoria['padre_id'], []).append(categoria)
+        por_id = {categoria['id']: categoria for categoria in categorias}
+
+        menu = []
+
+        def recorrer(categoria, nivel, ancestros):
+            categoria['nivel'] = nivel
+            menu.append(categoria)
+            categoria['total'] = categoria['total_productos']
+            for hija in hijas.get(categoria['id'], ()):
+                if hija['id'] not in ancestros:  # un ciclo cargado a mano no cuelga el menú
+                    categoria['total'] += recorrer(hija, nivel + 1, ancestros | {hija['id']})
+            return categoria['total']
+
+        # Raíces: sin padre o con un padre que ya no existe; el orden de la tabla se conserva entre hermanas
+        for categoria in categorias:
+            if categoria['padre_id'] is None or categoria['padre_id'] not in por_id:
+                recorrer(categoria, 0, frozenset([categoria['id']]))
+        return menu
+
+    @staticmethod
+    def menu():
+        """
+        Todas las categorías en orden de menú (cada padre seguido de sus hijas), cacheadas
+
+        Returns:
+            list: dicts con id, nombre, slug, padre_id, nivel, total_productos
+            (propios) y total (con subcategorías)
+        """
+        menu = cache.get(CategoriasService.CLAVE_CACHE)
+        if menu is None:
+            menu = CategoriasService._calcular_menu()
+            cache.set(CategoriasService.CLAVE_CACHE, menu, CategoriasService.TTL)
+        return menu
+
+    @staticmethod
+    def nombres():
+        """Nombres de las categorías con productos, en orden de menú (para los selects de filtro)"""
+        return [categoria['nombre'] for categoria in CategoriasService.menu() if categoria['total']]
+
+    @staticmethod
+    def invalidar():
+        cache.delete(CategoriasService.CLAVE_CACHE)
+
+    @staticmethod
+    def ids_subarbol(nombre):
+        """
+        Ids de la categoría con ese nombre (sin importar mayúsculas ni acentos) y de sus subcategorías
+
+        Returns:
+            list: Ids para filtrar por ``categoria_ref__in``; vacía si no existe
+        """
+        slug = CategoriasService.slug(nombre)
+        menu = CategoriasService.menu()
+        for posicion, categoria in enumerate(menu):
+            if categoria['slug'] == slug:
+                ids = [categoria['id']]
+                # En el menú las subcategorías siguen a su padre con nivel mayor
+                for descendiente in menu[posicion + 1:]:
+                    if descendiente['nivel'] <= categoria['nivel']:
+                        break
+                    ids.append(descendiente['id'])
+                return ids
+        return []
+
+    @staticmethod
+    def obtener_o_crear_id(nombre):
+        """
+        Id de la categoría de un nombre, creándola si no existe
+
+        Returns:
+            int: Id de la categoría, o None si el nombre está vacío
+        """
+        slug = CategoriasService.slug(nombre)
+        if not slug:
+            return None
+        for categoria in CategoriasService.menu():
+            if categoria['slug'] == slug:
+                return categoria['id']
+        categoria = Categoria.objects.filter(slug=slug).only('id').first()
+        if categoria is None:
+            try:
+                with transaction.atomic():
+                    categoria = Categoria.objects.create(nombre=nombre.strip()[:50], slug=slug)
+            except IntegrityError:
+                # Otro proceso la creó al mismo tiempo
+                categoria = Categoria.objects.get(slug=slug)
+            transaction.on_commit(CategoriasService.invalidar)
+        return categoria.id
+
+    @staticmethod
+    def ajustar_seguro(categoria_id, cambio):
+        """Suma ``cambio`` al conteo de productos de una categoría sin propagar errores (para usar desde señales)"""
+        if categoria_id is None or not cambio:
+            return
+        try:
+            Categoria.objects.filter(id=categoria_id).update(total_productos=F('total_productos') + cambio)
+            transaction.on_commit(CategoriasService.invalidar)
+        except Exception as e:
+            logger.error(f"Error actualizando el conteo de la categoría {categoria_id}: {str(e)}")
+
+    @staticmethod
+    def sincronizar(solo_verificar=False):
+        """
+        Crea las categorías que falten, reasigna productos y recalcula los conteos
+
+        Hace falta después de cargas que no pasan por ``save()`` (``update()``,
+        ``bulk_create``, SQL directo). Agrupa los productos por nombre de
+        categoría, así son unas pocas consultas por categoría distinta.
+
+        Args:
+            solo_verificar: No escribe nada, solo cuenta las diferencias
+
+        Returns:
+            tuple: (categorías creadas, productos reasignados, conteos corregidos)
+        """
+        creadas = reasignados = corregidos = 0
+        with transaction.atomic():
+            categoria_por_slug = dict(Categoria.objects.values_list('slug', 'id'))
+            nombres = Producto.objects.order_by().values_list('categoria', flat=True).distinct()
+            for nombre in nombres:
+                slug = CategoriasService.slug(nombre)
+                if slug and slug not in categoria_por_slug:
+                    creadas += 1
+                    if solo_verificar:
+                        continue
+                    categoria_por_slug[slug] = Categoria.objects.create(nombre=nombre.strip()[:50], slug=slug).id
+                productos = Producto.objects.filter(categoria=nombre)
+                categoria_id = categoria_por_slug.get(slug)
+                productos = productos.filter(categoria_ref__isnull=False) if categoria_id is None else (
+                    productos.exclude(categoria_ref_id=categoria_id)
+                )
+                if solo_verificar:
+                    reasignados += productos.count()
+                else:
+                    reasignados += productos.update(categoria_ref_id=categoria_id)
+
+            conteos = dict(
+                Producto.objects.filter(categoria_ref__isnull=False).order_by().values_list('categoria_ref_id')
+                .annotate(total=Count('id')).values_list('categoria_ref_id', 'total')
+            )
+            for categoria_id, total_productos in Categoria.objects.values_list('id', 'total_productos'):
+                total = conteos.get(categoria_id, 0)
+                if total != total_productos:
+                    corregidos += 1
+                    if not solo_verificar:
+                        Categoria.objects.filter(id=categoria_id).update(total_productos=total)
+
+        if not solo_verificar:
+            CategoriasService.invalidar()
+        return creadas, reasignados, corregidos
@@ -0,0 +1,214 @@
+"""
+Similitud de contenido entre productos (productos nuevos sin ventas)
+"""
+import logging
+import os
+import shutil
+import threading
+from django.conf import settings
+from django.db import transaction
+from tienda.models import Producto, SimilitudContenido
+
+logger = logging.getLogger(__name__)
+
+
+class ContenidoService:
+    """Construye, actualiza y consulta el índice ``SimilitudContenido``.
+
+    El modelo TF-IDF (``ModeloContenido``) se guarda en
+    ``RECOMENDADOR_CONTENIDO_DIR`` para poder vectorizar productos nuevos o
+    editados sin reentrenar; los vecinos de cada producto viven en la base.
+    Solo ``recalcular`` reescribe el modelo; al guardar un producto se
+    actualizan únicamente sus filas en la base.
+    """
+
+    # Vecinos por producto por defecto (el índice guarda el valor con que se entrenó)
+    VECINOS = 10
+    # Productos más parecidos a uno editado que se revisan para agregarlo a sus vecinos
+    CANDIDATOS_INVERSOS = 500
+
+    _lock = threading.Lock()
+    _cache = None  # (clave del directorio, modelo)
+
+    @staticmethod
+    def directorio():
+        return getattr(settings, 'RECOMENDADOR_CONTENIDO_DIR', None)
+
+    @staticmethod
+    def _textos():
+        from tienda.recomendador import ModeloContenido
+
+        for producto_id, nombre, categoria, descripcion in Producto.objects.order_by('id').values_list(
+            'id', 'nombre', 'categoria', 'descripcion'
+        ).iterator(chunk_size=2000):
+            yield producto_id, ModeloContenido.texto_de(nombre, categoria, descripcion)
+
+    @staticmethod
+    def recalcular(k=None):
+        """
+        Entrena el TF-IDF con todo el catálogo y regenera los vecinos de cada producto
+
+        Returns:
+            int: Cantidad de productos indexados
+        """
+        from tienda.recomendador import ModeloContenido
+
+        modelo = ModeloContenido.entrenar(ContenidoService._textos(), k=k or ContenidoService.VECINOS)
+
+        registros = []
+        for filas, vecinos, puntajes in modelo.vecinos():
+            for fila, vecinos_fila, puntajes_fila in zip(filas.tolist(), vecinos, puntajes):
+                registros.extend(
+                    SimilitudContenido(
+                        producto_id=int(modelo.producto_ids[fila]),
+                        similar_id=int(modelo.producto_ids[vecino]),
+                        puntaje=float(puntaje),
+                    )
+                    for vecino, puntaje in zip(vecinos_fila.tolist(), puntajes_fila.tolist()) if puntaje > 0
+                )
+
+        with ContenidoService._lock:
+            with transaction.atomic():
+                SimilitudContenido.objects.all().delete()
+                SimilitudContenido.objects.bulk_create(registros, batch_size=1000)
+            ContenidoService._publicar(modelo)
+
+        logger.info(f"Similitud de contenido recalculada: {modelo.producto_ids.size} productos")
+        return int(modelo.producto_ids.size)
+
+    @staticmethod
+    def _publicar(modelo):
+        """Reemplaza el modelo guardado escribiendo primero en un directorio temporal"""
+        directorio = ContenidoService.directorio()
+        temporal = f"{directorio}.tmp-{os.getpid()}"
+        anterior = f"{directorio}.old-{os.getpid()}"
+        shutil.rmtree(temporal, ignore_errors=True)
+        modelo.guardar(temporal)
+        if os.path.isdir(directorio):
+            os.rename(directorio, anterior)
+        os.rename(temporal, directorio)
+        shutil.rmtree(anterior, ignore_errors=True)
+        ContenidoService._cache = (ContenidoService._clave_directorio(), modelo)
+
+    @staticmethod
+    def _clave_directorio():
+        try:
+            estado = os.stat(ContenidoService.directorio())
+        except (OSError, TypeError):
+            return None
+        return (estado.st_ino, estado.st_mtime_ns)
+
+    @staticmethod
+    def cargar_modelo():
+        """Modelo guardado (cacheado por proceso), o None si todavía no se entrenó"""
+        from tienda.recomendador import ModeloContenido
+
+        clave = ContenidoService._clave_directorio()
+        if clave is None:
+            return None
+        cache = ContenidoService._cache
+        if cache is None or cache[0] != clave:
+            cache = (clave, ModeloContenido.cargar(ContenidoService.directorio()))
+            ContenidoService._cache = cache
+        return cache[1]
+
+    @staticmethod
+    def actualizar_producto(producto):
+        """
+        Reindexa un producto creado o editado
+
+        Recalcula sus vecinos y lo agrega a los de los productos más parecidos
+        (entre los ``CANDIDATOS_INVERSOS`` más similares) si supera al peor de
+        ellos. Solo escribe filas de ``SimilitudContenido``: el producto se
+        vectoriza con el modelo guardado, que no se toca (lo reescribe
+        ``update_content_similarity``), así que los productos creados después
+        del último entrenamiento todavía no aparecen como vecinos entre sí.
+        Si el texto no cambió desde el entrenamiento no hace nada.
+
+        Returns:
+            bool: True si el índice cambió
+        """
+        from tienda.recomendador import ModeloContenido, top_por_fila
+
+        modelo = ContenidoService.cargar_modelo()
+        if modelo is None:
+            return False
+        texto = ModeloContenido.texto_de(producto.nombre, producto.categoria, producto.descripcion)
+        fila = modelo.fila_de(producto.id)
+        if fila is not None and modelo.hashes[fila] == ModeloContenido.hash_texto(texto):
+            return False
+
+        similitudes = modelo.similitudes(*modelo.vectorizar(texto))
+        if fila is not None:
+            similitudes[fila] = -1.0
+        k = modelo.k
+
+        vecinos, puntajes = top_por_fila(similitudes[None, :], k)
+        propios = [
+            SimilitudContenido(producto_id=producto.id, similar_id=int(modelo.producto_ids[v]), puntaje=float(p))
+            for v, p in zip(vecinos[0].tolist(), puntajes[0].tolist()) if p > 0
+        ]
+
+        candidatos, _ = top_por_fila(similitudes[None, :], ContenidoService.CANDIDATOS_INVERSOS)
+        candidatos = [int(c) for c in candidatos[0] if similitudes[c] > 0]
+        similitud_de = {int(modelo.producto_ids[c]): float(similitudes[c]) for c in candidatos}
+
+        with transaction.atomic():
+            SimilitudContenido.objects.filter(producto_id=producto.id).delete()
+            SimilitudContenido.objects.filter(similar_id=producto.id).delete()
+
+            # Vecinos actuales de los candidatos: decidir dónde entra el producto
+            actuales = {}
+            for fila_id, producto_id, puntaje in SimilitudContenido.objects.filter(
+                producto_id__in=similitud_de
+            ).values_list('id', 'producto_id', 'puntaje'):
+                actuales.setdefault(producto_id, []).append((puntaje, fila_id))
+
+            inversos, sobrantes = [], []
+            for producto_id, similitud in similitud_de.items():
+                vigentes = sorted(actuales.get(producto_id, []), reverse=True)
+                if len(vigentes) >= k and similitud <= vigentes[k - 1][0]:
+                    continue
+                inversos.append(SimilitudContenido(
+                    producto_id=producto_id, similar_id=producto.id, puntaje=similitud
+                ))
+                sobrantes.extend(fila_id for _, fila_id in vigentes[k - 1:])
+
+            SimilitudContenido.objects.filter(id__in=sobrantes).delete()
+            SimilitudContenido.objects.bulk_create(propios + inversos)
+        return True
+
+    @staticmethod
+    def actualizar_producto_seguro(producto):
+        """``actualizar_producto`` sin propagar errores (para usar desde señales)"""
+        try:
+            ContenidoService.actualizar_producto(producto)
+        except Exception as e:
+            logger.error(f"Error actualizando la similitud de contenido del producto {producto.id}: {str(e)}")
+
+    @staticmethod
+    def puntajes_similares(producto_ids, pesos=None):
+        """
+        Similitud promedio (ponderada) de cada producto contra un conjunto de productos
+
+        Args:
+            producto_ids: Productos de referencia (p. ej. el historial de un usuario)
+            pesos: Peso de cada producto de referencia (default: 1)
+
+        Returns:
+            dict: {producto_id: puntaje}, sin incluir los productos de referencia
+        """
+        producto_ids = list(producto_ids)
+        if not producto_ids:
+            return {}
+        pesos = dict(zip(producto_ids, pesos if pesos is not None else [1.0] * len(producto_ids)))
+        total = sum(pesos.values()) or 1.0
+
+        puntajes = {}
+        for producto_id, similar_id, puntaje in SimilitudContenido.objects.filter(
+            producto_id__in=producto_ids
+        ).values_list('producto_id', 'similar_id', 'puntaje'):
+            if similar_id in pesos:
+                continue
+            puntajes[similar_id] = puntajes.get(similar_id, 0.0) + pesos[producto_id] * puntaje / total
+        return puntajes
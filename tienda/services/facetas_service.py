@@ -0,0 +1,215 @@
+"""
+Conteos por faceta (categoría, precio, calificación y disponibilidad) del catálogo
+"""
+import hashlib
+from decimal import Decimal
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from tienda.services.categorias_service import CategoriasService
+
+# Rangos de precio: (desde, hasta) con hasta exclusivo; None = sin tope
+RANGOS_PRECIO = (
+    (Decimal('0'), Decimal('10000')),
+    (Decimal('10000'), Decimal('25000')),
+    (Decimal('25000'), Decimal('50000')),
+    (Decimal('50000'), Decimal('100000')),
+    (Decimal('100000'), None),
+)
+
+# Mínimos de calificación ofrecidos como filtro ("4 estrellas o más")
+CALIFICACIONES_MINIMAS = (4, 3, 2, 1)
+
+DISPONIBILIDADES = ('disponible', 'agotado', 'todos')
+
+
+class FacetasService:
+    """Facetas del catálogo a partir de un cubo de conteos.
+
+    Una sola consulta agrupa los productos de una búsqueda por categoría
+    (``categoria_ref``), rango de precio, estrellas (parte entera del promedio, 0 = sin reseñas)
+    y disponibilidad. El cubo tiene pocas filas y se cachea por búsqueda
+    normalizada; con él se calculan en Python los conteos de cada faceta
+    (aplicando los filtros de las demás, no el propio) y el total, para
+    cualquier combinación de filtros sin volver a la base.
+    """
+
+    TTL = 300
+
+    @staticmethod
+    def leer_filtros(parametros):
+        """
+        Filtros de faceta normalizados desde los parámetros GET
+
+        Returns:
+            dict: categoria (str), categoria_ids (la categoría y sus
+            subcategorías, o None sin filtro), precio (índice de RANGOS_PRECIO
+            o None), calificacion (mínimo o None) y disponibilidad
+        """
+        try:
+            precio = int(parametros.get('precio', ''))
+        except ValueError:
+            precio = None
+        try:
+            calificacion = int(parametros.get('calificacion', ''))
+        except ValueError:
+            calificacion = None
+        disponibilidad = parametros.get('disponibilidad', '')
+        categoria = parametros.get('categoria', '').strip()
+        return {
+            'categoria': categoria,
+            'categoria_ids': frozenset(CategoriasService.ids_subarbol(categoria)) if categoria else None,
+            'precio': precio if precio is not None and 0 <= precio < len(RANGOS_PRECIO) else None,
+            'calificacion': calificacion if calificacion in CALIFICACIONES_MINIMAS else None,
+            'disponibilidad': disponibilidad if disponibilidad in DISPONIBILIDADES else 'disponible',
+        }
+
+    @staticmethod
+    def _condiciones(filtros, excepto=None):
+        """Q de los filtros activos (menos ``excepto``), con las mismas definiciones que el cubo"""
+        condiciones = Q()
+        if filtros['categoria'] and excepto != 'categoria':
+            condiciones &= Q(categoria_ref__in=filtros['categoria_ids'])
+        if filtros['precio'] is not None and excepto != 'precio':
+            desde, hasta = RANGOS_PRECIO[filtros['precio']]
+            condiciones &= Q(precio__gte=desde)
+            if hasta is not None:
+                condiciones &= Q(precio__lt=hasta)
+        if filtros['calificacion'] is not None and excepto != 'calificacion':
+            condiciones &= Q(rating_total__gt=0, rating_promedio__gte=filtros['calificacion'])
+        if filtros['disponibilidad'] != 'todos' and excepto != 'disponibilidad':
+            condiciones &= Q(stock__gt=0) if filtros['disponibilidad'] == 'disponible' else Q(stock__lte=0)
+        return condiciones
+
+    @staticmethod
+    def filtrar(queryset, filtros):
+        """Aplica los filtros de faceta a un queryset de productos"""
+        return queryset.filter(FacetasService._condiciones(filtros))
+
+    @staticmethod
+    def _calcular_cubo(queryset):
+        rango_precio = Case(
+            *[
+                When(Q(precio__gte=desde) & (Q(precio__lt=hasta) if hasta is not None else Q()), then=Value(indice))
+                for indice, (desde, hasta) in enumerate(RANGOS_PRECIO)
+            ],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        estrellas = Case(
+            *[When(rating_total__gt=0, rating_promedio__gte=n, then=Value(n)) for n in (5, 4, 3, 2, 1)],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        disponible = Case(When(stock__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField())
+        return [
+            (categoria, rango, estrellas_fila, bool(disponible_fila), total)
+            for categoria, rango, estrellas_fila, disponible_fila, total in queryset.order_by().annotate(
+                faceta_precio=rango_precio, faceta_estrellas=estrellas, faceta_disponible=disponible,
+            ).values_list(
+                'categoria_ref_id', 'faceta_precio', 'faceta_estrellas', 'faceta_disponible'
+            ).annotate(total=Count('id')).values_list(
+                'categoria_ref_id', 'faceta_precio', 'faceta_estrellas', 'faceta_disponible', 'total'
+            )
+        ]
+
+    @staticmethod
+    def cubo(queryset, clave):
+        """
+        Conteos por (id de categoría, rango de precio, estrellas, disponible), cacheados
+
+        Args:
+            queryset: Productos de la búsqueda, sin filtros de faceta
+            clave: Búsqueda normalizada que define el queryset
+
+        Returns:
+            list: Tuplas (categoria_id, rango_precio, estrellas, disponible, total)
+        """
+        clave_cache = 'catalogo:facetas:v2:' + hashlib.sha1(clave.encode('utf-8')).hexdigest()
+        cubo = cache.get(clave_cache)
+        if cubo is None:
+            cubo = FacetasService._calcular_cubo(queryset)
+            cache.set(clave_cache, cubo, FacetasService.TTL)
+        return cubo
+
+    @staticmethod
+    def _cumple(fila, filtros, excepto=None):
+        categoria, rango, estrellas, disponible, _ = fila
+        if filtros['categoria'] and excepto != 'categoria' and categoria not in filtros['categoria_ids']:
+            return False
+        if filtros['precio'] is not None and excepto != 'precio' and rango != filtros['precio']:
+            return False
+        if filtros['calificacion'] is not None and excepto != 'calificacion' and estrellas < filtros['calificacion']:
+            return False
+        if filtros['disponibilidad'] != 'todos' and excepto != 'disponibilidad':
+            if disponible != (filtros['disponibilidad'] == 'disponible'):
+                return False
+        return True
+
+    @staticmethod
+    def total(cubo, filtros):
+        """Productos que cumplen todos los filtros"""
+        return sum(fila[4] for fila in cubo if FacetasService._cumple(fila, filtros))
+
+    @staticmethod
+    def facetas(cubo, filtros):
+        """
+        Conteo de cada valor de cada faceta
+
+        El conteo de una faceta aplica los filtros de las otras pero no el
+        suyo, así se ve cuántos productos habría al cambiar de valor.
+
+        Returns:
+            dict: {faceta: [{'valor', 'total', 'seleccionado'}]}; el valor
+            de categoría es su nombre, su total incluye las subcategorías y
+            las que no tienen productos no se listan
+        """
+        categorias, precios, estrellas, disponibilidad = {}, [0] * len(RANGOS_PRECIO), {}, {True: 0, False: 0}
+        for fila in cubo:
+            categoria, rango, estrellas_fila, disponible, total = fila
+            if FacetasService._cumple(fila, filtros, excepto='categoria'):
+                categorias[categoria] = categorias.get(categoria, 0) + total
+            if FacetasService._cumple(fila, filtros, excepto='precio'):
+                precios[rango] += total
+            if FacetasService._cumple(fila, filtros, excepto='calificacion'):
+                estrellas[estrellas_fila] = estrellas.get(estrellas_fila, 0) + total
+            if FacetasService._cumple(fila, filtros, excepto='disponibilidad'):
+                disponibilidad[disponible] += total
+
+        # Cada categoría cuenta también los productos de sus subcategorías (lo que se ve al elegirla)
+        menu = {categoria['id']: categoria for categoria in CategoriasService.menu()}
+        con_subcategorias = {}
+        for categoria_id, total in categorias.items():
+            visitadas = set()
+            while categoria_id in menu and categoria_id not in visitadas:
+                visitadas.add(categoria_id)
+                con_subcategorias[categoria_id] = con_subcategorias.get(categoria_id, 0) + total
+                categoria_id = menu[categoria_id]['padre_id']
+        slug_seleccionado = CategoriasService.slug(filtros['categoria'])
+        categorias = [
+            ((menu[categoria_id]['nombre'], menu[categoria_id]['slug']), total)
+            for categoria_id, total in con_subcategorias.items() if total
+        ]
+        return {
+            'categoria': [
+                {'valor': nombre, 'total': total, 'seleccionado': slug == slug_seleccionado}
+                for (nombre, slug), total in sorted(categorias, key=lambda par: (-par[1], par[0][0]))
+            ],
+            'precio': [
+                {'valor': indice, 'desde': desde, 'hasta': hasta, 'total': precios[indice],
+                 'seleccionado': filtros['precio'] == indice}
+                for indice, (desde, hasta) in enumerate(RANGOS_PRECIO)
+            ],
+            'calificacion': [
+                {'valor': minimo, 'total': sum(n for e, n in estrellas.items() if e >= minimo),
+                 'seleccionado': filtros['calificacion'] == minimo}
+                for minimo in CALIFICACIONES_MINIMAS
+            ],
+            'disponibilidad': [
+                {'valor': 'disponible', 'total': disponibilidad[True],
+                 'seleccionado': filtros['disponibilidad'] == 'disponible'},
+                {'valor': 'agotado', 'total': disponibilidad[False],
+                 'seleccionado': filtros['disponibilidad'] == 'agotado'},
+                {'valor': 'todos', 'total': disponibilidad[True] + disponibilidad[False],
+                 'seleccionado': filtros['disponibilidad'] == 'todos'},
+            ],
+        }
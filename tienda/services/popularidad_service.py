@@ -0,0 +1,133 @@
+"""
+Índice de popularidad de productos basado en ventas reales
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from tienda.models import PedidoProducto, PopularidadProducto, Producto
+from tienda.services.categorias_service import CategoriasService
+
+logger = logging.getLogger(__name__)
+
+
+class PopularidadService:
+    """Calcula y consulta el índice ``PopularidadProducto``"""
+
+    VENTANAS = (7, 30, 90)
+    CAMPOS_ORDEN = {
+        'puntaje': '-puntaje',
+        '7d': '-unidades_7d',
+        '30d': '-unidades_30d',
+        '90d': '-unidades_90d',
+    }
+
+    @staticmethod
+    def recalcular(ahora=None, vida_media_dias=None):
+        """
+        Recalcula el índice completo a partir de los pedidos de los últimos 90 días
+
+        Las líneas de pedido se leen en una sola consulta y se agregan con
+        NumPy: unidades e ingresos por ventana y un puntaje donde cada unidad
+        pesa ``0.5 ** (antigüedad / vida_media_dias)``.
+
+        Args:
+            ahora: Momento de referencia (default: ahora)
+            vida_media_dias: Días en que una venta pierde la mitad de su peso
+                (default: settings.POPULARIDAD_VIDA_MEDIA_DIAS)
+
+        Returns:
+            int: Cantidad de productos en el índice
+        """
+        from tienda.recomendador import ESTADOS_PEDIDO_COMPLETADO
+
+        # NumPy solo al recalcular: importar el servicio (desde las vistas) no lo carga
+        try:
+            import numpy as np
+        except ImportError:
+            raise RuntimeError("NumPy es necesario para calcular la popularidad")
+
+        ahora = ahora or timezone.now()
+        vida_media = vida_media_dias or getattr(settings, 'POPULARIDAD_VIDA_MEDIA_DIAS', 14)
+        desde = ahora - timedelta(days=max(PopularidadService.VENTANAS))
+
+        filas = list(
+            PedidoProducto.objects.filter(
+                pedido__estado__in=ESTADOS_PEDIDO_COMPLETADO,
+                pedido__fecha_creacion__gte=desde,
+            ).values_list('producto_id', 'cantidad', 'precio_unitario', 'pedido__fecha_creacion')
+            .order_by().iterator(chunk_size=5000)
+        )
+
+        registros = []
+        if filas:
+            producto_ids = np.fromiter((f[0] for f in filas), dtype=np.int64, count=len(filas))
+            cantidades = np.fromiter((f[1] for f in filas), dtype=np.float64, count=len(filas))
+            # Centavos enteros para no acumular error de punto flotante en los ingresos
+            centavos = cantidades * np.fromiter(
+                (int(f[2] * 100) for f in filas), dtype=np.float64, count=len(filas)
+            )
+            edad_dias = np.fromiter(
+                ((ahora - f[3]).total_seconds() / 86400 for f in filas), dtype=np.float64, count=len(filas)
+            )
+
+            productos, inversa = np.unique(producto_ids, return_inverse=True)
+            puntajes = np.bincount(
+                inversa, weights=cantidades * 0.5 ** (np.maximum(edad_dias, 0) / vida_media),
+                minlength=productos.size,
+            )
+            unidades, ingresos = {}, {}
+            for dias in PopularidadService.VENTANAS:
+                en_ventana = edad_dias < dias
+                unidades[dias] = np.bincount(inversa[en_ventana], weights=cantidades[en_ventana],
+                                             minlength=productos.size)
+                ingresos[dias] = np.bincount(inversa[en_ventana], weights=centavos[en_ventana],
+                                             minlength=productos.size)
+
+            categorias = dict(
+                Producto.objects.filter(id__in=productos.tolist()).values_list('id', 'categoria_ref_id')
+            )
+            for i, producto_id in enumerate(productos.tolist()):
+                if producto_id not in categorias:
+                    continue
+                registros.append(PopularidadProducto(
+                    producto_id=producto_id,
+                    categoria_ref_id=categorias[producto_id],
+                    puntaje=float(puntajes[i]),
+                    fecha_calculo=ahora,
+                    **{f'unidades_{dias}d': int(unidades[dias][i]) for dias in PopularidadService.VENTANAS},
+                    **{f'ingresos_{dias}d': Decimal(int(round(ingresos[dias][i]))) / 100
+                       for dias in PopularidadService.VENTANAS},
+                ))
+
+        # Reemplazo completo: la tabla queda con una fila por producto vendido
+        with transaction.atomic():
+            PopularidadProducto.objects.all().delete()
+            PopularidadProducto.objects.bulk_create(registros, batch_size=1000)
+
+        logger.info(f"Índice de popularidad recalculado: {len(registros)} productos")
+        return len(registros)
+
+    @staticmethod
+    def mas_vendidos(top_n=5, categoria=None, orden='puntaje', solo_disponibles=True):
+        """
+        Productos más vendidos según el índice (lectura top-k indexada)
+
+        Args:
+            top_n: Cantidad de productos
+            categoria: Limitar a una categoría y sus subcategorías, por nombre (opcional)
+            orden: 'puntaje' (con decaimiento) o ventana '7d', '30d', '90d'
+            solo_disponibles: Excluir productos sin stock o inactivos
+
+        Returns:
+            list: Instancias de Producto, de más a menos vendido
+        """
+        consulta = PopularidadProducto.objects.select_related('producto')
+        if categoria:
+            consulta = consulta.filter(categoria_ref__in=CategoriasService.ids_subarbol(categoria))
+        if solo_disponibles:
+            consulta = consulta.filter(producto__stock__gt=0, producto__estado='activo')
+        consulta = consulta.order_by(PopularidadService.CAMPOS_ORDEN[orden])
+        return [popularidad.producto for popularidad in consulta[:top_n]]
@@ -0,0 +1,490 @@
+"""
+Registro de modelos del recomendador compartido por todo el proceso
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class CacheRecomendaciones:
+    """Cache LRU con expiración de las recomendaciones de cada usuario.
+
+    Cada entrada guarda la versión del modelo que la calculó: con otra
+    versión vigente la entrada no sirve y se reemplaza. Se invalida por
+    usuario cuando hace un pedido y por completo al cargar un modelo nuevo.
+    """
+
+    def __init__(self, max_usuarios=10000, ttl=300):
+        self.max_usuarios = max_usuarios
+        self.ttl = ttl
+        # usuario_id -> (version, {top_n: (expira, recomendaciones)})
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, usuario_id, version, top_n):
+        """Recomendaciones guardadas para el usuario, o None si no hay vigentes"""
+        with self._lock:
+            entrada = self._entradas.get(usuario_id)
+            if entrada is not None and entrada[0] == version:
+                guardado = entrada[1].get(top_n)
+                if guardado is not None and guardado[0] > time.monotonic():
+                    self._entradas.move_to_end(usuario_id)
+                    self.aciertos += 1
+                    return guardado[1]
+            self.fallos += 1
+            return None
+
+    def guardar(self, usuario_id, version, top_n, recomendaciones):
+        with self._lock:
+            entrada = self._entradas.get(usuario_id)
+            if entrada is None or entrada[0] != version:
+                entrada = (version, {})
+                self._entradas[usuario_id] = entrada
+            entrada[1][top_n] = (time.monotonic() + self.ttl, recomendaciones)
+            self._entradas.move_to_end(usuario_id)
+            while len(self._entradas) > self.max_usuarios:
+                self._entradas.popitem(last=False)
+
+    def invalidar_usuario(self, usuario_id):
+        with self._lock:
+            self._entradas.pop(usuario_id, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        """Contadores de aciertos y fallos de este proceso"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'usuarios': len(self._entradas),
+                'tasa_aciertos': round(self.aciertos / consultas * 100, 1) if consultas else 0,
+            }
+
+
+class RegistroRecomendador:
+    """Mantiene un único RecomendadorIA entrenado por proceso (worker).
+
+    El modelo se carga la primera vez que se pide y luego se refresca en un
+    hilo en segundo plano cada ``intervalo`` segundos, o antes si cambia la
+    fecha de modificación de ``archivo_version``. El modelo nuevo se construye
+    completo antes de reemplazar la referencia, así que las peticiones en curso
+    siguen usando el anterior hasta terminar.
+
+    Las compras nuevas (``DeltaInteraccion``) se aplican al historial de los
+    usuarios en cuanto se leen, y cada ``intervalo_fusion`` segundos se
+    incorporan también a la similitud entre productos con una mini-fusión.
+
+    ``recomendar`` pasa por ``cache``, que se vacía con cada versión nueva y
+    pierde las entradas de los usuarios con compras nuevas.
+    """
+
+    # Cada cuántos segundos el hilo revisa si corresponde refrescar
+    INTERVALO_CHEQUEO = 30
+    # Máximo de deltas leídos por consulta
+    LOTE_DELTAS = 5000
+
+    def __init__(self, fabrica=None, intervalo=None, archivo_version=None):
+        self._fabrica = fabrica
+        self._intervalo = intervalo
+        self._archivo_version = archivo_version
+        self._actual = None  # (recomendador, version)
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._ultima_carga = 0.0
+        self._mtime_version = None
+        self._lock_deltas = threading.Lock()
+        self._ultima_sincronizacion = 0.0
+        self._ultima_fusion = 0.0
+        self.cache = CacheRecomendaciones(
+            max_usuarios=getattr(settings, 'RECOMENDADOR_CACHE_MAX_USUARIOS', 10000),
+            ttl=getattr(settings, 'RECOMENDADOR_CACHE_TTL', 300),
+        )
+
+    @property
+    def intervalo(self):
+        if self._intervalo is not None:
+            return self._intervalo
+        return getattr(settings, 'RECOMENDADOR_INTERVALO_REFRESCO', 3600)
+
+    @property
+    def archivo_version(self):
+        if self._archivo_version is not None:
+            return self._archivo_version
+        return getattr(settings, 'RECOMENDADOR_ARCHIVO_VERSION', None)
+
+    @property
+    def intervalo_deltas(self):
+        return getattr(settings, 'RECOMENDADOR_INTERVALO_DELTAS', 5)
+
+    @property
+    def intervalo_fusion(self):
+        return getattr(settings, 'RECOMENDADOR_INTERVALO_FUSION', 300)
+
+    @property
+    def version(self):
+        actual = self._actual
+        return actual[1] if actual else None
+
+    def obtener(self):
+        """
+        Devuelve el recomendador vigente, cargándolo si es la primera vez
+
+        Returns:
+            RecomendadorIA: Modelo entrenado listo para recomendar
+        """
+        actual = self._actual
+        if actual is None:
+            with self._lock:
+                if self._actual is None:
+                    self._recargar_sin_lock()
+                    self.iniciar_refresco()
+            actual = self._actual
+        elif time.monotonic() - self._ultima_sincronizacion >= self.intervalo_deltas:
+            try:
+                self.sincronizar_deltas()
+            except Exception as e:
+                logger.error(f"Error leyendo deltas del recomendador: {str(e)}")
+        return actual[0]
+
+    def recomendar(self, usuario, top_n=4):
+        """
+        Recomendaciones del usuario con el modelo vigente, usando el cache
+
+        Args:
+            usuario: Usuario a recomendar
+            top_n: Cantidad de recomendaciones
+
+        Returns:
+            list: Mismo formato que ``RecomendadorIA.recomendar``
+        """
+        self.obtener()
+        recomendador, version = self._actual
+        if usuario.id is None:
+            return recomendador.recomendar(usuario, top_n=top_n)
+
+        recomendaciones = self.cache.obtener(usuario.id, version, top_n)
+        if recomendaciones is None:
+            recomendaciones = recomendador.recomendar(usuario, top_n=top_n)
+            self.cache.guardar(usuario.id, version, top_n, recomendaciones)
+        return recomendaciones
+
+    def recargar(self):
+        """Construye un modelo nuevo y lo publica de forma atómica"""
+        with self._lock:
+            self._recargar_sin_lock()
+
+    def _recargar_sin_lock(self):
+        inicio = time.monotonic()
+        mtime = self._leer_mtime_version()
+        recomendador = self._construir()
+        version = self._calcular_version(recomendador, mtime)
+        # Ponerse al día con las compras posteriores al entrenamiento antes de publicar
+        with self._lock_deltas:
+            self._leer_deltas(recomendador)
+
+        # Reemplazo atómico: una sola asignación de la tupla (modelo, versión)
+        self._actual = (recomendador, version)
+        self.cache.limpiar()
+        self._ultima_carga = time.monotonic()
+        self._mtime_version = mtime
+        logger.info(f"Recomendador cargado (versión {version}) en {time.monotonic() - inicio:.2f}s")
+
+    def _leer_deltas(self, recomendador):
+        from tienda.models import DeltaInteraccion
+
+        while True:
+            deltas = list(
+                DeltaInteraccion.objects.filter(id__gt=recomendador.ultimo_delta_id)
+                .order_by('id')
+                .values_list('id', 'usuario_id', 'producto_id', 'cantidad', 'fecha_creacion')[:self.LOTE_DELTAS]
+            )
+            recomendador.aplicar_deltas(deltas)
+            for usuario_id in {delta[1] for delta in deltas}:
+                self.cache.invalidar_usuario(usuario_id)
+            if len(deltas) < self.LOTE_DELTAS:
+                break
+        self._ultima_sincronizacion = time.monotonic()
+
+    def sincronizar_deltas(self):
+        """Aplica al modelo vigente las compras registradas desde la última lectura"""
+        actual = self._actual
+        if actual is None:
+            return
+        with self._lock_deltas:
+            self._leer_deltas(actual[0])
+
+    def fusionar_deltas(self):
+        """
+        Incorpora los deltas pendientes a la similitud entre productos (mini-fusión)
+
+        Los locks se toman solo para leer los deltas y para publicar: la
+        fusión corre sin ellos, así que la sincronización y los pedidos no
+        esperan. Si mientras tanto se cargó otro modelo, la fusión se descarta.
+        """
+        actual = self._actual
+        if actual is None:
+            return
+        recomendador, version = actual
+        with self._lock_deltas:
+            self._leer_deltas(recomendador)
+            self._ultima_fusion = time.monotonic()
+            instantanea = recomendador.instantanea_deltas()
+        if not instantanea[0]:
+            return
+
+        inicio = time.monotonic()
+        fusionado = recomendador.con_deltas_fusionados(instantanea)
+        version = f"{version.split('+')[0]}+{fusionado.ultimo_delta_id}"
+        with self._lock:
+            if self._actual is not actual:
+                return
+            with self._lock_deltas:
+                # Las compras leídas durante la fusión quedan pendientes en el modelo nuevo
+                self._leer_deltas(fusionado)
+                self._actual = (fusionado, version)
+            self.cache.limpiar()
+        logger.info(f"Deltas fusionados (versión {version}) en {time.monotonic() - inicio:.2f}s")
+
+    def _construir(self):
+        if self._fabrica is not None:
+            return self._fabrica()
+        from tienda.recomendador import RecomendadorIA, version_actual
+
+        modo = getattr(settings, 'RECOMENDADOR_MODO', 'item')
+        directorio = getattr(settings, 'RECOMENDADOR_ARTEFACTOS_DIR', None)
+        version = version_actual(directorio) if directorio else None
+        if version:
+            # Artefacto generado por `manage.py train_recommender`
+            return RecomendadorIA.desde_artefacto(os.path.join(directorio, version), modo=modo)
+
+        # Sin artefactos publicados: entrenar desde la base de datos
+        recomendador = RecomendadorIA(modo=modo)
+        recomendador.actualizar_datos()
+        return recomendador
+
+    def _calcular_version(self, recomendador, mtime):
+        return getattr(recomendador, 'version', None) or f"{mtime or time.time():.0f}"
+
+    def _leer_mtime_version(self):
+        ruta = self.archivo_version
+        if not ruta:
+            return None
+        try:
+            return os.path.getmtime(ruta)
+        except OSError:
+            return None
+
+    def _debe_refrescar(self):
+        if time.monotonic() - self._ultima_carga >= self.intervalo:
+            return True
+        mtime = self._leer_mtime_version()
+        return mtime is not None and mtime != self._mtime_version
+
+    def iniciar_refresco(self):
+        """Inicia (una sola vez) el hilo de refresco en segundo plano"""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(
+            target=self._bucle_refresco, name='recomendador-refresco', daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo de refresco"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+            self._hilo = None
+
+    def _bucle_refresco(self):
+        while not self._detener.wait(min(self.INTERVALO_CHEQUEO, self.intervalo)):
+            try:
+                if self._debe_refrescar():
+                    self.recargar()
+                elif time.monotonic() - self._ultima_fusion >= self.intervalo_fusion:
+                    self.fusionar_deltas()
+                else:
+                    self.sincronizar_deltas()
+            except Exception as e:
+                # Si falla el refresco se sigue sirviendo el modelo anterior
+                logger.error(f"Error refrescando el recomendador: {str(e)}")
+                self._ultima_carga = time.monotonic()
+            finally:
+                # El hilo no debe retener conexiones abiertas entre refrescos
+                connection.close()
+
+
+registro_recomendador = RegistroRecomendador()
+
+
+def obtener_recomendador():
+    """Atajo para obtener el recomendador compartido del proceso"""
+    return registro_recomendador.obtener()
+
+
+def recomendar_usuario(usuario, top_n=4):
+    """Atajo para recomendar con el modelo compartido y el cache del proceso"""
+    return registro_recomendador.recomendar(usuario, top_n=top_n)
+
+
+# Dónde se muestran las recomendaciones: define de qué fuentes salen
+CONTEXTOS_RECOMENDACION = ('home', 'product', 'cart')
+RAZON_COMPRADOS_JUNTOS = "Frecuentemente comprados juntos"
+RAZON_PARECIDO = "Parecido a lo que estás viendo"
+RAZON_POPULAR = "Producto popular en la tienda"
+
+
+def versiones_etag(usuario, con_indices=False):
+    """
+    Versiones de las que depende el ETag, leídas con una sola consulta de MAX indexados
+
+    Args:
+        usuario: Usuario de la petición (anónimo: sin historial)
+        con_indices: Incluir las versiones de asociaciones y similitud de contenido
+
+    Returns:
+        tuple: Id de la última compra registrada del usuario y, con
+        ``con_indices``, el último id de cada índice (0 donde no hay filas)
+    """
+    from tienda.models import AsociacionProducto, DeltaInteraccion, SimilitudContenido
+
+    if usuario.id is None and not con_indices:
+        return (0,)
+    # Las filas de los índices se recrean con ids nuevos en cada recálculo: su MAX(id) es la versión
+    columnas = [f"(SELECT MAX(id) FROM {DeltaInteraccion._meta.db_table} WHERE usuario_id = %s)"]
+    if con_indices:
+        columnas += [
+            f"(SELECT MAX(id) FROM {modelo._meta.db_table})" for modelo in (AsociacionProducto, SimilitudContenido)
+        ]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(columnas)}", [usuario.id])
+        return tuple(valor or 0 for valor in cursor.fetchone())
+
+
+def etag_recomendaciones(usuario, contexto, producto_ids=(), top_n=4, excluir=()):
+    """
+    ETag de las recomendaciones de ``recomendar_contexto``
+
+    Combina la versión del modelo vigente, la del historial del usuario y la
+    de los índices de productos del contexto. Incluye además la ventana de
+    ``RECOMENDADOR_CACHE_TTL`` en curso: cambios de stock o precio se ven a lo
+    sumo un TTL tarde, igual que con el cache de recomendaciones.
+    """
+    registro_recomendador.obtener()
+    partes = [
+        contexto, top_n, registro_recomendador.version,
+        ','.join(str(p) for p in sorted(producto_ids)), ','.join(str(p) for p in sorted(excluir)),
+        int(time.time() // max(1, registro_recomendador.cache.ttl)),
+        *versiones_etag(usuario, con_indices=contexto != 'home'),
+    ]
+    return hashlib.sha1('|'.join(str(p) for p in partes).encode('utf-8')).hexdigest()
+
+
+def recomendar_contexto(usuario, contexto='home', producto_ids=(), top_n=4, excluir=()):
+    """
+    Recomendaciones según la página donde se muestran
+
+    - ``home``: personalizadas con el modelo compartido (con cache).
+    - ``product``: productos comprados junto con ``producto_ids`` y, para
+      completar, los más parecidos por texto.
+    - ``cart``: igual que ``product`` sobre todo el carrito, completando con
+      las personalizadas.
+
+    Si no alcanza, se completa con los más vendidos.
+
+    Args:
+        usuario: Usuario (puede ser anónimo)
+        contexto: Uno de ``CONTEXTOS_RECOMENDACION``
+        producto_ids: Productos que se están viendo (o los del carrito)
+        top_n: Cantidad de recomendaciones
+        excluir: Productos que no deben recomendarse (p. ej. ya mostrados en la página)
+
+    Returns:
+        list: Mismo formato que ``RecomendadorIA.recomendar``
+    """
+    from tienda.models import Producto
+    from tienda.services.asociaciones_service import AsociacionesService
+    from tienda.services.contenido_service import ContenidoService
+    from tienda.services.popularidad_service import PopularidadService
+
+    if contexto not in CONTEXTOS_RECOMENDACION:
+        raise ValueError(f"Contexto de recomendación no soportado: {contexto}")
+
+    excluidos = set(producto_ids) | set(excluir)
+    recomendaciones = []
+
+    def agregar(items):
+        for item in items:
+            producto = item['producto']
+            if len(recomendaciones) < top_n and producto.id not in excluidos and producto.en_stock:
+                excluidos.add(producto.id)
+                recomendaciones.append(item)
+
+    if contexto != 'home' and producto_ids:
+        fuentes = [
+            (AsociacionesService.puntajes(producto_ids), RAZON_COMPRADOS_JUNTOS),
+            (ContenidoService.puntajes_similares(producto_ids), RAZON_PARECIDO),
+        ]
+        candidatos = [
+            (producto_id, puntajes[producto_id], razon) for puntajes, razon in fuentes
+            for producto_id in sorted(puntajes, key=puntajes.get, reverse=True)[:top_n * 3]
+        ]
+        productos = Producto.objects.in_bulk({producto_id for producto_id, _, _ in candidatos})
+        agregar(
+            {'producto': productos[producto_id], 'score': float(score), 'razon': razon}
+            for producto_id, score, razon in candidatos if producto_id in productos
+        )
+
+    if contexto != 'product' and usuario.is_authenticated and len(recomendaciones) < top_n:
+        agregar(recomendar_usuario(usuario, top_n=top_n + len(excluidos)))
+
+    if len(recomendaciones) < top_n:
+        agregar(
+            {'producto': producto, 'score': 0.5, 'razon': RAZON_POPULAR}
+            for producto in PopularidadService.mas_vendidos(top_n + len(excluidos))
+        )
+    return recomendaciones
+
+
+def registrar_pedido(pedido):
+    """
+    Registra los productos de un pedido como deltas para el recomendador
+
+    Debe llamarse después de crear los PedidoProducto, dentro de la misma
+    transacción que el pedido.
+
+    Args:
+        pedido: Instancia de Pedido ya confirmado (pagado/enviado/entregado)
+    """
+    from tienda.models import DeltaInteraccion, PedidoProducto
+    from tienda.recomendador import ESTADOS_PEDIDO_COMPLETADO
+
+    # Las recomendaciones guardadas del usuario ya no reflejan lo que compró
+    usuario_id = pedido.usuario_id
+    transaction.on_commit(lambda: registro_recomendador.cache.invalidar_usuario(usuario_id))
+
+    if pedido.estado not in ESTADOS_PEDIDO_COMPLETADO:
+        return
+
+    DeltaInteraccion.objects.bulk_create([
+        DeltaInteraccion(usuario_id=pedido.usuario_id, producto_id=producto_id, cantidad=cantidad)
+        for producto_id, cantidad in PedidoProducto.objects.filter(pedido=pedido)
+        .values_list('producto_id', 'cantidad')
+    ])
+    # Reflejar la compra en este worker en cuanto se confirme la transacción
+    transaction.on_commit(registro_recomendador.sincronizar_deltas, robust=True)
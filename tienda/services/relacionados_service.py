@@ -0,0 +1,174 @@
+"""
+Productos relacionados precalculados para el detalle de producto
+"""
+import logging
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from tienda.models import AsociacionProducto, Producto, ProductoRelacionado, SimilitudContenido
+
+logger = logging.getLogger(__name__)
+
+
+class RelacionadosService:
+    """Calcula y sirve ``ProductoRelacionado``.
+
+    El puntaje de cada candidato suma, con los pesos de ``PESOS``, la
+    confianza de la regla de compra conjunta, la similitud de texto y su
+    lugar entre los ``POR_CATEGORIA`` más populares de la misma categoría
+    (1 el primero, bajando hasta 0). Se guardan ``TOP`` por producto, más de
+    los que se muestran, porque el stock se filtra al servirlos.
+    """
+
+    PESOS = {
+        'compras': 0.5,
+        'contenido': 0.35,
+        'categoria': 0.15,
+    }
+    TOP = 12
+    POR_CATEGORIA = 20
+    LOTE = 500
+
+    @staticmethod
+    def _populares_categoria(categoria_id, cache_categorias):
+        if categoria_id is None:
+            return []
+        if categoria_id not in cache_categorias:
+            cache_categorias[categoria_id] = list(
+                Producto.objects.filter(categoria_ref_id=categoria_id, estado='activo', stock__gt=0).order_by(
+                    F('popularidad__puntaje').desc(nulls_last=True), '-rating_promedio', '-id'
+                ).values_list('id', flat=True)[:RelacionadosService.POR_CATEGORIA]
+            )
+        return cache_categorias[categoria_id]
+
+    @staticmethod
+    def _calcular(producto_ids, top_n, cache_categorias):
+        """
+        Listas de relacionados de un lote de productos
+
+        Returns:
+            list: Instancias de ProductoRelacionado sin guardar
+        """
+        pesos = RelacionadosService.PESOS
+        aportes = {producto_id: {} for producto_id in producto_ids}
+
+        def sumar(producto_id, candidato_id, fuente, valor):
+            if candidato_id == producto_id or valor <= 0:
+                return
+            fuentes = aportes[producto_id].setdefault(candidato_id, {})
+            fuentes[fuente] = fuentes.get(fuente, 0.0) + pesos[fuente] * valor
+
+        for producto_id, recomendado_id, confianza in AsociacionProducto.objects.filter(
+            producto_id__in=producto_ids
+        ).values_list('producto_id', 'recomendado_id', 'confianza'):
+            sumar(producto_id, recomendado_id, 'compras', min(confianza, 1.0))
+
+        for producto_id, similar_id, puntaje in SimilitudContenido.objects.filter(
+            producto_id__in=producto_ids
+        ).values_list('producto_id', 'similar_id', 'puntaje'):
+            sumar(producto_id, similar_id, 'contenido', puntaje)
+
+        total_categoria = RelacionadosService.POR_CATEGORIA
+        for producto_id, categoria_id in Producto.objects.filter(id__in=producto_ids).values_list(
+            'id', 'categoria_ref_id'
+        ):
+            for posicion, candidato_id in enumerate(
+                RelacionadosService._populares_categoria(categoria_id, cache_categorias)
+            ):
+                sumar(producto_id, candidato_id, 'categoria', 1 - posicion / total_categoria)
+
+        # Solo productos activos (el stock se mira al servirlos)
+        candidatos = {candidato_id for fuentes in aportes.values() for candidato_id in fuentes}
+        activos = set(Producto.objects.filter(id__in=candidatos, estado='activo').values_list('id', flat=True))
+
+        registros = []
+        for producto_id, por_candidato in aportes.items():
+            puntajes = [
+                (sum(fuentes.values()), candidato_id, max(fuentes, key=fuentes.get))
+                for candidato_id, fuentes in por_candidato.items() if candidato_id in activos
+            ]
+            puntajes.sort(key=lambda fila: (-fila[0], fila[1]))
+            registros.extend(
+                ProductoRelacionado(
+                    producto_id=producto_id, relacionado_id=candidato_id,
+                    posicion=posicion, puntaje=round(puntaje, 6), motivo=motivo,
+                )
+                for posicion, (puntaje, candidato_id, motivo) in enumerate(puntajes[:top_n])
+            )
+        return registros
+
+    @staticmethod
+    def _guardar(producto_ids, registros):
+        with transaction.atomic():
+            ProductoRelacionado.objects.filter(producto_id__in=producto_ids).delete()
+            ProductoRelacionado.objects.bulk_create(registros, batch_size=1000)
+
+    @staticmethod
+    def recalcular(top_n=None, lote=None):
+        """
+        Recalcula los relacionados de todo el catálogo, por lotes de productos
+
+        Conviene correrlo después de ``update_product_associations`` y
+        ``update_content_similarity``, que generan dos de las fuentes.
+
+        Args:
+            top_n: Relacionados a guardar por producto (default: TOP)
+            lote: Productos por lote (default: LOTE)
+
+        Returns:
+            tuple: (productos procesados, relaciones guardadas)
+        """
+        top_n = top_n or RelacionadosService.TOP
+        lote = lote or RelacionadosService.LOTE
+        cache_categorias = {}
+        procesados = guardados = 0
+        ultimo_id = 0
+        while True:
+            producto_ids = list(
+                Producto.objects.filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:lote]
+            )
+            if not producto_ids:
+                break
+            registros = RelacionadosService._calcular(producto_ids, top_n, cache_categorias)
+            RelacionadosService._guardar(producto_ids, registros)
+            procesados += len(producto_ids)
+            guardados += len(registros)
+            ultimo_id = producto_ids[-1]
+
+        logger.info(f"Productos relacionados recalculados: {procesados} productos, {guardados} relaciones")
+        return procesados, guardados
+
+    @staticmethod
+    def actualizar_producto_seguro(producto_id):
+        """Rehace la lista de un producto creado o editado sin propagar errores (para usar desde señales)"""
+        try:
+            registros = RelacionadosService._calcular([producto_id], RelacionadosService.TOP, {})
+            guardados = list(
+                ProductoRelacionado.objects.filter(producto_id=producto_id).order_by('posicion').values_list(
+                    'relacionado_id', 'posicion', 'puntaje', 'motivo'
+                )
+            )
+            # Casi todas las ediciones no cambian la lista: no reescribirla
+            if guardados != [(r.relacionado_id, r.posicion, r.puntaje, r.motivo) for r in registros]:
+                RelacionadosService._guardar([producto_id], registros)
+        except Exception as e:
+            logger.error(f"Error actualizando los productos relacionados de {producto_id}: {str(e)}")
+
+    @staticmethod
+    def relacionados(producto_id, top_n=4):
+        """
+        Relacionados con stock de un producto, anotados para el catálogo, con una sola consulta
+
+        Returns:
+            list: Instancias de Producto en el orden precalculado (vacía si
+            el producto todavía no tiene lista)
+        """
+        relaciones = ProductoRelacionado.objects.filter(producto_id=producto_id)
+        return list(
+            Producto.objects.para_catalogo().filter(
+                id__in=relaciones.values('relacionado_id'), stock__gt=0, estado='activo'
+            ).annotate(
+                posicion_relacionado=Subquery(
+                    relaciones.filter(relacionado_id=OuterRef('pk')).values('posicion')[:1]
+                ),
+            ).order_by('posicion_relacionado')[:top_n]
+        )
@@ -0,0 +1,138 @@
+"""
+Señales de la tienda
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Producto, Resena
+from .services.autocompletar_service import AutocompletarService
+from .services.busqueda_service import BusquedaService
+from .services.calificaciones_service import CalificacionesService
+from .services.categorias_service import CategoriasService
+from .services.contenido_service import ContenidoService
+from .services.relacionados_service import RelacionadosService
+
+# Campos de Producto que leen los índices (búsqueda, autocompletado, contenido y relacionados)
+CAMPOS_INDEXADOS = frozenset(['nombre', 'descripcion', 'categoria', 'sku', 'estado', 'precio'])
+
+
+def _sin_cambios_indexados(raw, update_fields):
+    """True si el guardado no toca nada que haya que reindexar (p. ej. ``reducir_stock``)"""
+    return raw or (update_fields is not None and CAMPOS_INDEXADOS.isdisjoint(update_fields))
+
+
+@receiver(pre_save, sender=Producto)
+def asignar_categoria_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Resuelve ``categoria`` a su ``Categoria`` y guarda la anterior para ajustar los conteos"""
+    instance._categoria_anterior = None
+    if raw or (update_fields is not None and 'categoria' not in update_fields):
+        return
+    if instance.pk is not None:
+        instance._categoria_anterior = Producto.objects.filter(pk=instance.pk).values_list(
+            'categoria_ref_id', flat=True
+        ).first()
+    instance.categoria_ref_id = CategoriasService.obtener_o_crear_id(instance.categoria)
+
+
+@receiver(post_save, sender=Producto)
+def contar_categoria_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Ajusta los conteos de productos de la categoría nueva y la anterior"""
+    if raw or (update_fields is not None and 'categoria' not in update_fields):
+        return
+    if update_fields is not None and 'categoria_ref' not in update_fields:
+        # save(update_fields=[..., 'categoria']) no incluye la FK asignada en pre_save
+        Producto.objects.filter(pk=instance.pk).update(categoria_ref_id=instance.categoria_ref_id)
+    anterior = getattr(instance, '_categoria_anterior', None)
+    if anterior != instance.categoria_ref_id:
+        CategoriasService.ajustar_seguro(anterior, -1)
+        CategoriasService.ajustar_seguro(instance.categoria_ref_id, 1)
+
+
+@receiver(post_delete, sender=Producto)
+def descontar_categoria_producto(sender, instance, **kwargs):
+    """Descuenta el producto borrado del conteo de su categoría"""
+    CategoriasService.ajustar_seguro(instance.categoria_ref_id, -1)
+
+
+@receiver(post_save, sender=Producto)
+def reindexar_contenido_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Actualiza la similitud de contenido al crear o editar un producto"""
+    if _sin_cambios_indexados(raw, update_fields):
+        return
+    # Después del commit: un error en el índice no debe afectar al guardado del producto
+    transaction.on_commit(lambda: ContenidoService.actualizar_producto_seguro(instance))
+
+
+@receiver(post_save, sender=Producto)
+def recalcular_relacionados_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Rehace la lista de relacionados del producto (después de su similitud de contenido)"""
+    if _sin_cambios_indexados(raw, update_fields):
+        return
+    producto_id = instance.id
+    transaction.on_commit(lambda: RelacionadosService.actualizar_producto_seguro(producto_id))
+
+
+@receiver(post_save, sender=Producto)
+def reindexar_busqueda_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Actualiza el índice de búsqueda al crear o editar un producto"""
+    if _sin_cambios_indexados(raw, update_fields):
+        return
+    transaction.on_commit(lambda: BusquedaService.actualizar_producto_seguro(instance))
+
+
+@receiver(post_delete, sender=Producto)
+def quitar_producto_busqueda(sender, instance, **kwargs):
+    """Saca un producto borrado del índice de búsqueda"""
+    producto_id = instance.id
+    transaction.on_commit(lambda: BusquedaService.eliminar_producto_seguro(producto_id))
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_autocompletado_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Actualiza las sugerencias del buscador al crear o editar un producto"""
+    if _sin_cambios_indexados(raw, update_fields):
+        return
+    transaction.on_commit(lambda: AutocompletarService.actualizar_producto_seguro(instance))
+
+
+@receiver(post_delete, sender=Producto)
+def quitar_producto_autocompletado(sender, instance, **kwargs):
+    """Saca un producto borrado de las sugerencias del buscador"""
+    producto_id = instance.id
+    transaction.on_commit(lambda: AutocompletarService.eliminar_producto_seguro(producto_id))
+
+
+@receiver(pre_save, sender=Resena)
+def recordar_calificacion_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda producto y calificación previos de una reseña editada"""
+    instance._calificacion_anterior = None
+    if raw or instance.pk is None:
+        return
+    instance._calificacion_anterior = Resena.objects.filter(pk=instance.pk).values_list(
+        'producto_id', 'calificacion'
+    ).first()
+
+
+@receiver(post_save, sender=Resena)
+def actualizar_calificaciones_resena(sender, instance, created=False, raw=False, **kwargs):
+    """Ajusta los contadores de calificación del producto al crear o editar una reseña"""
+    if raw:
+        return
+    anterior = getattr(instance, '_calificacion_anterior', None)
+    if created or anterior is None:
+        CalificacionesService.ajustar_seguro(instance.producto_id, sumar=instance.calificacion)
+    elif anterior != (instance.producto_id, instance.calificacion):
+        producto_anterior, calificacion_anterior = anterior
+        if producto_anterior == instance.producto_id:
+            CalificacionesService.ajustar_seguro(
+                instance.producto_id, sumar=instance.calificacion, restar=calificacion_anterior
+            )
+        else:
+            CalificacionesService.ajustar_seguro(producto_anterior, restar=calificacion_anterior)
+            CalificacionesService.ajustar_seguro(instance.producto_id, sumar=instance.calificacion)
+
+
+@receiver(post_delete, sender=Resena)
+def descontar_calificacion_resena(sender, instance, **kwargs):
+    """Descuenta la reseña borrada de los contadores del producto"""
+    CalificacionesService.ajustar_seguro(instance.producto_id, restar=instance.calificacion)
@@ -1,3 +1,729 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .busqueda import IndicePrefijos
+from .models import (
+    AsociacionProducto, Categoria, Pedido, PedidoProducto, PopularidadProducto, Producto, RegistroBusqueda, Resena,
+    ResumenConsultaDia,
+)
+from .services.analitica_busqueda_service import AnaliticaBusquedaService
+from .services.asociaciones_service import AsociacionesService
+from .services.autocompletar_service import AutocompletarService
+from .services.calificaciones_service import CalificacionesService
+from .services.catalogo_service import CatalogoService
+from .services.facetas_service import FacetasService
+from .services.popularidad_service import PopularidadService
+from .services.recomendador_service import CacheRecomendaciones, RegistroRecomendador, registrar_pedido
+
+
+class PaginacionCatalogoTests(TestCase):
+    """Recorrer el catálogo con cursores da las mismas filas que el orden completo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        precios = [500, 100, 300, 100, 300, 700, 100, 200]
+        for i, precio in enumerate(precios):
+            Producto.objects.create(
+                nombre=f'Producto {chr(ord("h") - i)}', precio=Decimal(precio), sku=f'PAG-{i}',
+                rating_promedio=(i % 3) + 2, rating_total=i % 2 + 1,
+            )
+
+    def recorrer(self, paginar, por_pagina=3):
+        """Páginas hacia adelante hasta el final y de vuelta hacia atrás hasta el principio"""
+        adelante = [paginar(None, por_pagina)]
+        while adelante[-1]['cursor_siguiente']:
+            adelante.append(paginar(adelante[-1]['cursor_siguiente'], por_pagina))
+        atras = [adelante[-1]]
+        while atras[-1]['cursor_anterior']:
+            atras.append(paginar(atras[-1]['cursor_anterior'], por_pagina))
+        ids = lambda paginas: [[producto.id for producto in pagina['productos']] for pagina in paginas]
+        return ids(adelante), ids(reversed(atras))
+
+    def test_paginar_ida_y_vuelta_en_cada_orden(self):
+        queryset = Producto.objects.all()
+        for orden, campos in CatalogoService.ORDENES.items():
+            with self.subTest(orden=orden):
+                esperado = list(queryset.order_by(*campos).values_list('id', flat=True))
+                adelante, atras = self.recorrer(
+                    lambda cursor, por_pagina: CatalogoService.paginar(queryset, orden, cursor, por_pagina)
+                )
+                self.assertEqual(sum(adelante, []), esperado)
+                self.assertEqual(atras, adelante)
+                self.assertTrue(all(len(pagina) == 3 for pagina in adelante[:-1]))
+
+    def test_cursor_de_otro_orden_vuelve_a_la_primera_pagina(self):
+        queryset = Producto.objects.all()
+        segunda = CatalogoService.paginar(queryset, 'precio', None, 3)['cursor_siguiente']
+        pagina = CatalogoService.paginar(queryset, 'nombre', segunda, 3)
+        self.assertEqual(pagina['productos'], list(queryset.order_by('nombre', 'id')[:3]))
+        self.assertIsNone(pagina['cursor_anterior'])
+
+    def test_paginar_ranking_ida_y_vuelta(self):
+        ids = list(Producto.objects.order_by('id').values_list('id', flat=True))
+        ranking = list(reversed(ids))
+        queryset = Producto.objects.exclude(id=ids[2])
+        adelante, atras = self.recorrer(
+            lambda cursor, por_pagina: CatalogoService.paginar_ranking(queryset, ranking, cursor, por_pagina)
+        )
+        self.assertEqual(sum(adelante, []), [producto_id for producto_id in ranking if producto_id != ids[2]])
+        self.assertEqual(atras, adelante)
+
+
+class FacetasTests(TestCase):
+    """Conteos de facetas sobre un cubo armado a mano"""
+
+    def setUp(self):
+        cache.clear()
+        self.ropa = Categoria.objects.create(nombre='Ropa', slug='ropa')
+        self.remeras = Categoria.objects.create(nombre='Remeras', slug='remeras', padre=self.ropa)
+        self.hogar = Categoria.objects.create(nombre='Hogar', slug='hogar')
+        # (categoria_id, rango de precio, estrellas, disponible, total)
+        self.cubo = [
+            (self.ropa.id, 0, 5, True, 2),
+            (self.remeras.id, 1, 4, True, 3),
+            (self.remeras.id, 1, 0, False, 1),
+            (self.hogar.id, 4, 3, True, 4),
+            (self.hogar.id, 0, 1, False, 5),
+        ]
+
+    def facetas(self, **parametros):
+        filtros = FacetasService.leer_filtros({'disponibilidad': 'todos', **parametros})
+        return FacetasService.total(self.cubo, filtros), FacetasService.facetas(self.cubo, filtros)
+
+    @staticmethod
+    def totales(faceta):
+        return {opcion['valor']: opcion['total'] for opcion in faceta}
+
+    def test_sin_filtros(self):
+        total, facetas = self.facetas()
+        self.assertEqual(total, 15)
+        # Ropa suma los productos de Remeras
+        self.assertEqual(self.totales(facetas['categoria']), {'Hogar': 9, 'Ropa': 6, 'Remeras': 4})
+        self.assertEqual(self.totales(facetas['precio']), {0: 7, 1: 4, 2: 0, 3: 0, 4: 4})
+        self.assertEqual(self.totales(facetas['calificacion']), {4: 5, 3: 9, 2: 9, 1: 14})
+        self.assertEqual(self.totales(facetas['disponibilidad']), {'disponible': 9, 'agotado': 6, 'todos': 15})
+
+    def test_cada_faceta_ignora_su_propio_filtro(self):
+        total, facetas = self.facetas(categoria='ropa', precio='1', disponibilidad='disponible')
+        self.assertEqual(total, 3)
+        self.assertEqual(self.totales(facetas['categoria']), {'Ropa': 3, 'Remeras': 3})
+        self.assertEqual(self.totales(facetas['precio']), {0: 2, 1: 3, 2: 0, 3: 0, 4: 0})
+        self.assertEqual(self.totales(facetas['disponibilidad']), {'disponible': 3, 'agotado': 1, 'todos': 4})
+        seleccionadas = [opcion['valor'] for opcion in facetas['categoria'] if opcion['seleccionado']]
+        self.assertEqual(seleccionadas, ['Ropa'])
+
+    def test_calificacion_minima(self):
+        total, _ = self.facetas(calificacion='4')
+        self.assertEqual(total, 5)
+        total, _ = self.facetas(calificacion='4', categoria='Hogar')
+        self.assertEqual(total, 0)
+
+
+class CalificacionesTests(TestCase):
+    """Los contadores de calificación de Producto siguen a las reseñas"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('cliente', 'cliente@example.com', 'clave')
+        self.otro_usuario = User.objects.create_user('otro', 'otro@example.com', 'clave')
+        self.producto = Producto.objects.create(nombre='Lámpara', sku='CAL-1')
+        self.otro = Producto.objects.create(nombre='Mesa', sku='CAL-2')
+
+    def calificaciones(self, producto):
+        producto.refresh_from_db()
+        return (
+            producto.rating_total, round(producto.rating_promedio, 4),
+            [getattr(producto, f'rating_{estrellas}') for estrellas in CalificacionesService.ESTRELLAS],
+        )
+
+    def test_ajustar(self):
+        CalificacionesService.ajustar(self.producto.id, sumar=5)
+        CalificacionesService.ajustar(self.producto.id, sumar=2)
+        self.assertEqual(self.calificaciones(self.producto), (2, 3.5, [0, 1, 0, 0, 1]))
+        CalificacionesService.ajustar(self.producto.id, sumar=4, restar=2)
+        self.assertEqual(self.calificaciones(self.producto), (2, 4.5, [0, 0, 0, 1, 1]))
+        CalificacionesService.ajustar(self.producto.id, restar=4)
+        CalificacionesService.ajustar(self.producto.id, restar=5)
+        self.assertEqual(self.calificaciones(self.producto), (0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_senales_de_resena(self):
+        resena = Resena.objects.create(usuario=self.usuario, producto=self.producto, calificacion=5)
+        Resena.objects.create(usuario=self.otro_usuario, producto=self.producto, calificacion=3)
+        self.assertEqual(self.calificaciones(self.producto), (2, 4.0, [0, 0, 1, 0, 1]))
+
+        resena.calificacion = 1
+        resena.save()
+        self.assertEqual(self.calificaciones(self.producto), (2, 2.0, [1, 0, 1, 0, 0]))
+
+        resena.producto = self.otro
+        resena.save()
+        self.assertEqual(self.calificaciones(self.producto), (1, 3.0, [0, 0, 1, 0, 0]))
+        self.assertEqual(self.calificaciones(self.otro), (1, 1.0, [1, 0, 0, 0, 0]))
+
+        resena.delete()
+        self.assertEqual(self.calificaciones(self.otro), (0, 0.0, [0, 0, 0, 0, 0]))
+        self.assertEqual(CalificacionesService.recalcular(solo_verificar=True)[1], 0)
+
+
+class ConteoCategoriasTests(TestCase):
+    """Las señales de Producto mantienen Categoria.total_productos"""
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def conteos():
+        return dict(Categoria.objects.values_list('slug', 'total_productos'))
+
+    def test_crear_editar_y_borrar(self):
+        producto = Producto.objects.create(nombre='Silla', categoria='Hogar', sku='CAT-1')
+        Producto.objects.create(nombre='Sillón', categoria='hogar', sku='CAT-2')
+        self.assertEqual(self.conteos(), {'hogar': 2})
+        self.assertEqual(producto.categoria_ref.slug, 'hogar')
+
+        producto.categoria = 'Jardín'
+        producto.save()
+        self.assertEqual(self.conteos(), {'hogar': 1, 'jardin': 1})
+
+        producto.categoria = 'Hogar'
+        producto.save(update_fields=['categoria'])
+        producto.refresh_from_db()
+        self.assertEqual(producto.categoria_ref.slug, 'hogar')
+        self.assertEqual(self.conteos(), {'hogar': 2, 'jardin': 0})
+
+        producto.reducir_stock(1)
+        self.assertEqual(self.conteos(), {'hogar': 2, 'jardin': 0})
+
+        producto.delete()
+        self.assertEqual(self.conteos(), {'hogar': 1, 'jardin': 0})
+
+
+class FusionDeltasTests(TestCase):
+    """La mini-fusión deja exactos los pares que involucran productos de las compras nuevas"""
+
+    def test_con_deltas_fusionados_actualiza_los_pares_afectados(self):
+        import numpy as np
+        from .recomendador import (
+            PESOS_ESTADO_PEDIDO, InteraccionesUsuarioProducto, RecomendadorIA, peso_interaccion,
+        )
+
+        aleatorio = np.random.default_rng(7)
+        usuarios = np.repeat(np.arange(1, 13), 4)
+        productos = aleatorio.integers(100, 110, size=usuarios.size)
+        pesos = aleatorio.uniform(0.5, 2.0, size=usuarios.size)
+        # Compras nuevas: un usuario existente, uno nuevo y un producto que nunca se vendió
+        compras = [(3, 101, 2), (3, 120, 1), (40, 104, 3), (40, 105, 1), (7, 109, 1)]
+
+        base = RecomendadorIA(modo='item', vecinos_por_producto=5)
+        base.entrenar(InteraccionesUsuarioProducto.desde_tripletas(usuarios, productos, pesos))
+        ahora = timezone.now()
+        base.aplicar_deltas([
+            (delta_id, usuario_id, producto_id, cantidad, ahora)
+            for delta_id, (usuario_id, producto_id, cantidad) in enumerate(compras, start=1)
+        ])
+        fusionado = base.con_deltas_fusionados()
+        self.assertEqual(fusionado.ultimo_delta_id, len(compras))
+        self.assertEqual(fusionado.deltas_pendientes, 0)
+
+        # La matriz fusionada es la misma que se obtendría al reentrenar
+        pesos_nuevos = [
+            float(peso_interaccion(cantidad, 0.0, PESOS_ESTADO_PEDIDO['pagado'], None)) for _, _, cantidad in compras
+        ]
+        completa = InteraccionesUsuarioProducto.desde_tripletas(
+            np.concatenate([usuarios, [u for u, _, _ in compras]]),
+            np.concatenate([productos, [p for _, p, _ in compras]]),
+            np.concatenate([pesos, pesos_nuevos]),
+        )
+        np.testing.assert_array_equal(fusionado.interacciones.producto_ids, completa.producto_ids)
+        densa = np.asarray(completa.matriz.todense(), dtype=np.float64)
+        np.testing.assert_allclose(np.asarray(fusionado.interacciones.matriz.todense()), densa, rtol=1e-6)
+
+        # Similitud coseno real entre columnas
+        normas = np.linalg.norm(densa, axis=0)
+        coseno = (densa.T @ densa) / np.outer(normas, normas)
+        afectadas = set(np.searchsorted(completa.producto_ids, sorted({p for _, p, _ in compras})).tolist())
+        vecinos, puntajes = fusionado.modelo_item.vecinos, fusionado.modelo_item.puntajes
+        for fila in range(vecinos.shape[0]):
+            for vecino, puntaje in zip(vecinos[fila].tolist(), puntajes[fila].tolist()):
+                if vecino >= 0 and (fila in afectadas or vecino in afectadas):
+                    self.assertAlmostEqual(puntaje, coseno[fila, vecino], places=5)
+
+        # Las listas de los productos afectados se rehacen completas: los k más similares
+        for fila in afectadas:
+            with self.subTest(columna=fila):
+                otras = np.delete(coseno[fila], fila)
+                esperados = np.sort(otras[otras > 0])[::-1][:fusionado.modelo_item.k]
+                obtenidos = np.sort(puntajes[fila][vecinos[fila] >= 0])[::-1]
+                np.testing.assert_allclose(obtenidos[obtenidos > 0], esperados, rtol=1e-5)
+
+
+class BusquedaBackendsTests(TransactionTestCase):
+    """Cada backend encuentra las formas singular y plural de una palabra
+
+    ``TransactionTestCase`` porque la tabla FTS5 se crea con DDL, que no
+    convive con los savepoints de ``TestCase``.
+    """
+
+    def setUp(self):
+        # bulk_create no dispara señales: los índices del proceso no se enteran de estos productos
+        self.luz, self.luces, self.camisa = Producto.objects.bulk_create([
+            Producto(nombre='Luz de lectura', precio=Decimal(10), sku='BUS-1'),
+            Producto(nombre='Luces navideñas', precio=Decimal(20), sku='BUS-2'),
+            Producto(nombre='Camisa', precio=Decimal(30), sku='BUS-3', descripcion='Algodón con botones de luz'),
+        ])
+
+    def tearDown(self):
+        from .services.busqueda_service import BackendSQLite
+
+        if BackendSQLite.disponible():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {BackendSQLite.TABLA}")
+
+    def comprobar_plurales(self, backend):
+        for consulta in ('luces', 'luz', 'LÚZ'):
+            with self.subTest(backend=backend.nombre, consulta=consulta):
+                ids = [producto_id for producto_id, _ in backend.buscar(consulta, 10)]
+                self.assertEqual(set(ids), {self.luz.id, self.luces.id, self.camisa.id})
+                # El nombre pesa más que la descripción
+                self.assertEqual(ids[-1], self.camisa.id)
+        self.assertEqual(backend.buscar('de la', 10), [])
+
+    def test_memoria(self):
+        from .services.busqueda_service import BackendMemoria
+
+        backend = BackendMemoria()
+        self.comprobar_plurales(backend)
+        self.camisa.descripcion = 'Algodón'
+        backend.actualizar(self.camisa)
+        backend.eliminar(self.luz.id)
+        self.assertEqual([producto_id for producto_id, _ in backend.buscar('luz', 10)], [self.luces.id])
+
+    def test_sqlite(self):
+        from .services.busqueda_service import BackendSQLite
+
+        if not BackendSQLite.disponible():
+            self.skipTest('SQLite sin FTS5')
+        backend = BackendSQLite()
+        self.comprobar_plurales(backend)
+        self.camisa.descripcion = 'Algodón'
+        backend.actualizar(self.camisa)
+        backend.eliminar(self.luz.id)
+        self.assertEqual([producto_id for producto_id, _ in backend.buscar('luz', 10)], [self.luces.id])
+
+    def test_terminos_mysql(self):
+        from .services.busqueda_service import BackendMySQL
+
+        # 'luz*' no encontraría 'luces' en un índice FULLTEXT de palabras sin raíz
+        self.assertEqual(BackendMySQL.terminos('Luces de la Camisas'), ['luces', 'camis'])
+        self.assertEqual(BackendMySQL.terminos('luz luz'), ['luz'])
+
+
+class AutocompletadoTests(TestCase):
+    """Sugerencias por prefijo del índice y del servicio con sus sincronizaciones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.camisa = Producto.objects.create(nombre='Camisa Roja', precio=Decimal(10), sku='AUT-1', categoria='Ropa')
+        cls.campera = Producto.objects.create(nombre='Campera', precio=Decimal(20), sku='AUT-2', categoria='Ropa')
+        cls.lampara = Producto.objects.create(nombre='Lámpara', precio=Decimal(30), sku='AUT-3', categoria='Hogar')
+        ahora = timezone.now()
+        PopularidadProducto.objects.create(producto=cls.campera, puntaje=5.0, fecha_calculo=ahora)
+        PopularidadProducto.objects.create(producto=cls.camisa, puntaje=2.0, fecha_calculo=ahora)
+
+    def setUp(self):
+        cache.clear()
+        AutocompletarService.reconstruir()
+
+    def tearDown(self):
+        AutocompletarService._productos = AutocompletarService._categorias = AutocompletarService._marca = None
+
+    def test_indice_reusa_la_ranura_al_reemplazar(self):
+        indice = IndicePrefijos.construir([(1, 'Camisa', 'camisa', 1.0), (2, 'Campera', 'campera', 3.0)])
+        for vez in range(50):
+            indice.agregar(1, f'Camisa {vez}', f'camisa talle{vez}', 1.0)
+        indice.quitar(2)
+        indice.agregar(3, 'Cámara', 'camara', 2.0)
+        self.assertEqual(len(indice.ids), 2)
+        self.assertEqual(indice.sugerir('cam'), [(3, 'Cámara'), (1, 'Camisa 49')])
+        self.assertEqual(indice.sugerir('cam talle49'), [(1, 'Camisa 49')])
+        self.assertEqual(indice.sugerir('talle3'), [])
+
+    def test_sugerir_por_popularidad(self):
+        sugerencias = AutocompletarService.sugerir('cam')
+        self.assertEqual([p['id'] for p in sugerencias['productos']], [self.campera.id, self.camisa.id])
+        self.assertEqual(AutocompletarService.sugerir('cam roj')['productos'][0]['nombre'], 'Camisa Roja')
+        self.assertEqual(AutocompletarService.sugerir('lampa')['productos'][0]['id'], self.lampara.id)
+        self.assertEqual(
+            [(c['nombre'], c['total']) for c in AutocompletarService.sugerir('rop')['categorias']], [('Ropa', 2)]
+        )
+
+    def test_sincroniza_lo_editado_en_otro_worker(self):
+        # update() no dispara señales, como una edición hecha en otro proceso
+        despues = timezone.now() + timedelta(seconds=1)
+        Producto.objects.filter(id=self.lampara.id).update(nombre='Camastro', fecha_actualizacion=despues)
+        Producto.objects.filter(id=self.campera.id).update(estado='inactivo', fecha_actualizacion=despues)
+        AutocompletarService._revisado = 0.0
+        sugerencias = AutocompletarService.sugerir('cam')
+        self.assertEqual([p['id'] for p in sugerencias['productos']], [self.camisa.id, self.lampara.id])
+        self.assertEqual(AutocompletarService.sugerir('lampa')['productos'], [])
+
+    def test_descarta_los_borrados_en_otro_worker(self):
+        # Borrado sin señales, como en otro proceso
+        PopularidadProducto.objects.filter(producto=self.campera)._raw_delete(Producto.objects.db)
+        Producto.objects.filter(id=self.campera.id)._raw_delete(Producto.objects.db)
+        sugerencias = AutocompletarService.sugerir('cam')
+        self.assertEqual([p['id'] for p in sugerencias['productos']], [self.camisa.id])
+        self.assertNotIn(self.campera.id, AutocompletarService._productos.ranura_de)
+
+
+class AnaliticaBusquedaTests(TestCase):
+    """Buffer de eventos por proceso y resúmenes diarios de búsquedas"""
+
+    def setUp(self):
+        AnaliticaBusquedaService._pendientes = []
+        AnaliticaBusquedaService._vaciado = time.monotonic()
+
+    def test_buffer_no_escribe_hasta_vaciar(self):
+        with mock.patch.object(AnaliticaBusquedaService, 'INTERVALO_SEGUNDOS', 3600):
+            busqueda_id = AnaliticaBusquedaService.registrar_busqueda(
+                '  Camisas  ROJAS!', {'orden': 'precio'}, 3, 12.3456
+            )
+            AnaliticaBusquedaService.registrar_clic(busqueda_id, None)
+            AnaliticaBusquedaService.registrar_clic('no-es-un-id', None)
+        self.assertTrue(AnaliticaBusquedaService.es_id_valido(busqueda_id))
+        self.assertEqual(RegistroBusqueda.objects.count(), 0)
+        self.assertEqual(AnaliticaBusquedaService.vaciar(), 2)
+        busqueda = RegistroBusqueda.objects.get(tipo='busqueda')
+        self.assertEqual((busqueda.consulta, busqueda.latencia_ms), ('camisas rojas', 12.35))
+        self.assertEqual(RegistroBusqueda.objects.get(tipo='clic').busqueda, busqueda_id)
+        self.assertEqual(AnaliticaBusquedaService.vaciar(), 0)
+
+    def test_temporizador_vacia_sin_eventos_nuevos(self):
+        vaciado = threading.Event()
+
+        def vaciar():
+            AnaliticaBusquedaService._pendientes = []
+            AnaliticaBusquedaService._vaciado = time.monotonic()
+            vaciado.set()
+            return 0
+
+        # El hilo escribiría con su propia conexión, fuera de la transacción del test
+        with mock.patch.object(AnaliticaBusquedaService, 'vaciar', side_effect=vaciar), \
+                mock.patch.object(AnaliticaBusquedaService, 'INTERVALO_SEGUNDOS', 0.2):
+            AnaliticaBusquedaService._temporizador = None
+            AnaliticaBusquedaService.registrar_busqueda('lampara', {}, 0, 1.0)
+            self.assertTrue(vaciado.wait(5))
+
+    def test_resumir_dia(self):
+        fecha = timezone.localdate() - timedelta(days=1)
+        mediodia = timezone.make_aware(datetime.combine(fecha, datetime.min.time())) + timedelta(hours=12)
+        eventos = [('a' * 32, 'camisa', 5, 10.0), ('b' * 32, 'camisa', 0, 30.0), ('c' * 32, 'lampara', 0, 20.0)]
+        RegistroBusqueda.objects.bulk_create([
+            RegistroBusqueda(tipo='busqueda', busqueda=busqueda, fecha=mediodia, consulta=consulta,
+                             resultados=resultados, latencia_ms=latencia)
+            for busqueda, consulta, resultados, latencia in eventos
+        ] + [
+            RegistroBusqueda(tipo='clic', busqueda='a' * 32, fecha=mediodia),
+            RegistroBusqueda(
+                tipo='busqueda', busqueda='d' * 32, fecha=mediodia + timedelta(days=1), consulta='otro día'
+            ),
+        ])
+        for _ in range(2):
+            resumen = AnaliticaBusquedaService.resumir_dia(fecha)
+        self.assertEqual(
+            (resumen.busquedas, resumen.sin_resultados, resumen.con_clic, resumen.consultas_distintas),
+            (3, 2, 1, 2),
+        )
+        self.assertEqual((resumen.latencia_p50_ms, resumen.latencia_p95_ms), (20.0, 30.0))
+        camisa = ResumenConsultaDia.objects.get(fecha=fecha, consulta='camisa')
+        self.assertEqual((camisa.busquedas, camisa.sin_resultados, camisa.con_clic), (2, 1, 1))
+        self.assertEqual(ResumenConsultaDia.objects.filter(fecha=fecha).count(), 2)
+
+    def test_purgar(self):
+        RegistroBusqueda.objects.bulk_create([
+            RegistroBusqueda(busqueda='a' * 32, fecha=timezone.now() - timedelta(days=100)),
+            RegistroBusqueda(busqueda='b' * 32, fecha=timezone.now()),
+        ])
+        self.assertEqual(AnaliticaBusquedaService.purgar(90), 1)
+        self.assertEqual(list(RegistroBusqueda.objects.values_list('busqueda', flat=True)), ['b' * 32])
+
+
+class RecomendacionesEtagTests(TestCase):
+    """recomendaciones_json responde 304 mientras no cambien el modelo, el historial ni los índices"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.visto = Producto.objects.create(nombre='Taza', precio=Decimal(10), sku='ETG-1', stock=5)
+        cls.otro = Producto.objects.create(nombre='Plato', precio=Decimal(20), sku='ETG-2', stock=5)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('recomendaciones_json') + f'?context=product&producto_id={self.visto.id}'
+
+    def test_304_hasta_que_cambia_un_indice(self):
+        primera = self.client.get(self.url)
+        self.assertEqual(primera.status_code, 200)
+        etag = primera['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        AsociacionProducto.objects.create(
+            producto=self.visto, recomendado=self.otro, posicion=0,
+            pedidos_juntos=3, soporte=0.1, confianza=0.5, lift=2,
+        )
+        nueva = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(nueva.status_code, 200)
+        self.assertNotEqual(nueva['ETag'], etag)
+        self.assertEqual(nueva.json()['recomendaciones'][0]['id'], self.otro.id)
+
+    def test_etag_depende_de_los_parametros(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url + '&top_n=2', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        invalida = self.client.get(reverse('recomendaciones_json') + '?context=otro', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(invalida.status_code, 400)
+        self.assertFalse(invalida.has_header('ETag'))
+
+
+class RecomendacionesBatchTests(TestCase):
+    """recomendar_batch da lo mismo que puntuar de a un usuario, solo con productos disponibles"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.productos = [
+            Producto.objects.create(nombre=f'Batch {i}', precio=Decimal(10 + i), sku=f'BAT-{i}', stock=5)
+            for i in range(10)
+        ]
+        Producto.objects.filter(id=cls.productos[3].id).update(stock=0)
+        Producto.objects.filter(id=cls.productos[6].id).update(estado='inactivo')
+
+    def entrenar(self, modo):
+        import numpy as np
+        from .recomendador import InteraccionesUsuarioProducto, RecomendadorIA
+
+        aleatorio = np.random.default_rng(11)
+        usuarios = np.repeat(np.arange(1, 21), 3)
+        productos = aleatorio.choice([p.id for p in self.productos], size=usuarios.size)
+        recomendador = RecomendadorIA(modo=modo, vecinos_por_producto=5, factores=3)
+        recomendador.entrenar(InteraccionesUsuarioProducto.desde_tripletas(
+            usuarios, productos, aleatorio.uniform(0.5, 2.0, size=usuarios.size)
+        ))
+        return recomendador
+
+    def test_igual_que_de_a_uno(self):
+        disponibles = {p.id for p in self.productos} - {self.productos[3].id, self.productos[6].id}
+        for modo in ('item', 'factorizacion', 'usuario'):
+            recomendador = self.entrenar(modo)
+            usuarios = list(range(1, 21))
+            batch = recomendador.recomendar_batch(usuarios + [999], top_n=2)
+            comparados = 0
+            for usuario_id in usuarios:
+                with self.subTest(modo=modo, usuario=usuario_id):
+                    esperados = [
+                        (int(recomendador.interacciones.producto_ids[columna]), score)
+                        for columna, score in recomendador.puntuar_usuario(usuario_id, 6)
+                    ]
+                    esperados = [(p, s) for p, s in esperados if p in disponibles][:2]
+                    if not esperados:
+                        continue
+                    comparados += 1
+                    obtenidos = [(r['producto'].id, r['score']) for r in batch[usuario_id]]
+                    self.assertEqual([p for p, _ in obtenidos], [p for p, _ in esperados])
+                    for (_, obtenido), (_, esperado) in zip(obtenidos, esperados):
+                        self.assertAlmostEqual(obtenido, esperado, places=4)
+            self.assertGreater(comparados, 10)
+            # Sin historial: las generales
+            self.assertEqual(
+                [r['producto'].id for r in batch[999]],
+                [r['producto'].id for r in recomendador._recomendaciones_generales(2)],
+            )
+
+    def test_excluye_compras_pendientes_de_fusionar(self):
+        recomendador = self.entrenar('item')
+        antes = [r['producto'].id for r in recomendador.recomendar_batch([1], top_n=3)[1]]
+        recomendador.aplicar_deltas([(1, 1, antes[0], 1, timezone.now())])
+        despues = [r['producto'].id for r in recomendador.recomendar_batch([1], top_n=3)[1]]
+        self.assertNotIn(antes[0], despues)
+
+
+class CacheRecomendacionesTests(TestCase):
+    """Cache LRU por usuario con expiración y versión del modelo"""
+
+    def test_version_y_expiracion(self):
+        cache_recomendaciones = CacheRecomendaciones(max_usuarios=10, ttl=60)
+        cache_recomendaciones.guardar(1, 'v1', 4, ['a'])
+        self.assertEqual(cache_recomendaciones.obtener(1, 'v1', 4), ['a'])
+        self.assertIsNone(cache_recomendaciones.obtener(1, 'v1', 8))
+        self.assertIsNone(cache_recomendaciones.obtener(1, 'v2', 4))
+        cache_recomendaciones.guardar(1, 'v2', 4, ['b'])
+        self.assertIsNone(cache_recomendaciones.obtener(1, 'v1', 4))
+        with mock.patch('tienda.services.recomendador_service.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache_recomendaciones.obtener(1, 'v2', 4))
+        self.assertEqual(
+            cache_recomendaciones.estadisticas(),
+            {'aciertos': 1, 'fallos': 4, 'usuarios': 1, 'tasa_aciertos': 20.0},
+        )
+
+    def test_lru_e_invalidacion(self):
+        cache_recomendaciones = CacheRecomendaciones(max_usuarios=2, ttl=60)
+        cache_recomendaciones.guardar(1, 'v1', 4, ['a'])
+        cache_recomendaciones.guardar(2, 'v1', 4, ['b'])
+        cache_recomendaciones.obtener(1, 'v1', 4)  # el 2 pasa a ser el menos usado
+        cache_recomendaciones.guardar(3, 'v1', 4, ['c'])
+        self.assertIsNone(cache_recomendaciones.obtener(2, 'v1', 4))
+        self.assertEqual(cache_recomendaciones.obtener(1, 'v1', 4), ['a'])
+        cache_recomendaciones.invalidar_usuario(1)
+        self.assertIsNone(cache_recomendaciones.obtener(1, 'v1', 4))
+        cache_recomendaciones.limpiar()
+        self.assertIsNone(cache_recomendaciones.obtener(3, 'v1', 4))
+
+    def test_registro_usa_el_cache_hasta_que_el_usuario_compra(self):
+        usuario = User.objects.create_user('comprador', password='x')
+        recomendador = mock.Mock()
+        recomendador.recomendar.side_effect = lambda usuario, top_n: [top_n]
+        registro = RegistroRecomendador()
+        registro._actual = (recomendador, 'v1')
+        registro._ultima_sincronizacion = time.monotonic() + 3600
+        with mock.patch('tienda.services.recomendador_service.registro_recomendador', registro):
+            self.assertEqual(registro.recomendar(usuario, top_n=4), [4])
+            self.assertEqual(registro.recomendar(usuario, top_n=4), [4])
+            self.assertEqual(recomendador.recomendar.call_count, 1)
+            # La invalidación corre al confirmarse la transacción del pedido
+            with self.captureOnCommitCallbacks(execute=True):
+                registrar_pedido(SimpleNamespace(usuario_id=usuario.id, estado='pendiente'))
+            registro.recomendar(usuario, top_n=4)
+        self.assertEqual(recomendador.recomendar.call_count, 2)
+
+
+class PopularidadTests(TestCase):
+    """Índice de popularidad por ventas con ventanas, decaimiento y filtro por subárbol de categorías"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # El menú cacheado puede traer ids de categorías de otros tests (la invalidación es on_commit)
+        cache.clear()
+        cls.ahora = timezone.now()
+        ropa = Categoria.objects.create(nombre='Ropa', slug='ropa')
+        Categoria.objects.create(nombre='Remeras', slug='remeras', padre=ropa)
+        cls.camisa = Producto.objects.create(nombre='Camisa', categoria='Ropa', sku='POP-1', stock=5)
+        cls.remera = Producto.objects.create(nombre='Remera', categoria='Remeras', sku='POP-2', stock=5)
+        cls.silla = Producto.objects.create(nombre='Silla', categoria='Hogar', sku='POP-3', stock=5)
+        cls.mesa = Producto.objects.create(nombre='Mesa', categoria='Hogar', sku='POP-4', stock=0)
+        usuario = User.objects.create_user('cliente', password='x')
+        pedidos = [
+            ('pagado', 1, [(cls.camisa, 2, 10), (cls.silla, 1, 5)]),
+            ('entregado', 20, [(cls.remera, 4, 3)]),
+            ('pendiente', 1, [(cls.camisa, 100, 10)]),
+            ('pagado', 100, [(cls.silla, 50, 5)]),
+            ('pagado', 5, [(cls.mesa, 3, 7)]),
+        ]
+        for estado, dias, lineas in pedidos:
+            pedido = Pedido.objects.create(usuario=usuario, estado=estado, total_productos=0, total_pedido=0)
+            Pedido.objects.filter(id=pedido.id).update(fecha_creacion=cls.ahora - timedelta(days=dias))
+            for producto, cantidad, precio in lineas:
+                PedidoProducto.objects.create(
+                    pedido=pedido, producto=producto, cantidad=cantidad, precio_unitario=Decimal(precio)
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.assertEqual(PopularidadService.recalcular(self.ahora, vida_media_dias=10), 4)
+
+    def test_recalcular(self):
+        remera = PopularidadProducto.objects.get(producto=self.remera)
+        self.assertAlmostEqual(remera.puntaje, 4 * 0.5 ** 2)
+        self.assertEqual((remera.unidades_7d, remera.unidades_30d, remera.unidades_90d), (0, 4, 4))
+        self.assertEqual((remera.ingresos_7d, remera.ingresos_30d), (Decimal('0.00'), Decimal('12.00')))
+        self.assertEqual(remera.categoria_ref.slug, 'remeras')
+        # Los pedidos pendientes y los de más de 90 días no cuentan
+        self.assertEqual(PopularidadProducto.objects.get(producto=self.camisa).unidades_90d, 2)
+        self.assertEqual(PopularidadProducto.objects.get(producto=self.silla).unidades_90d, 1)
+        # Recalcular reemplaza las filas
+        self.assertEqual(PopularidadService.recalcular(self.ahora, vida_media_dias=10), 4)
+        self.assertEqual(PopularidadProducto.objects.count(), 4)
+
+    def test_mas_vendidos(self):
+        self.assertEqual(PopularidadService.mas_vendidos(5), [self.camisa, self.remera, self.silla])
+        self.assertEqual(PopularidadService.mas_vendidos(5, solo_disponibles=False)[0], self.mesa)
+        self.assertEqual(PopularidadService.mas_vendidos(5, orden='30d'), [self.remera, self.camisa, self.silla])
+        self.assertEqual(PopularidadService.mas_vendidos(5, categoria='ropa'), [self.camisa, self.remera])
+        self.assertEqual(PopularidadService.mas_vendidos(5, categoria='Remeras'), [self.remera])
+        self.assertEqual(PopularidadService.mas_vendidos(5, categoria='Hogar'), [self.silla])
+        self.assertEqual(PopularidadService.mas_vendidos(5, categoria='No existe'), [])
+
+
+class AsociacionesTests(TestCase):
+    """Reglas de asociación vectorizadas contra un conteo directo de las cestas"""
+
+    def test_reglas_como_conteo_directo(self):
+        import numpy as np
+        from collections import Counter
+        from itertools import permutations
+
+        aleatorio = np.random.default_rng(3)
+        pedido_ids = aleatorio.integers(1, 60, size=400)
+        producto_ids = aleatorio.integers(500, 520, size=pedido_ids.size)
+        top_n, min_pedidos, max_productos = 3, 2, 8
+
+        cestas = {}
+        for pedido_id, producto_id in zip(pedido_ids.tolist(), producto_ids.tolist()):
+            cestas.setdefault(pedido_id, set()).add(producto_id)
+        pedidos_con = Counter(p for cesta in cestas.values() for p in cesta)
+        juntos = Counter(
+            par for cesta in cestas.values() if len(cesta) <= max_productos for par in permutations(cesta, 2)
+        )
+        esperadas = {}
+        for (a, b), cantidad in juntos.items():
+            if cantidad >= min_pedidos:
+                lift = (cantidad / pedidos_con[a]) / (pedidos_con[b] / len(cestas))
+                esperadas.setdefault(a, []).append((-lift, -cantidad, b))
+        esperadas = {
+            (a, b): -menos_cantidad
+            for a, reglas in esperadas.items() for _, menos_cantidad, b in sorted(reglas)[:top_n]
+        }
+
+        # Bloques chicos: las cestas se reparten en varias pasadas
+        with mock.patch.object(AsociacionesService, 'PARES_POR_BLOQUE', 50):
+            reglas = AsociacionesService._reglas(pedido_ids, producto_ids, top_n, min_pedidos, max_productos)
+        self.assertGreater(len(reglas), 10)
+        self.assertEqual({(r.producto_id, r.recomendado_id): r.pedidos_juntos for r in reglas}, esperadas)
+        for regla in reglas:
+            a, b = regla.producto_id, regla.recomendado_id
+            self.assertAlmostEqual(regla.soporte, regla.pedidos_juntos / len(cestas))
+            self.assertAlmostEqual(regla.confianza, regla.pedidos_juntos / pedidos_con[a])
+            self.assertAlmostEqual(regla.lift, regla.confianza * len(cestas) / pedidos_con[b])
+        por_producto = {}
+        for regla in reglas:
+            por_producto.setdefault(regla.producto_id, []).append(regla.posicion)
+        for posiciones in por_producto.values():
+            self.assertEqual(sorted(posiciones), list(range(len(posiciones))))
+
+    def test_recalcular_y_puntajes(self):
+        usuario = User.objects.create_user('cliente', password='x')
+        taza, plato, mate = [
+            Producto.objects.create(nombre=nombre, sku=f'ASO-{i}', stock=5)
+            for i, nombre in enumerate(['Taza', 'Plato', 'Mate'])
+        ]
+        for estado, productos in [
+            ('pagado', [taza, plato]), ('entregado', [taza, plato, mate]), ('pagado', [taza, mate]),
+            ('pendiente', [plato, mate]), ('pendiente', [plato, mate]),
+        ]:
+            pedido = Pedido.objects.create(usuario=usuario, estado=estado, total_productos=0, total_pedido=0)
+            for producto in productos:
+                PedidoProducto.objects.create(pedido=pedido, producto=producto, cantidad=1, precio_unitario=1)
+
+        self.assertEqual(AsociacionesService.recalcular(top_n=5, min_pedidos=2), 4)
+        self.assertFalse(AsociacionProducto.objects.filter(producto=plato, recomendado=mate).exists())
+        regla = AsociacionProducto.objects.get(producto=plato, recomendado=taza)
+        self.assertEqual((regla.pedidos_juntos, regla.confianza, regla.posicion), (2, 1.0, 0))
+        puntajes = AsociacionesService.puntajes([plato.id, mate.id])
+        self.assertEqual(puntajes, {taza.id: 2.0})
+        self.assertEqual(AsociacionesService.puntajes([]), {})
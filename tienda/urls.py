@@ -8,10 +8,12 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('productos/', views.productos, name='productos'),
+    path('productos/autocompletar/', views.autocompletar_productos, name='autocompletar_productos'),
     path('producto/<int:producto_id>/', views.producto_detalle, name='producto_detalle'),
     path('producto/<int:producto_id>/imagen/<int:imagen_id>/', views.servir_imagen_producto, name='servir_imagen_producto'),
     path('comprar/<int:producto_id>/', views.comprar, name='comprar'),
     path('recomendaciones/', views.recomendaciones, name='recomendaciones'),
+    path('recomendaciones/json/', views.recomendaciones_json, name='recomendaciones_json'),
     path('carrito/', views.ver_carrito, name='ver_carrito'),
     path('carrito/agregar/<int:producto_id>/', views.agregar_al_carrito, name='agregar_al_carrito'),
     path('carrito/eliminar/<int:item_id>/', views.eliminar_del_carrito, name='eliminar_del_carrito'),
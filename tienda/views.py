@@ -19,14 +19,30 @@ from django.utils import timezone
 from django.db import models, transaction
 from django import forms
 from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_GET
 from django.contrib.auth.models import User
 from django.db.models import Sum, Count, Q
 from django.db.models.functions import TruncMonth, TruncDay
 from datetime import date, timedelta
 import logging
 import json
-
-from .recomendador import RecomendadorIA
+import time
+
+from .busqueda import plegar
+from .services.analitica_busqueda_service import AnaliticaBusquedaService
+from .services.autocompletar_service import AutocompletarService
+from .services.busqueda_service import BusquedaService
+from .services.catalogo_service import CatalogoService
+from .services.categorias_service import CategoriasService
+from .services.facetas_service import FacetasService
+from .services.popularidad_service import PopularidadService
+from .services.relacionados_service import RelacionadosService
+from .services.recomendador_service import (
+    CONTEXTOS_RECOMENDACION, etag_recomendaciones, recomendar_contexto, recomendar_usuario, registrar_pedido,
+    registro_recomendador,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -73,40 +89,76 @@ def logout_view(request):
     logout(request)
     return redirect('home')
 
+def _url_catalogo(request, **cambios):
+    """Querystring del catálogo con los parámetros actuales, ``cambios`` aplicados y sin cursor"""
+    parametros = request.GET.copy()
+    parametros.pop('cursor', None)
+    parametros.pop('busqueda', None)
+    for nombre, valor in cambios.items():
+        if valor is None or valor == '':
+            parametros.pop(nombre, None)
+        else:
+            parametros[nombre] = valor
+    return '?' + parametros.urlencode()
+
 @login_required
 def productos(request):
     """Vista para mostrar productos con funcionalidad de búsqueda"""
     # Obtener parámetros de búsqueda
     query = request.GET.get('q', '').strip()
-    categoria = request.GET.get('categoria', '').strip()
-    ordenar_por = request.GET.get('ordenar', 'nombre')  # nombre, precio, precio_desc, fecha_desc
-
-    # Base queryset
-    productos = Producto.objects.filter(stock__gt=0)
-
-    # Aplicar filtros de búsqueda
+    filtros = FacetasService.leer_filtros(request.GET)
+    categoria = filtros['categoria']
+    # relevancia (solo con búsqueda), nombre, precio, precio_desc, fecha_desc, calificacion
+    ordenar_por = request.GET.get('ordenar') or (CatalogoService.RELEVANCIA if query else 'nombre')
+
+    # Base queryset: los productos más relevantes según el índice de texto
+    inicio_busqueda = time.monotonic()
+    productos = Producto.objects.all()
+    ranking = None
     if query:
-        productos = productos.filter(
-            models.Q(nombre__icontains=query) |
-            models.Q(descripcion__icontains=query) |
-            models.Q(categoria__icontains=query)
-        )
-
-    if categoria:
-        productos = productos.filter(categoria__iexact=categoria)
+        ranking = BusquedaService.buscar(query)
+        productos = productos.filter(id__in=ranking)
+
+    # Conteos por faceta de la búsqueda (una consulta agrupada, cacheada) y filtros de faceta
+    cubo = FacetasService.cubo(productos, plegar(query))
+    facetas = FacetasService.facetas(cubo, filtros)
+    total_productos = FacetasService.total(cubo, filtros)
+    productos = FacetasService.filtrar(productos, filtros)
+
+    for nombre, valores in facetas.items():
+        for valor in valores:
+            if nombre == 'disponibilidad':
+                valor['url'] = _url_catalogo(request, disponibilidad=None if valor['valor'] == 'disponible' else valor['valor'])
+            else:
+                valor['url'] = _url_catalogo(request, **{nombre: None if valor['seleccionado'] else valor['valor']})
 
-    # Aplicar ordenamiento
-    if ordenar_por == 'precio':
-        productos = productos.order_by('precio')
-    elif ordenar_por == 'precio_desc':
-        productos = productos.order_by('-precio')
-    elif ordenar_por == 'fecha_desc':
-        productos = productos.order_by('-id')  # Usamos ID como aproximación de fecha de creación
+    # Página actual por cursor sobre el orden elegido (con la imagen principal anotada para las tarjetas)
+    cursor = request.GET.get('cursor')
+    if ranking is not None and ordenar_por == CatalogoService.RELEVANCIA:
+        pagina = CatalogoService.paginar_ranking(productos.para_catalogo(), ranking, cursor=cursor)
     else:
-        productos = productos.order_by('nombre')
+        if ordenar_por not in CatalogoService.ORDENES:
+            ordenar_por = CatalogoService.ORDEN_DEFAULT
+        pagina = CatalogoService.paginar(productos.para_catalogo(), ordenar_por, cursor=cursor)
+
+    # Registro de la búsqueda (solo la primera página); los enlaces a los resultados llevan su id
+    busqueda_id = request.GET.get('busqueda', '')
+    if query and not cursor:
+        busqueda_id = AnaliticaBusquedaService.registrar_busqueda(
+            query,
+            {
+                clave: valor for clave, valor in dict(filtros, orden=ordenar_por).items()
+                if valor not in ('', None) and clave != 'categoria_ids'
+                and not (clave == 'disponibilidad' and valor == 'disponible')
+            },
+            total_productos,
+            (time.monotonic() - inicio_busqueda) * 1000,
+        )
+    if not AnaliticaBusquedaService.es_id_valido(busqueda_id):
+        busqueda_id = ''
 
     # Obtener categorías disponibles para el filtro
-    categorias = Producto.objects.values_list('categoria', flat=True).distinct().order_by('categoria')
+    categorias = CategoriasService.nombres()
 
     # Obtener IDs de productos en wishlist del usuario para mostrar estado correcto
     wishlist_product_ids = set(Wishlist.objects.filter(usuario=request.user).values_list('producto_id', flat=True))
@@ -119,7 +171,17 @@ def productos(request):
         comparacion_product_ids = set()
 
     response = render(request, 'tienda/productos.html', {
-        'productos': productos,
+        'productos': pagina['productos'],
+        'url_siguiente': _url_catalogo(
+            request, cursor=pagina['cursor_siguiente'], busqueda=busqueda_id
+        ) if pagina['cursor_siguiente'] else None,
+        'url_anterior': _url_catalogo(
+            request, cursor=pagina['cursor_anterior'], busqueda=busqueda_id
+        ) if pagina['cursor_anterior'] else None,
+        'busqueda_id': busqueda_id,
+        'total_productos': total_productos,
+        'facetas': facetas,
+        'filtros': filtros,
         'query': query,
         'categoria_seleccionada': categoria,
         'ordenar_por': ordenar_por,
@@ -137,7 +199,11 @@ def productos(request):
 
 def producto_detalle(request, producto_id):
     """Vista para mostrar el detalle completo de un producto"""
-    producto = get_object_or_404(Producto, id=producto_id)
+    producto = get_object_or_404(Producto.objects.para_catalogo(), id=producto_id)
+
+    # Clic en un resultado del buscador del catálogo
+    if 'busqueda' in request.GET:
+        AnaliticaBusquedaService.registrar_clic(request.GET['busqueda'], producto.id)
 
     # Obtener reseñas del producto
     resenas = Resena.objects.filter(producto=producto).select_related('usuario').order_by('-fecha_creacion')
@@ -147,10 +213,12 @@ def producto_detalle(request, producto_id):
     if request.user.is_authenticated:
         puede_reseñar = producto.puede_reseñar(request.user)
 
-    # Obtener productos relacionados (misma categoría)
-    productos_relacionados = Producto.objects.filter(
-        categoria=producto.categoria
-    ).exclude(id=producto.id).filter(stock__gt=0)[:4]
+    # Productos relacionados: la lista precalculada (compras conjuntas, texto y categoría), o de la misma categoría
+    productos_relacionados = RelacionadosService.relacionados(producto.id, top_n=4)
+    if not productos_relacionados:
+        productos_relacionados = Producto.objects.para_catalogo().filter(
+            categoria_ref=producto.categoria_ref_id
+        ).exclude(id=producto.id).filter(stock__gt=0)[:4]
 
     # Verificar si el producto está en la wishlist del usuario
     en_wishlist = False
@@ -165,6 +233,7 @@ def producto_detalle(request, producto_id):
         'resenas': resenas,
         'puede_reseñar': puede_reseñar,
         'productos_relacionados': productos_relacionados,
+        'productos_relacionados_ids': ','.join(str(p.id) for p in productos_relacionados),
         'en_wishlist': en_wishlist,
         'imagenes': imagenes,
     })
@@ -207,17 +276,12 @@ def comprar(request, producto_id):
 @login_required
 def recomendaciones(request):
     """Mostrar recomendaciones personalizadas usando IA"""
-    from .recomendador import RecomendadorIA
-
-    # Inicializar el recomendador (se cargan datos reales automáticamente)
-    recomendador = RecomendadorIA()
-
-    # Obtener recomendaciones para el usuario actual
-    recomendaciones_data = recomendador.recomendar(request.user, top_n=6)
+    # Modelo compartido por el proceso, con cache por usuario
+    recomendaciones_data = recomendar_usuario(request.user, top_n=6)
 
     # Si no hay recomendaciones basadas en IA, mostrar productos populares
     if not recomendaciones_data:
-        productos_populares = Producto.objects.filter(stock__gt=0).order_by('-stock')[:6]
+        productos_populares = PopularidadService.mas_vendidos(6)
         recomendaciones_data = []
         for producto in productos_populares:
             recomendaciones_data.append({
@@ -230,6 +294,78 @@ def recomendaciones(request):
         'recomendaciones': recomendaciones_data
     })
 
+def _parametros_recomendaciones(request):
+    """(contexto, producto_ids, top_n, excluir) pedidos a recomendaciones_json; ValueError si son inválidos"""
+    contexto = request.GET.get('context', 'home')
+    if contexto not in CONTEXTOS_RECOMENDACION:
+        raise ValueError(f"Contexto no soportado: {contexto}")
+    top_n = min(max(int(request.GET.get('top_n', 4)), 1), 12)
+    excluir = [int(p) for p in request.GET.get('excluir', '').split(',') if p][:50]
+
+    producto_ids = []
+    if contexto == 'product':
+        producto_ids = [int(request.GET.get('producto_id', ''))]
+    elif contexto == 'cart' and request.user.is_authenticated:
+        producto_ids = list(CarritoProducto.objects.filter(
+            carrito__usuario=request.user
+        ).values_list('producto_id', flat=True))
+    return contexto, producto_ids, top_n, excluir
+
+def _etag_recomendaciones_json(request):
+    try:
+        return etag_recomendaciones(request.user, *_parametros_recomendaciones(request))
+    except ValueError:
+        return None
+
+@require_GET
+@condition(etag_func=_etag_recomendaciones_json)
+def recomendaciones_json(request):
+    """Recomendaciones en JSON para cargarlas de forma asíncrona (inicio, producto o carrito).
+
+    Responde 304 si el ETag enviado en If-None-Match sigue vigente: mismo
+    modelo y mismo historial del usuario.
+    """
+    try:
+        contexto, producto_ids, top_n, excluir = _parametros_recomendaciones(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parámetros inválidos'}, status=400)
+
+    recomendaciones_data = recomendar_contexto(request.user, contexto, producto_ids, top_n, excluir)
+    imagenes = ProductoImagen.urls_principales([r['producto'].id for r in recomendaciones_data])
+    response = JsonResponse({
+        'success': True,
+        'context': contexto,
+        'recomendaciones': [
+            {
+                'id': r['producto'].id,
+                'nombre': r['producto'].nombre,
+                'precio': float(r['producto'].precio),
+                'imagen': imagenes.get(r['producto'].id),
+                'url': reverse('producto_detalle', args=[r['producto'].id]),
+                'score': round(float(r['score']), 4),
+                'razon': r['razon'],
+            }
+            for r in recomendaciones_data
+        ],
+    })
+    # Depende del usuario: el navegador puede guardarla pero debe revalidarla con el ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+@require_GET
+def autocompletar_productos(request):
+    """Sugerencias del buscador en JSON mientras se tipea (productos y categorías por prefijo)"""
+    consulta = request.GET.get('q', '')
+    response = JsonResponse({
+        'success': True,
+        'q': consulta,
+        'sugerencias': AutocompletarService.sugerir(consulta),
+    })
+    # Igual para todos los usuarios: se puede cachear un rato en el navegador y en proxies
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
 @login_required
 def ver_carrito(request):
     """Vista para mostrar el carrito de compras del usuario"""
@@ -267,7 +403,7 @@ def ver_carrito(request):
         'items': items,
         'descuento_cupon': descuento_cupon,
         'cupon_aplicado': cupon_aplicado,
-        'total_con_descuento': total_con_descuento
+        'total_con_descuento': total_con_descuento,
     })
 
 @login_required
@@ -761,6 +897,9 @@ def procesar_pedido(request):
             # Reducir stock con registro de movimiento
             item.producto.reducir_stock(item.cantidad, usuario=request.user, pedido=pedido)
 
+        # Incorporar la compra al recomendador sin esperar al próximo entrenamiento
+        registrar_pedido(pedido)
+
         # Vaciar carrito
         items.delete()
 
@@ -1142,7 +1281,7 @@ def admin_inventario(request):
 
     # Aplicar filtros
     if categoria_filter:
-        productos = productos.filter(categoria=categoria_filter)
+        productos = productos.filter(categoria_ref__in=CategoriasService.ids_subarbol(categoria_filter))
     if stock_filter == 'bajo':
         productos = productos.filter(stock__lte=models.F('stock_minimo'), stock__gt=0)
     elif stock_filter == 'agotado':
@@ -1162,7 +1301,7 @@ def admin_inventario(request):
         'total_unidades': Producto.objects.aggregate(total=models.Sum('stock'))['total'] or 0,
     }
 
-    categorias = Producto.objects.values_list('categoria', flat=True).distinct()
+    categorias = CategoriasService.nombres()
 
     return render(request, 'tienda/admin_inventario.html', {
         'productos': productos,
@@ -1272,8 +1411,8 @@ def admin_dashboard(request):
     # Pedidos recientes
     pedidos_recientes = Pedido.objects.select_related('usuario').order_by('-fecha_creacion')[:5]
 
-    # Productos más vendidos
-    productos_populares = Producto.objects.filter(estado='activo').order_by('-stock')[:5]
+    # Productos más vendidos (índice de popularidad por ventas)
+    productos_populares = PopularidadService.mas_vendidos(5, solo_disponibles=False)
 
     # Alertas
     alertas = []
@@ -1297,6 +1436,7 @@ def admin_dashboard(request):
         'pedidos_recientes': pedidos_recientes,
         'productos_populares': productos_populares,
         'alertas': alertas,
+        'cache_recomendaciones': registro_recomendador.cache.estadisticas(),
     })
 
 @login_required
@@ -1310,13 +1450,13 @@ def admin_productos(request):
     categoria_filter = request.GET.get('categoria', '')
     estado_filter = request.GET.get('estado', '')
     stock_filter = request.GET.get('stock', '')
-    query = request.GET.get('q', '')
+    query = request.GET.get('q', '').strip()
 
     productos = Producto.objects.all().order_by('nombre')
 
     # Aplicar filtros
     if categoria_filter:
-        productos = productos.filter(categoria=categoria_filter)
+        productos = productos.filter(categoria_ref__in=CategoriasService.ids_subarbol(categoria_filter))
     if estado_filter:
         productos = productos.filter(estado=estado_filter)
     if stock_filter == 'bajo':
@@ -1326,10 +1466,11 @@ def admin_productos(request):
     elif stock_filter == 'disponible':
         productos = productos.filter(stock__gt=0)
     if query:
-        productos = productos.filter(
-            models.Q(nombre__icontains=query) |
-            models.Q(descripcion__icontains=query) |
-            models.Q(sku__icontains=query)
+        # Índice de texto por relevancia, más los SKU que empiezan con lo buscado
+        posiciones = {producto_id: posicion for posicion, producto_id in enumerate(BusquedaService.buscar(query))}
+        productos = sorted(
+            productos.filter(models.Q(id__in=posiciones) | models.Q(sku__istartswith=query)),
+            key=lambda producto: posiciones.get(producto.id, len(posiciones)),
         )
 
     # Estadísticas
@@ -1341,7 +1482,7 @@ def admin_productos(request):
         'stock_bajo': Producto.objects.filter(stock__lte=models.F('stock_minimo'), stock__gt=0).count(),
     }
 
-    categorias = Producto.objects.values_list('categoria', flat=True).distinct()
+    categorias = CategoriasService.nombres()
 
     return render(request, 'tienda/admin_productos.html', {
         'productos': productos,
@@ -1655,7 +1796,7 @@ def admin_inventario(request):
 
     # Aplicar filtros
     if categoria_filter:
-        productos = productos.filter(categoria=categoria_filter)
+        productos = productos.filter(categoria_ref__in=CategoriasService.ids_subarbol(categoria_filter))
     if stock_filter == 'bajo':
         productos = productos.filter(stock__lte=models.F('stock_minimo'), stock__gt=0)
     elif stock_filter == 'agotado':
@@ -1678,7 +1819,7 @@ def admin_inventario(request):
     # Movimientos recientes
     movimientos_recientes = MovimientoInventario.objects.select_related('producto', 'usuario').order_by('-fecha')[:10]
 
-    categorias = Producto.objects.values_list('categoria', flat=True).distinct()
+    categorias = CategoriasService.nombres()
 
     return render(request, 'tienda/admin_inventario.html', {
         'productos': productos,